@@ -1,19 +1,93 @@
 import typer
 from typing_extensions import Annotated
-from aim.hathifiles import poll
+from aim.hathifiles import (
+    poll,
+    identifiers,
+    main,
+    bloom,
+    snapshot,
+    loader,
+    profiles,
+    download as downloads,
+    export,
+    htid_index,
+    reconcile,
+    state,
+    summary,
+    watcher,
+)
 from aim.services import S
 from aim.hathifiles.client import Client
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+from aim.hathifiles.database import models
 import json
+import os
+import signal
 
 app = typer.Typer()
 
 
+def get_subset_profile(name: str) -> profiles.Profile | None:
+    try:
+        profile = profiles.get_profile(name)
+    except ValueError as error:
+        raise typer.BadParameter(str(error), param_hint="--profile")
+    # Skip checking every line when everything is loaded
+    return None if profile.is_everything else profile
+
+
+def echo_resume(stats: loader.LoadStats) -> None:
+    if stats.already_loaded:
+        typer.echo(f"{stats.file} was already loaded. Pass --restart to load it again.")
+    elif stats.resumed_from:
+        typer.echo(f"Resumed from line {stats.resumed_from}")
+
+
+def configured_store() -> state.StateStore | None:
+    # The state store is optional. Without one at HATHIFILES_STATE_PATH,
+    # nothing is recorded.
+    try:
+        return poll.get_store()
+    except FileNotFoundError:
+        return None
+
+
+def mark_loaded(file: str) -> None:
+    # The load is committed by now, so recording it is best-effort and
+    # mustn't stop what comes after it
+    filename = os.path.basename(file)
+    try:
+        state.file_date(filename)
+    except ValueError:
+        return
+    store = configured_store()
+    if store is None:
+        return
+    try:
+        store.mark(filename, state.LOADED)
+    except SQLAlchemyError as error:
+        S.logger.warning(
+            "Couldn't record the hathifile as loaded", file=filename, error=str(error)
+        )
+
+
+def rebuild_bloom_filters(db, version: str | None = None) -> None:
+    # Rebuilds the filters that are already there, so that the API doesn't
+    # serve a filter that's missing the htids that were just loaded
+    if version is None:
+        newest = db.execute(select(func.max(models.Item.rights_timestamp)))
+        version = str(newest.scalar_one())
+    bloom.write_bloom_filters(db, version=version, namespaces=bloom.filter_namespaces())
+
+
 @app.command()
 def create_store_file():
-    f"""
-    Genereates a new store file at {S.hathifiles_store_path} if one does not
-    already exist. The new file is based on the latest hathi_files_list.json
-    from hathitrust.org 
+    """
+    Generates the SQLite state store at HATHIFILES_STATE_PATH if one does not
+    already exist. The files in an old JSON store file at HATHIFILES_STORE_PATH
+    are carried over. Without one the store is based on the latest
+    hathi_files_list.json from hathitrust.org
     """
     poll.create_store_file()
 
@@ -23,15 +97,355 @@ def check_for_new_update_files():
     """
     Pulls the latest hathi_files_list.json from hathitrust.org and checks if
     there are any update files that aren't in the store. If there are new files
-    it notifies the argo events webhook and replaces the store file with the old
-    files and the new ones.
+    it notifies the argo events webhook and records the new files in the state
+    store. The list is requested conditionally, so polling when nothing has
+    changed is cheap.
     """
     poll.check_for_new_update_files()
 
 
+@app.command()
+def watch(
+    interval: Annotated[
+        float, typer.Option(help="Seconds between polls")
+    ] = S.hathifiles_poll_interval,
+    port: Annotated[
+        int, typer.Option(help="Port for /healthz and /metrics")
+    ] = S.hathifiles_watch_port,
+):
+    """
+    Keeps polling hathi_files_list.json for new update files until it's
+    stopped. New files are recorded in the state store and the argo events
+    webhook is notified through a queue that retries until it succeeds.
+    """
+    poller = watcher.Watcher(poll.get_store(), interval=interval)
+    server = watcher.serve_status(poller, port)
+    signal.signal(signal.SIGTERM, lambda signum, frame: poller.stop())
+    try:
+        poller.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+@app.command()
+def list_files(
+    status: Annotated[
+        str | None,
+        typer.Option(help="Only files with this status: seen, downloaded or loaded"),
+    ] = None,
+):
+    """
+    Lists the hathifiles in the state store with their status.
+    """
+    store = configured_store()
+    if store is None:
+        typer.echo(
+            f"There isn't a state store at {S.hathifiles_state_path}. "
+            "Make one with create-store-file.",
+            err=True,
+        )
+        raise typer.Exit(1)
+    for row in store.files(status):
+        typer.echo(f"{row['filename']}\t{row['status']}")
+
+
 @app.command()
 def get(htid: Annotated[str, typer.Argument(help="The HathiTrust id for an item")]):
     """
     Returns the Hathfiles info for a given htid
     """
-    typer.echo(json.dumps(Client().get_item(htid=htid), indent=2))
+    with Client() as client:
+        typer.echo(json.dumps(client.get_item(htid=htid), indent=2))
+
+
+@app.command()
+def build_identifiers():
+    """
+    Rebuilds the normalized OCLC, ISBN, ISSN and LCCN lookup table from the
+    items in the Hathifiles Database.
+    """
+    with main.engine.connect() as db:
+        identifiers.rebuild_identifiers(db)
+
+
+@app.command()
+def build_summaries():
+    """
+    Rebuilds the summary tables behind the API's /stats from the items in the
+    Hathifiles Database. Loads keep them up to date after that.
+    """
+    with main.engine.connect() as db:
+        total = summary.rebuild_summaries(db)
+    typer.echo(f"Summarized {total} items")
+
+
+@app.command()
+def build_bloom_filters(
+    version: Annotated[
+        str | None,
+        typer.Option(
+            help="What the filters are built from, e.g. the last loaded update file. Defaults to the newest rights_timestamp."
+        ),
+    ] = None,
+    namespace: Annotated[
+        list[str] | None,
+        typer.Option(help="An htid namespace that gets its own filter, e.g. mdp"),
+    ] = None,
+    error_rate: Annotated[
+        float, typer.Option(help="Bloom filter false positive rate")
+    ] = 0.001,
+):
+    """
+    Builds Bloom filters of the htids in the Hathifiles Database in the
+    HATHIFILES_BLOOM_FILTER_DIR directory for the Hathifiles API to serve.
+    """
+    with main.engine.connect() as db:
+        if version is None:
+            newest = db.execute(select(func.max(models.Item.rights_timestamp)))
+            version = str(newest.scalar_one())
+        bloom.write_bloom_filters(
+            db, version=version, namespaces=namespace, error_rate=error_rate
+        )
+
+
+@app.command()
+def build_snapshot(
+    path: Annotated[str, typer.Argument(help="Where to write the snapshot")],
+    profile: Annotated[
+        str, typer.Option(help="Only copy the items in this subset profile")
+    ] = "full",
+    from_file: Annotated[
+        str | None,
+        typer.Option(
+            help="Build the snapshot from this hathifile instead of the database"
+        ),
+    ] = None,
+):
+    """
+    Copies the Hathifiles Database, or a hathifile, into a read-only SQLite
+    snapshot. Set HATHIFILES_SNAPSHOT_PATH to the snapshot to have the
+    Hathifiles client look items up in it instead of calling the API.
+    """
+    subset = get_subset_profile(profile)
+    if from_file:
+        snapshot.build_snapshot_from_file(from_file, path, profile=subset)
+    else:
+        with main.engine.connect() as db:
+            snapshot.build_snapshot(db, path, profile=subset)
+
+
+@app.command()
+def export_parquet(
+    path: Annotated[str, typer.Argument(help="Directory to write the export to")],
+    profile: Annotated[
+        str, typer.Option(help="Only export the items in this subset profile")
+    ] = "full",
+    from_file: Annotated[
+        str | None,
+        typer.Option(help="Export this hathifile instead of the database"),
+    ] = None,
+    partition_by: Annotated[
+        list[str] | None,
+        typer.Option(
+            help="A column to partition by. Defaults to content_provider_code."
+        ),
+    ] = None,
+    row_group_size: Annotated[
+        int, typer.Option(help="The most rows in each Parquet row group")
+    ] = 100000,
+):
+    """
+    Exports the Hathifiles Database, or a hathifile, to a partitioned Parquet
+    dataset for analytics. Needs pyarrow.
+    """
+    subset = get_subset_profile(profile)
+    partitions = partition_by or export.PARTITION_BY
+    if from_file:
+        total = export.export_parquet_from_file(
+            from_file,
+            path,
+            profile=subset,
+            partition_by=partitions,
+            row_group_size=row_group_size,
+        )
+    else:
+        with main.engine.connect() as db:
+            total = export.export_parquet(
+                db,
+                path,
+                profile=subset,
+                partition_by=partitions,
+                row_group_size=row_group_size,
+            )
+    typer.echo(f"Exported {total} rows to {path}")
+
+
+@app.command()
+def build_htid_index(
+    file: Annotated[str, typer.Argument(help="Path to a hathifile")],
+    path: Annotated[str, typer.Argument(help="Where to write the index")],
+    profile: Annotated[
+        str, typer.Option(help="Only index the items in this subset profile")
+    ] = "full",
+):
+    """
+    Builds a sorted, fixed-width index of the htids in a hathifile with their
+    rights_timestamp, access and rights code. Batch jobs can look htids up in
+    it through aim.hathifiles.htid_index.HtidIndex without a database or the
+    API.
+    """
+    total = htid_index.build_htid_index(file, path, profile=get_subset_profile(profile))
+    typer.echo(f"Indexed {total} htids in {path}")
+
+
+@app.command()
+def download(
+    full: Annotated[
+        bool, typer.Option(help="Also download the newest full file")
+    ] = False,
+    prune: Annotated[
+        bool,
+        typer.Option(help="Remove files past HATHIFILES_RETENTION_DAYS afterwards"),
+    ] = True,
+):
+    """
+    Downloads the hathifiles in hathi_file_list.json that aren't in
+    HATHIFILES_DOWNLOAD_DIR yet. Interrupted downloads pick up where they left
+    off, and every file is checked against its size and gzip CRC before it's
+    put in place.
+    """
+    store = configured_store()
+    for stats in downloads.download_new_files(full=full, prune=prune, store=store):
+        if stats.downloaded:
+            typer.echo(f"Downloaded {stats.path}")
+
+
+@app.command()
+def load_update(
+    file: Annotated[str, typer.Argument(help="Path to a hathi_upd_*.txt.gz file")],
+    batch_size: Annotated[int, typer.Option(help="Rows in each upsert")] = 10000,
+    build_bloom_filters: Annotated[
+        bool,
+        typer.Option(help="Rebuild the Bloom filters of htids after loading"),
+    ] = True,
+    profile: Annotated[
+        str, typer.Option(help="Only load the items in this subset profile")
+    ] = S.hathifiles_profile,
+    restart: Annotated[
+        bool,
+        typer.Option(help="Load the file from the start even if it was loaded"),
+    ] = False,
+    reconcile_digifeeds: Annotated[
+        bool,
+        typer.Option(
+            help="Record the digifeeds items pending deletion that are in the file as in_hathifiles"
+        ),
+    ] = False,
+):
+    """
+    Loads a hathifiles update file into the Hathifiles Database. Rows for
+    htids that are already there are replaced when they've changed. The
+    inserted and updated htids are listed in a manifest in
+    HATHIFILES_MANIFEST_DIR. An interrupted load picks up where it left off
+    when it's run again.
+    """
+    reconciler = None
+    if reconcile_digifeeds:
+        reconciler = reconcile.DigifeedsReconciler.pending()
+    with main.engine.connect() as db:
+        stats = loader.load_update_file(
+            db,
+            file,
+            batch_size=batch_size,
+            profile=get_subset_profile(profile),
+            restart=restart,
+            reconciler=reconciler,
+        )
+        if build_bloom_filters and not stats.already_loaded:
+            rebuild_bloom_filters(db, version=os.path.basename(file))
+    mark_loaded(file)
+    echo_resume(stats)
+    typer.echo(
+        f"Loaded {stats.rows} rows in {stats.seconds:.1f}s "
+        f"({stats.rows_per_second:.0f} rows/sec): {stats.inserted} inserted, "
+        f"{stats.updated} updated, {stats.unchanged} unchanged"
+    )
+    if stats.filtered:
+        typer.echo(f"Skipped {stats.filtered} lines outside the {profile} profile")
+    if reconciler is not None:
+        typer.echo(f"Recorded {stats.reconciled} digifeeds items as in_hathifiles")
+        if reconciler.matches:
+            typer.echo(
+                f"{len(reconciler.matches)} digifeeds items couldn't be recorded",
+                err=True,
+            )
+
+
+@app.command()
+def load_full(
+    file: Annotated[str, typer.Argument(help="Path to a hathi_full_*.txt.gz file")],
+    batch_size: Annotated[int, typer.Option(help="Rows in each insert")] = 10000,
+    workers: Annotated[
+        int,
+        typer.Option(help="Processes that parse the file. 0 loads in one process."),
+    ] = 0,
+    writers: Annotated[
+        int, typer.Option(help="Database connections that insert rows")
+    ] = 2,
+    profile: Annotated[
+        str, typer.Option(help="Only load the items in this subset profile")
+    ] = S.hathifiles_profile,
+    build_bloom_filters: Annotated[
+        bool,
+        typer.Option(help="Rebuild the Bloom filters of htids after loading"),
+    ] = True,
+    restart: Annotated[
+        bool,
+        typer.Option(help="Load the file from the start even if it was loaded"),
+    ] = False,
+):
+    """
+    Replaces everything in the Hathifiles Database with a hathifiles full file.
+    The file is loaded into a shadow table that takes the place of hf once it's
+    complete, so the API isn't disturbed by the load. With --workers the file
+    is parsed by a pool of processes and inserted by --writers connections. An
+    interrupted load picks up where it left off when it's run again.
+    """
+    with main.engine.connect() as db:
+        stats = loader.load_full_file(
+            db,
+            file,
+            batch_size=batch_size,
+            workers=workers,
+            writers=writers,
+            profile=get_subset_profile(profile),
+            restart=restart,
+        )
+        if build_bloom_filters and not stats.already_loaded:
+            rebuild_bloom_filters(db, version=os.path.basename(file))
+    mark_loaded(file)
+    echo_resume(stats)
+    typer.echo(
+        f"Loaded {stats.rows} rows in {stats.seconds:.1f}s "
+        f"({stats.rows_per_second:.0f} rows/sec)"
+    )
+    if stats.filtered:
+        typer.echo(f"Skipped {stats.filtered} lines outside the {profile} profile")
+    for name, stage in stats.stages.items():
+        typer.echo(
+            f"  {name}: {stage.rows_per_second:.0f} rows/sec "
+            f"with {stage.workers} worker(s)"
+        )
+
+
+@app.command()
+def rollback_full_load():
+    """
+    Puts back the Hathifiles Database table that the last full load replaced,
+    and rebuilds the Bloom filters of htids to match it.
+    """
+    with main.engine.connect() as db:
+        loader.rollback_full_load(db)
+        rebuild_bloom_filters(db)
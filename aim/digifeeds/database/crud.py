@@ -296,6 +296,39 @@ def update_hathifiles_timestamp(db: Session, item: models.Item, timestamp: datet
     return item
 
 
+def update_hathifiles_timestamps(db: Session, timestamps: dict[str, datetime]):
+    """Updates the hathifiles_timestamp field and adds the `in_hathifiles`
+    status for many items at once. Barcodes that aren't in the database or
+    that already have a hathifiles_timestamp are skipped.
+
+    Args:
+        db (sqlalchemy.orm.Session): Digifeeds database session
+        timestamps (dict[str, datetime.datetime]): Hathifiles "rights_timestamp" for each barcode
+
+    Returns:
+        list[aim.digifeeds.database.models.Item]: The items that were updated
+    """
+    if not timestamps:
+        return []
+    stmnt = select(models.Item).where(
+        models.Item.barcode.in_(list(timestamps.keys())),
+        models.Item.hathifiles_timestamp.is_(None),
+    )
+    items = db.scalars(stmnt).all()
+    if not items:
+        return []
+
+    status = get_status(db=db, name="in_hathifiles")
+    for item in items:
+        db.add(models.ItemStatus(item=item, status=status))
+        item.hathifiles_timestamp = timestamps[item.barcode]
+
+    db.commit()
+    for item in items:
+        db.refresh(item)
+    return items
+
+
 def delete_item(db: Session, barcode: str):
     """Deletes a digifeeds  item
 
@@ -228,6 +228,27 @@ def update_hathifiles_timestamp(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.put(
+    "/items/hathifiles_timestamps",
+    response_model_by_alias=False,
+    tags=["Digifeeds Database"],
+)
+def update_hathifiles_timestamps(
+    timestamps: list[schemas.HathifilesTimestamp], db: Session = Depends(get_db)
+) -> list[schemas.Item]:
+    """
+    Record that many items are in the Hathifiles at once.
+
+    Each item gets its hathifiles_timestamp and the `in_hathifiles` status.
+    Barcodes that don't exist or that already have a hathifiles_timestamp are
+    skipped. Returns the items that were updated.
+    """
+    return crud.update_hathifiles_timestamps(
+        db=db,
+        timestamps={t.barcode: t.hathifiles_timestamp for t in timestamps},
+    )
+
+
 @app.delete(
     "/items/{barcode}",
     response_model_by_alias=False,
@@ -62,6 +62,21 @@ class ItemCreate(ItemBase):
     pass
 
 
+class HathifilesTimestamp(BaseModel):
+    barcode: str
+    hathifiles_timestamp: datetime
+    model_config = ConfigDict(
+        json_schema_extra={
+            "examples": [
+                {
+                    "barcode": "39015040218748",
+                    "hathifiles_timestamp": "2024-09-25T17:12:39",
+                }
+            ]
+        }
+    )
+
+
 class StatusBase(BaseModel):
     name: str
 
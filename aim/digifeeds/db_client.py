@@ -83,6 +83,27 @@ class DBClient:
             response.raise_for_status()
         return response.json()
 
+    def update_hathifiles_timestamps(self, timestamps: dict[str, datetime]):
+        """
+        Updates the hathifiles_timestamp field for many barcodes in one request.
+        Barcodes that already have a hathifiles_timestamp are skipped.
+
+        Args:
+            timestamps (dict[str, datetime]): rights_timestamp value from Hathifiles DB for each barcode
+
+        Returns:
+            json: A list of the updated items
+        """
+        url = self._url("items/hathifiles_timestamps")
+        body = [
+            {"barcode": barcode, "hathifiles_timestamp": timestamp.isoformat()}
+            for barcode, timestamp in timestamps.items()
+        ]
+        response = requests.put(url, json=body)
+        if response.status_code != 200:
+            response.raise_for_status()
+        return response.json()
+
     def get_items(self, limit: int = 50, q: str | None = None) -> list:
         """
         Pages through all items to return a list. Takes an optional q string to
@@ -115,7 +115,8 @@ class Item:
             )
             return
 
-        hf_item = HathifilesClient().get_item(htid=f"mdp.{self.barcode}")
+        with HathifilesClient() as hathifiles:
+            hf_item = hathifiles.get_item(htid=f"mdp.{self.barcode}")
 
         if hf_item:
             db_resp = DBClient().update_hathifiles_timestamp(
@@ -0,0 +1,300 @@
+"""
+Hathifiles Bloom Filters
+========================
+
+Bloom filters of the htids in the Hathifiles Database. A Bloom filter answers
+"is this htid in the hathifiles?" with either "definitely not" or "probably".
+Most lookups are for barcodes that aren't in HathiTrust yet, so clients can
+download a filter and skip asking the API about htids that definitely aren't
+there.
+
+A filter file is a small header followed by the bit array, so a downloaded
+filter can be memory mapped and used without reading it into memory.
+"""
+
+import math
+import mmap
+import os
+import struct
+from hashlib import blake2b
+from sqlalchemy import Connection, func, select
+from aim.hathifiles.database import models
+from aim.services import S
+
+MAGIC = b"HFBF"
+FORMAT_VERSION = 1
+
+# magic, format version, number of hashes, version label length, number of
+# bits, number of htids
+HEADER = struct.Struct("<4sBBHQQ")
+
+
+class BloomFilter:
+    """
+    A Bloom filter of htids
+
+    Args:
+        num_bits (int): Size of the bit array
+        num_hashes (int): How many bits each htid sets
+        version (str, optional): What the filter was built from, e.g. the name of the last loaded update file. Defaults to "".
+        count (int, optional): How many htids have been added. Defaults to 0.
+        bits (bytearray | memoryview | None, optional): An existing bit array. Defaults to None for an empty one.
+    """
+
+    def __init__(
+        self,
+        num_bits: int,
+        num_hashes: int,
+        version: str = "",
+        count: int = 0,
+        bits: bytearray | memoryview | None = None,
+    ) -> None:
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.version = version
+        self.count = count
+        self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+        self._mmap = None
+
+    @classmethod
+    def for_capacity(
+        cls, capacity: int, error_rate: float = 0.001, version: str = ""
+    ) -> "BloomFilter":
+        """
+        An empty filter sized for a number of htids and a false positive rate
+
+        Args:
+            capacity (int): How many htids will be added
+            error_rate (float, optional): Chance that an htid that wasn't added is reported as present. Defaults to 0.001.
+            version (str, optional): What the filter is built from. Defaults to "".
+
+        Returns:
+            BloomFilter: An empty filter
+        """
+        capacity = max(capacity, 1)
+        num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return cls(num_bits=num_bits, num_hashes=num_hashes, version=version)
+
+    def _positions(self, htid: str):
+        # Double hashing: k positions from the two halves of one digest
+        digest = blake2b(htid.encode(), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, htid: str) -> None:
+        for position in self._positions(htid):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, htid: str) -> bool:
+        bits = self.bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(htid)
+        )
+
+    def to_bytes(self) -> bytes:
+        label = self.version.encode()
+        header = HEADER.pack(
+            MAGIC,
+            FORMAT_VERSION,
+            self.num_hashes,
+            len(label),
+            self.num_bits,
+            self.count,
+        )
+        return header + label + bytes(self.bits)
+
+    def write(self, path: str) -> None:
+        """
+        Writes the filter to a file. The file is written next to the
+        destination and then renamed, so readers never see a partial file.
+
+        Args:
+            path (str): Where to write the filter
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.to_bytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def from_buffer(cls, buffer) -> "BloomFilter":
+        """
+        A filter backed by a buffer in the filter file format. The bit array
+        isn't copied.
+
+        Args:
+            buffer: bytes, a memoryview, or an mmap of a filter file
+
+        Raises:
+            ValueError: When the buffer isn't a Bloom filter file
+
+        Returns:
+            BloomFilter: The filter
+        """
+        view = memoryview(buffer)
+        if len(view) < HEADER.size:
+            raise ValueError("Not a Hathifiles Bloom filter")
+        magic, format_version, num_hashes, label_length, num_bits, count = (
+            HEADER.unpack_from(view)
+        )
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError("Not a Hathifiles Bloom filter")
+        start = HEADER.size + label_length
+        bits = view[start : start + (num_bits + 7) // 8]
+        if len(bits) != (num_bits + 7) // 8:
+            raise ValueError("Hathifiles Bloom filter is truncated")
+        return cls(
+            num_bits=num_bits,
+            num_hashes=num_hashes,
+            version=bytes(view[HEADER.size : start]).decode(),
+            count=count,
+            bits=bits,
+        )
+
+    @classmethod
+    def open(cls, path: str) -> "BloomFilter":
+        """
+        Memory maps a filter file read only
+
+        Args:
+            path (str): Path to the filter file
+
+        Returns:
+            BloomFilter: The filter. Call close() when done with it.
+        """
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        bloom_filter = cls.from_buffer(mapped)
+        bloom_filter._mmap = mapped
+        return bloom_filter
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self.bits.release()
+            self._mmap.close()
+            self._mmap = None
+
+
+def filter_path(directory: str, namespace: str | None = None) -> str:
+    """
+    Where the filter for a namespace lives
+
+    Args:
+        directory (str): Directory of Bloom filter files
+        namespace (str | None, optional): htid namespace, e.g. "mdp". Defaults to None for every htid.
+
+    Returns:
+        str: path to the filter file
+    """
+    name = f"htids.{namespace}.bloom" if namespace else "htids.bloom"
+    return os.path.join(directory, name)
+
+
+def filter_namespaces(directory: str = S.hathifiles_bloom_filter_dir) -> list[str]:
+    """
+    The namespaces that have their own filter in a directory
+
+    Args:
+        directory (str, optional): Directory of Bloom filter files. Defaults to S.hathifiles_bloom_filter_dir.
+
+    Returns:
+        list[str]: htid namespaces
+    """
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        name.removeprefix("htids.").removesuffix(".bloom")
+        for name in os.listdir(directory)
+        if name.startswith("htids.")
+        and name.endswith(".bloom")
+        and name.count(".") == 2
+    )
+
+
+def filter_etag(path: str) -> str:
+    """
+    An ETag for a filter file that changes whenever the file is rewritten
+
+    Args:
+        path (str): path to the filter file
+
+    Returns:
+        str: The ETag
+    """
+    stat = os.stat(path)
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def build_bloom_filter(
+    db: Connection,
+    version: str,
+    namespace: str | None = None,
+    error_rate: float = 0.001,
+    batch_size: int = 10000,
+) -> BloomFilter:
+    """
+    Builds a Bloom filter of the htids in hf
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        version (str): What the filter is built from, e.g. the name of the last loaded update file
+        namespace (str | None, optional): Only htids in this namespace. Defaults to None for every htid.
+        error_rate (float, optional): False positive rate. Defaults to 0.001.
+        batch_size (int, optional): How many htids to fetch at a time. Defaults to 10000.
+
+    Returns:
+        BloomFilter: The filter
+    """
+    where = []
+    if namespace:
+        where.append(models.Item.htid.startswith(f"{namespace}."))
+    capacity = db.execute(select(func.count()).select_from(models.Item).where(*where))
+    bloom_filter = BloomFilter.for_capacity(
+        capacity.scalar_one(), error_rate=error_rate, version=version
+    )
+    stmnt = select(models.Item.htid).where(*where)
+    htids = db.execute(stmnt.execution_options(yield_per=batch_size)).scalars()
+    for htid in htids:
+        bloom_filter.add(htid)
+    return bloom_filter
+
+
+def write_bloom_filters(
+    db: Connection,
+    version: str,
+    directory: str = S.hathifiles_bloom_filter_dir,
+    namespaces: list[str] | None = None,
+    error_rate: float = 0.001,
+) -> list[str]:
+    """
+    Builds and writes the Bloom filter of every htid, plus one filter for each
+    of the given namespaces
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        version (str): What the filters are built from, e.g. the name of the last loaded update file
+        directory (str, optional): Where to write the filters. Defaults to S.hathifiles_bloom_filter_dir.
+        namespaces (list[str] | None, optional): htid namespaces that get their own filter. Defaults to None.
+        error_rate (float, optional): False positive rate. Defaults to 0.001.
+
+    Returns:
+        list[str]: paths of the written filters
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for namespace in [None, *(namespaces or [])]:
+        bloom_filter = build_bloom_filter(db, version, namespace, error_rate)
+        path = filter_path(directory, namespace)
+        bloom_filter.write(path)
+        S.logger.info(
+            "Wrote hathifiles Bloom filter",
+            path=path,
+            version=version,
+            htids=bloom_filter.count,
+        )
+        paths.append(path)
+    return paths
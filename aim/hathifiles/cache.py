@@ -0,0 +1,178 @@
+"""
+Hathifiles Cache
+================
+
+A small in-process cache for Hathifiles API lookups.
+
+Every API worker has its own cache. Each one notices loads through a load
+generation, the time hf was last changed, which it reads from the database
+now and then. When the generation moves on, the worker drops everything it
+has cached, so a load is seen by all of the workers within a few seconds
+instead of when their entries expire.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+
+#: Returned by TTLCache.get when a key isn't cached. None is a valid cached
+#: value; it means the item isn't in the hathifiles.
+MISSING = object()
+
+
+class TTLCache:
+    """
+    A thread safe least recently used cache whose entries expire after ttl
+    seconds. When it's full, adding an entry evicts the least recently used
+    one. A maxsize of 0 turns the cache off.
+
+    Attributes:
+        maxsize: Most entries to keep
+        ttl: Seconds an entry is kept
+        hits: Number of lookups that were answered from the cache
+        misses: Number of lookups that weren't in the cache or had expired
+        evictions: Number of entries dropped to make room for new ones
+        expirations: Number of entries dropped because they were too old
+        invalidations: Number of entries dropped by invalidate()
+        generation: The load generation the entries were cached under
+    """
+
+    def __init__(self, maxsize: int, ttl: float, timer=time.monotonic) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.generation = None
+        self._generation_checked_at = None
+
+    def generation_due(self, interval: float) -> bool:
+        """
+        Whether it's been interval seconds since the load generation was last
+        checked
+
+        Args:
+            interval (float): Seconds between checks
+
+        Returns:
+            bool: True when the generation should be checked again
+        """
+        with self._lock:
+            checked_at = self._generation_checked_at
+            return checked_at is None or checked_at + interval <= self._timer()
+
+    def check_generation(self, generation) -> bool:
+        """
+        Records the current load generation. When it's different from the one
+        the entries were cached under, they're all dropped.
+
+        Args:
+            generation: The load generation. Anything that compares equal when nothing has been loaded.
+
+        Returns:
+            bool: True when the cache was dropped
+        """
+        with self._lock:
+            self._generation_checked_at = self._timer()
+            if generation == self.generation:
+                return False
+            self.generation = generation
+            self.invalidations += len(self._data)
+            self._data.clear()
+            return True
+
+    def get(self, key):
+        """
+        Gets a value from the cache
+
+        Args:
+            key: The cache key
+
+        Returns:
+            The cached value, or MISSING if it isn't cached or has expired.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= self._timer():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value) -> None:
+        """
+        Puts a value in the cache
+
+        Args:
+            key: The cache key
+            value: The value to cache
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (self._timer() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, keys: list | None = None) -> None:
+        """
+        Drops entries from the cache
+
+        Args:
+            keys (list | None, optional): Keys to drop. Drops everything when None. Defaults to None.
+        """
+        with self._lock:
+            if keys is None:
+                self.invalidations += len(self._data)
+                self._data.clear()
+                return
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        """
+        Drops all of the entries and resets the counters
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expirations = 0
+            self.invalidations = 0
+            self.generation = None
+            self._generation_checked_at = None
+
+    def stats(self) -> dict:
+        """
+        The cache counters
+
+        Returns:
+            dict: size, maxsize, ttl, hits, misses, evictions, expirations, and invalidations
+        """
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
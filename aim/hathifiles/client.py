@@ -1,24 +1,290 @@
+import os
+import tempfile
+import threading
+import time
 import requests
+from datetime import datetime
+from aim.hathifiles.bloom import BloomFilter, filter_path
+from aim.hathifiles.cache import MISSING, TTLCache
+from aim.hathifiles.snapshot import open_snapshot
 from aim.services import S
 
+# Items fetched by any client with their ETag, keyed by htid. They're
+# revalidated with the API every time, so they don't expire.
+_validated_items = TTLCache(maxsize=10000, ttl=float("inf"))
+# Downloaded Bloom filters of htids with their ETag, when they were last
+# checked against the API, and where they're saved, keyed by namespace. None
+# is the filter of every htid. They're shared by every client, and only
+# looked at or replaced while holding the lock.
+_bloom_filters = {}
+_bloom_filters_lock = threading.Lock()
+
+
+def clear_shared_state() -> None:
+    """
+    Closes the Bloom filters and forgets the items that every Client shares
+    """
+    with _bloom_filters_lock:
+        for downloaded in _bloom_filters.values():
+            downloaded["filter"].close()
+        _bloom_filters.clear()
+    _validated_items.clear()
+
 
 class Client:
+    def __init__(self, snapshot_path: str | None = S.hathifiles_snapshot_path) -> None:
+        """
+        A Client keeps a connection to the API open between requests. Use it
+        as a context manager, or call close() when done with it. The snapshot,
+        downloaded Bloom filters and fetched items are shared with every other
+        Client in the process, so a Client is cheap to make.
+
+        Args:
+            snapshot_path (str | None, optional): A Hathifiles snapshot to look items up in instead of calling the API. Defaults to S.hathifiles_snapshot_path.
+        """
+        self._snapshot = open_snapshot(snapshot_path) if snapshot_path else None
+        self._session = requests.Session()
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the connection to the API. The shared snapshot stays open."""
+        self._session.close()
+
     def get_item(self, htid: str):
         """Get an item from the Hathifiles Database
 
+        When this client has fetched the item before, it sends the item's
+        ETag so that an unchanged item costs a 304 instead of a full
+        response.
+
         Args:
             htid (str): HathiTrust id for the item
 
         Returns:
             json: A response object
         """
+        if self._snapshot:
+            return self._snapshot.get_item(htid)
+        if self._definitely_missing(htid):
+            return None
+
         url = self._url(f"items/{htid}")
-        response = requests.get(url)
+        cached = _validated_items.get(htid)
+        if cached is MISSING:
+            cached = None
+        headers = {"If-None-Match": cached["etag"]} if cached else {}
+        response = self._session.get(url, headers=headers)
+        if response.status_code == 304 and cached:
+            return cached["item"]
+        if response.status_code == 404:
+            _validated_items.invalidate([htid])
+            return None
+        elif response.status_code != 200:
+            response.raise_for_status()
+
+        item = response.json()
+        if "ETag" in response.headers:
+            _validated_items.set(htid, {"etag": response.headers["ETag"], "item": item})
+        return item
+
+    def get_items(self, htids: list[str], batch_size: int = 1000):
+        """Get many items from the Hathifiles Database. The htids are sent to
+        the batch endpoint in groups of batch_size.
+
+        Args:
+            htids (list[str]): HathiTrust ids for the items
+            batch_size (int, optional): How many htids to send with each request. Defaults to 1000, the most the API accepts.
+
+        Returns:
+            dict: "items" with the items that were found and "missing" with the htids that were not found
+        """
+        if self._snapshot:
+            return self._snapshot.get_items(htids)
+
+        result = {"items": [], "missing": []}
+        url = self._url("items")
+        lookups = [htid for htid in htids if not self._definitely_missing(htid)]
+        for start in range(0, len(lookups), batch_size):
+            response = self._session.post(
+                url, json={"htids": lookups[start : start + batch_size]}
+            )
+            if response.status_code != 200:
+                response.raise_for_status()
+            page = response.json()
+            result["items"].extend(page["items"])
+        found = {item["htid"] for item in result["items"]}
+        result["missing"] = list(dict.fromkeys(h for h in htids if h not in found))
+        return result
+
+    def get_record(self, bib_num: int):
+        """Get a HathiTrust bibliographic record and all of its items from the
+        Hathifiles Database
+
+        Args:
+            bib_num (int): HathiTrust record number
+
+        Returns:
+            json: The record with its items under "items". None if it's not found.
+        """
+        url = self._url(f"records/{bib_num}")
+        response = self._session.get(url)
         if response.status_code == 404:
             return None
         elif response.status_code != 200:
             response.raise_for_status()
         return response.json()
 
+    def get_changes(
+        self,
+        since: datetime,
+        namespace: str | None = None,
+        content_provider_code: str | None = None,
+        limit: int = 1000,
+    ):
+        """Get the items whose rights_timestamp changed since a time. Pages
+        through the change feed with its cursor.
+
+        Args:
+            since (datetime): Get items with a rights_timestamp on or after this time
+            namespace (str | None, optional): Only items with this htid namespace, e.g. "mdp". Defaults to None.
+            content_provider_code (str | None, optional): Only items from this content provider. Defaults to None.
+            limit (int, optional): How many items to fetch with each page. Defaults to 1000.
+
+        Yields:
+            json: Items in rights_timestamp and then htid order
+        """
+        url = self._url("items/changes")
+        params = {"since": since.isoformat(), "limit": limit}
+        if namespace:
+            params["namespace"] = namespace
+        if content_provider_code:
+            params["content_provider_code"] = content_provider_code
+
+        while True:
+            response = self._session.get(url, params=params)
+            if response.status_code != 200:
+                response.raise_for_status()
+            page = response.json()
+            yield from page["items"]
+            if not page["next_cursor"]:
+                break
+            params["cursor"] = page["next_cursor"]
+
+    def get_items_by_identifier(self, identifier_type: str, value: str) -> list:
+        """Get all of the items in the Hathifiles Database with an identifier
+
+        Args:
+            identifier_type (str): One of oclc, isbn, issn, or lccn
+            value (str): The identifier
+
+        Returns:
+            list: The items with the identifier
+        """
+        url = self._url(f"{identifier_type}/{value}")
+        response = self._session.get(url)
+        if response.status_code != 200:
+            response.raise_for_status()
+        return response.json()
+
+    def download_bloom_filter(
+        self,
+        namespace: str | None = None,
+        directory: str = S.hathifiles_bloom_filter_dir,
+    ) -> BloomFilter:
+        """Download a Bloom filter of htids from the Hathifiles API and memory
+        map it. After this, get_item and get_items don't ask the API about
+        htids that the filter says definitely aren't in the Hathifiles.
+
+        The filter's ETag is kept. Once the filter is older than
+        S.hathifiles_bloom_filter_max_age seconds, it's checked against the
+        API with a conditional GET before it's trusted to say an htid is
+        missing, and downloaded again if it's been rebuilt.
+
+        Args:
+            namespace (str | None, optional): Only htids in this namespace, e.g. "mdp". Defaults to None for every htid.
+            directory (str, optional): Where to save the filter. Defaults to S.hathifiles_bloom_filter_dir.
+
+        Returns:
+            BloomFilter: The filter
+        """
+        with _bloom_filters_lock:
+            downloaded = _bloom_filters.get(namespace)
+        return self._update_bloom_filter(namespace, directory, downloaded)["filter"]
+
+    def _update_bloom_filter(
+        self, namespace: str | None, directory: str, downloaded: dict | None
+    ) -> dict:
+        # Checks the filter for a namespace against the API, and downloads it
+        # again if it's been rebuilt. The request is made without holding
+        # _bloom_filters_lock, so other clients can keep using the filters
+        # they have; the lock is only taken to swap in the new filter.
+        params = {"namespace": namespace} if namespace else {}
+        headers = {"If-None-Match": downloaded["etag"]} if downloaded else {}
+        response = self._session.get(
+            self._url("htids/bloom-filter"),
+            params=params,
+            headers=headers,
+            stream=True,
+        )
+        if response.status_code == 304 and downloaded:
+            with _bloom_filters_lock:
+                downloaded["checked_at"] = time.monotonic()
+            return downloaded
+        if response.status_code != 200:
+            response.raise_for_status()
+
+        os.makedirs(directory, exist_ok=True)
+        path = filter_path(directory, namespace)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+        os.replace(tmp_path, path)
+        updated = {
+            "filter": BloomFilter.open(path),
+            "etag": response.headers.get("ETag"),
+            "checked_at": time.monotonic(),
+            "directory": directory,
+        }
+
+        with _bloom_filters_lock:
+            replaced = _bloom_filters.get(namespace)
+            _bloom_filters[namespace] = updated
+            # Filters are only looked at holding the lock, so nothing is
+            # reading the old one
+            if replaced:
+                replaced["filter"].close()
+        return updated
+
+    def _definitely_missing(self, htid: str) -> bool:
+        namespace = htid.split(".", 1)[0]
+        with _bloom_filters_lock:
+            if namespace not in _bloom_filters:
+                namespace = None
+            downloaded = _bloom_filters.get(namespace)
+            if downloaded is None or htid in downloaded["filter"]:
+                return False
+            # Only a negative is trusted without asking the API, so that's
+            # when the filter has to be current
+            age = time.monotonic() - downloaded["checked_at"]
+            if age < S.hathifiles_bloom_filter_max_age:
+                return True
+
+        try:
+            self._update_bloom_filter(namespace, downloaded["directory"], downloaded)
+        except requests.RequestException as error:
+            S.logger.warning(
+                "Couldn't check the hathifiles Bloom filter", error=str(error)
+            )
+            return False
+        with _bloom_filters_lock:
+            downloaded = _bloom_filters.get(namespace)
+            return downloaded is not None and htid not in downloaded["filter"]
+
     def _url(self, path) -> str:
         return f"{S.hathifiles_api_url}/{path}"
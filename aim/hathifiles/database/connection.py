@@ -0,0 +1,95 @@
+"""
+Hathifiles Database Connections
+===============================
+
+The Hathifiles API runs its queries through one of these classes so that the
+same handlers work with the synchronous mysqlclient engine or with an async
+engine. Both check out a connection the first time a query runs, so requests
+answered from the cache don't touch the database.
+"""
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+class SyncDatabase:
+    """
+    Runs queries on a synchronous connection in the threadpool. Checking the
+    connection out, which pings the server, and closing it, which rolls back,
+    happen in the threadpool too, so the event loop never waits on the
+    database.
+    """
+
+    def __init__(
+        self, engine: Engine | None = None, connection: Connection | None = None
+    ) -> None:
+        """
+        Args:
+            engine (Engine | None, optional): Engine to check out a connection from. Defaults to None.
+            connection (Connection | None, optional): An already open connection. Defaults to None.
+        """
+        self._engine = engine
+        self._connection = connection
+
+    @property
+    def connection(self) -> Connection:
+        if self._connection is None:
+            self._connection = self._engine.connect()
+        return self._connection
+
+    async def execute(self, stmnt, parameters=None):
+        """
+        Runs a statement
+
+        Args:
+            stmnt: The statement to run
+            parameters (optional): Bound parameters for the statement. Defaults to None.
+
+        Returns:
+            sqlalchemy.CursorResult: The result
+        """
+        return await run_in_threadpool(
+            lambda: self.connection.execute(stmnt, parameters)
+        )
+
+    async def close(self) -> None:
+        if self._engine is not None and self._connection is not None:
+            await run_in_threadpool(self._connection.close)
+
+
+class AsyncDatabase:
+    """
+    Runs queries on an async connection without tying up a threadpool worker.
+    """
+
+    def __init__(self, engine: AsyncEngine) -> None:
+        """
+        Args:
+            engine (AsyncEngine): Engine to check out a connection from.
+        """
+        self._engine = engine
+        self._connection = None
+
+    async def execute(self, stmnt, parameters=None):
+        """
+        Runs a statement
+
+        Args:
+            stmnt: The statement to run
+            parameters (optional): Bound parameters for the statement. Defaults to None.
+
+        Returns:
+            sqlalchemy.CursorResult: The buffered result
+        """
+        if self._connection is None:
+            self._connection = await self._engine.connect()
+        return await self._connection.execute(stmnt, parameters)
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
+
+
+#: Either kind of database the Hathifiles API runs queries through
+Database = SyncDatabase | AsyncDatabase
@@ -0,0 +1,60 @@
+"""Creating initial hf table
+
+Revision ID: 1bf40ff0d09b
+Revises:
+Create Date: 2026-10-18 10:12:41.118305
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "1bf40ff0d09b"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing hathifiles databases already have an hf table that was created
+    # by the old hathifiles loader. It has the same columns, so leave it be.
+    if sa.inspect(op.get_bind()).has_table("hf"):
+        return
+
+    op.create_table(
+        "hf",
+        sa.Column("htid", sa.String(length=255), nullable=False),
+        sa.Column("access", sa.Boolean(), nullable=True),
+        sa.Column("rights_code", sa.String(length=255), nullable=True),
+        sa.Column("bib_num", sa.BigInteger(), nullable=True),
+        sa.Column("description", sa.String(length=255), nullable=True),
+        sa.Column("source", sa.String(length=255), nullable=True),
+        sa.Column("source_bib_num", sa.Text(), nullable=True),
+        sa.Column("oclc", sa.String(length=255), nullable=True),
+        sa.Column("isbn", sa.Text(), nullable=True),
+        sa.Column("issn", sa.Text(), nullable=True),
+        sa.Column("lccn", sa.String(length=255), nullable=True),
+        sa.Column("title", sa.Text(), nullable=True),
+        sa.Column("imprint", sa.Text(), nullable=True),
+        sa.Column("rights_reason", sa.String(length=255), nullable=True),
+        sa.Column("rights_timestamp", sa.DateTime(), nullable=True),
+        sa.Column("us_gov_doc_flag", sa.Boolean(), nullable=True),
+        sa.Column("rights_date_used", sa.Integer(), nullable=True),
+        sa.Column("pub_place", sa.String(length=255), nullable=True),
+        sa.Column("lang_code", sa.String(length=255), nullable=True),
+        sa.Column("bib_fmt", sa.String(length=255), nullable=True),
+        sa.Column("collection_code", sa.String(length=255), nullable=True),
+        sa.Column("content_provider_code", sa.String(length=255), nullable=True),
+        sa.Column("responsible_entity_code", sa.String(length=255), nullable=True),
+        sa.Column("digitization_agent_code", sa.String(length=255), nullable=True),
+        sa.Column("access_profile_code", sa.String(length=255), nullable=True),
+        sa.Column("author", sa.Text(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("hf")
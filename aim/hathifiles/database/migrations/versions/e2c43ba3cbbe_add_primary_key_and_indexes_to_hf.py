@@ -0,0 +1,39 @@
+"""Add primary key and indexes to hf
+
+Revision ID: e2c43ba3cbbe
+Revises: 1bf40ff0d09b
+Create Date: 2026-10-18 10:20:09.532671
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e2c43ba3cbbe"
+down_revision: Union[str, None] = "1bf40ff0d09b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_primary_key("pk_hf", "hf", ["htid"])
+    op.create_index(op.f("ix_hf_bib_num"), "hf", ["bib_num"], unique=False)
+    op.create_index(
+        op.f("ix_hf_content_provider_code"),
+        "hf",
+        ["content_provider_code"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_hf_rights_timestamp"), "hf", ["rights_timestamp"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_hf_rights_timestamp"), table_name="hf")
+    op.drop_index(op.f("ix_hf_content_provider_code"), table_name="hf")
+    op.drop_index(op.f("ix_hf_bib_num"), table_name="hf")
+    op.drop_constraint("pk_hf", "hf", type_="primary")
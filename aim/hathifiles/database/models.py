@@ -0,0 +1,157 @@
+"""
+Hathifiles Models
+=================
+"""
+
+from sqlalchemy import (
+    String,
+    Text,
+    BigInteger,
+    Integer,
+    Boolean,
+    Date,
+    DateTime,
+    BINARY,
+    Index,
+)
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+import datetime
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Item(Base):
+    """
+    A row of the hathifiles. The columns are in the same order as the columns
+    of the hathifiles.
+    """
+
+    __tablename__ = "hf"
+    # For the filtered listing at GET /items. Each index ends in
+    # rights_timestamp, the listing's sort order, and InnoDB adds the htid
+    # primary key after it, so a page is a seek and a short range scan. The
+    # content_provider_code one also stands in for an index on that column.
+    __table_args__ = (
+        Index(
+            "ix_hf_rights_code_access_rights_timestamp",
+            "rights_code",
+            "access",
+            "rights_timestamp",
+        ),
+        Index(
+            "ix_hf_content_provider_code_rights_timestamp",
+            "content_provider_code",
+            "rights_timestamp",
+        ),
+        Index(
+            "ix_hf_digitization_agent_code_rights_timestamp",
+            "digitization_agent_code",
+            "rights_timestamp",
+        ),
+    )
+
+    htid: Mapped[str] = mapped_column(String(255), primary_key=True)
+    access: Mapped[bool] = mapped_column(Boolean, nullable=True)
+    rights_code: Mapped[str] = mapped_column(String(255), nullable=True)
+    bib_num: Mapped[int] = mapped_column(BigInteger, nullable=True, index=True)
+    description: Mapped[str] = mapped_column(String(255), nullable=True)
+    source: Mapped[str] = mapped_column(String(255), nullable=True)
+    source_bib_num: Mapped[str] = mapped_column(Text, nullable=True)
+    oclc: Mapped[str] = mapped_column(String(255), nullable=True)
+    isbn: Mapped[str] = mapped_column(Text, nullable=True)
+    issn: Mapped[str] = mapped_column(Text, nullable=True)
+    lccn: Mapped[str] = mapped_column(String(255), nullable=True)
+    title: Mapped[str] = mapped_column(Text, nullable=True)
+    imprint: Mapped[str] = mapped_column(Text, nullable=True)
+    rights_reason: Mapped[str] = mapped_column(String(255), nullable=True)
+    rights_timestamp: Mapped[datetime.datetime] = mapped_column(
+        DateTime, nullable=True, index=True
+    )
+    us_gov_doc_flag: Mapped[bool] = mapped_column(Boolean, nullable=True)
+    rights_date_used: Mapped[int] = mapped_column(Integer, nullable=True)
+    pub_place: Mapped[str] = mapped_column(String(255), nullable=True)
+    lang_code: Mapped[str] = mapped_column(String(255), nullable=True)
+    bib_fmt: Mapped[str] = mapped_column(String(255), nullable=True)
+    collection_code: Mapped[str] = mapped_column(String(255), nullable=True)
+    content_provider_code: Mapped[str] = mapped_column(String(255), nullable=True)
+    responsible_entity_code: Mapped[str] = mapped_column(String(255), nullable=True)
+    digitization_agent_code: Mapped[str] = mapped_column(String(255), nullable=True)
+    access_profile_code: Mapped[str] = mapped_column(String(255), nullable=True)
+    author: Mapped[str] = mapped_column(Text, nullable=True)
+    #: A hash of the hathifiles line the row was loaded from. The loader
+    #: compares it with incoming lines to skip rows that haven't changed.
+    row_hash: Mapped[bytes] = mapped_column(BINARY(16), nullable=True)
+
+
+class Identifier(Base):
+    """
+    A normalized OCLC number, ISBN, ISSN or LCCN for a hathifiles item. There
+    is one row for each distinct identifier of an item.
+    """
+
+    __tablename__ = "hf_identifier"
+
+    identifier_type: Mapped[str] = mapped_column(String(8), primary_key=True)
+    value: Mapped[str] = mapped_column(String(255), primary_key=True)
+    htid: Mapped[str] = mapped_column(String(255), primary_key=True, index=True)
+
+
+class LoadCheckpoint(Base):
+    """
+    How far the loader has got with a hathifile. The checkpoint is saved as
+    each batch is committed, so a load that dies part way through picks up
+    after the last committed batch when it's run again.
+    """
+
+    __tablename__ = "hf_load_checkpoint"
+
+    #: Name of the hathifile
+    file: Mapped[str] = mapped_column(String(255), primary_key=True)
+    #: "update" or "full"
+    kind: Mapped[str] = mapped_column(String(8))
+    #: Size of the hathifile, so a different file with the same name starts over
+    size: Mapped[int] = mapped_column(BigInteger)
+    #: "loading", "loaded" (a full load that's ready to swap in) or "complete"
+    status: Mapped[str] = mapped_column(String(16))
+    #: Lines of the file read through the last committed batch
+    line: Mapped[int] = mapped_column(BigInteger, default=0)
+    #: Number of the last committed batch
+    batch: Mapped[int] = mapped_column(Integer, default=0)
+    rows: Mapped[int] = mapped_column(BigInteger, default=0)
+    inserted: Mapped[int] = mapped_column(BigInteger, default=0)
+    updated: Mapped[int] = mapped_column(BigInteger, default=0)
+    unchanged: Mapped[int] = mapped_column(BigInteger, default=0)
+    filtered: Mapped[int] = mapped_column(BigInteger, default=0)
+    #: Bytes of the change manifest written through the last committed batch
+    manifest_offset: Mapped[int] = mapped_column(BigInteger, default=0)
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime)
+
+
+class SummaryCount(Base):
+    """
+    How many rows of hf have each value of a summarized column. The loader
+    keeps it up to date as it loads update files, so dashboards don't have
+    to GROUP BY over hf.
+    """
+
+    __tablename__ = "hf_summary_count"
+
+    #: rights_code, access, bib_fmt or content_provider_code
+    field: Mapped[str] = mapped_column(String(32), primary_key=True)
+    #: The value, "" for an empty one. access is "1" or "0".
+    value: Mapped[str] = mapped_column(String(255), primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger)
+
+
+class SummaryDay(Base):
+    """
+    How many rows of hf have a rights_timestamp on each day. The loader keeps
+    it up to date along with hf_summary_count.
+    """
+
+    __tablename__ = "hf_summary_day"
+
+    day: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger)
@@ -0,0 +1,320 @@
+"""
+Hathifiles Downloads
+====================
+
+Downloads hathifiles listed in hathi_file_list.json into a local cache
+directory. A download is written to a ``.part`` file and picked up again
+with an HTTP Range request when the connection drops, so a network blip
+part way through a multi-GB full file doesn't start it over. Finished
+downloads are checked against the size in the file list, and against the
+gzip CRC of the file, before they're renamed into place.
+"""
+
+import gzip
+import hashlib
+import os
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import requests
+from aim.hathifiles.poll import get_hathi_file_list
+from aim.hathifiles.state import DOWNLOADED, StateStore, file_date
+from aim.services import S
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class DownloadStats:
+    """
+    What happened while downloading a file
+    """
+
+    #: Path of the downloaded file
+    path: str
+    #: Bytes received, not counting bytes from an earlier partial download
+    received: int
+    #: How many times the download was picked up again after an interruption
+    resumed: int
+    #: False when the file was already in the cache
+    downloaded: bool = True
+
+
+def verify_file(
+    path: str,
+    size: int | None = None,
+    md5: str | None = None,
+    gzipped: bool = False,
+) -> None:
+    """
+    Checks a downloaded file against its expected size and checksum
+
+    Args:
+        path (str): Path to the file
+        size (int | None, optional): Expected size in bytes. Defaults to None.
+        md5 (str | None, optional): Expected md5 hex digest. Defaults to None.
+        gzipped (bool, optional): Read the file through gzip, which checks the CRC32 at the end of it. Defaults to False.
+
+    Raises:
+        ValueError: When the file doesn't match
+    """
+    actual_size = os.path.getsize(path)
+    if size is not None and actual_size != size:
+        raise ValueError(f"{path} is {actual_size} bytes, expected {size}")
+    if md5 is not None:
+        digest = hashlib.md5()
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                digest.update(chunk)
+        if digest.hexdigest() != md5.lower():
+            raise ValueError(f"{path} has md5 {digest.hexdigest()}, expected {md5}")
+    if gzipped:
+        try:
+            with gzip.open(path, "rb") as f:
+                while f.read(CHUNK_SIZE):
+                    pass
+        except (OSError, EOFError, zlib.error) as error:
+            raise ValueError(f"{path} failed its gzip check: {error}")
+
+
+def fetch(
+    url: str,
+    part_path: str,
+    retries: int = 5,
+    backoff: float = 1.0,
+    timeout: float = 60,
+    size: int | None = None,
+) -> tuple[int, int]:
+    """
+    Downloads url into part_path, resuming from whatever is already in
+    part_path. Interrupted downloads and server errors are retried with a
+    Range request for the rest of the file. A part_path that's already
+    complete isn't fetched again.
+
+    Args:
+        url (str): URL of the file
+        part_path (str): Where to write the file
+        retries (int, optional): How many interruptions and server errors to recover from. Defaults to 5.
+        backoff (float, optional): Seconds to wait before the first retry. Doubles after each one. Defaults to 1.0.
+        timeout (float, optional): Connect and read timeout in seconds. Defaults to 60.
+        size (int | None, optional): Expected size of the file in bytes. Defaults to None.
+
+    Raises:
+        requests.RequestException: When the download still fails after all the retries
+
+    Returns:
+        tuple[int, int]: Bytes received and the number of resumes
+    """
+    received = 0
+    attempt = 0
+    while True:
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if offset and offset == size:
+            # An earlier run got all of it but didn't finish verifying it
+            return received, attempt
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            with requests.get(
+                url, headers=headers, stream=True, timeout=timeout
+            ) as response:
+                if response.status_code == 416:
+                    # "bytes */N" says how big the file on the server is
+                    content_range = response.headers.get("Content-Range", "")
+                    if content_range == f"bytes */{offset}":
+                        return received, attempt
+                    # The partial file is no good, e.g. the file on the
+                    # server got smaller. Start over.
+                    os.remove(part_path)
+                    continue
+                response.raise_for_status()
+                # A server that ignores Range sends the whole file
+                mode = "ab" if response.status_code == 206 else "wb"
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        received += len(chunk)
+            return received, attempt
+        except (
+            requests.ConnectionError,
+            requests.Timeout,
+            # Raised when the connection drops part way through the body
+            requests.exceptions.ChunkedEncodingError,
+            requests.HTTPError,
+        ) as error:
+            # Client errors won't go away by asking again
+            server_error = (
+                not isinstance(error, requests.HTTPError)
+                or error.response.status_code >= 500
+            )
+            if not server_error or attempt >= retries:
+                raise
+            attempt += 1
+            S.logger.warning(
+                "Hathifiles download interrupted",
+                url=url,
+                attempt=attempt,
+                error=str(error),
+            )
+        time.sleep(backoff * 2 ** (attempt - 1))
+
+
+def download_file(
+    entry: dict,
+    directory: str = S.hathifiles_download_dir,
+    retries: int = 5,
+    backoff: float = 1.0,
+) -> DownloadStats:
+    """
+    Downloads a file from hathi_file_list.json into the cache directory. A
+    file that's already there with the right size isn't downloaded again.
+
+    Args:
+        entry (dict): The file's entry in hathi_file_list.json
+        directory (str, optional): The cache directory. Defaults to S.hathifiles_download_dir.
+        retries (int, optional): How many interruptions to recover from. Defaults to 5.
+        backoff (float, optional): Seconds to wait before the first retry. Defaults to 1.0.
+
+    Raises:
+        ValueError: When the downloaded file fails verification. The partial file is removed so the next try starts over.
+
+    Returns:
+        DownloadStats: What happened
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, entry["filename"])
+    size = entry.get("size")
+    if os.path.exists(path) and (size is None or os.path.getsize(path) == size):
+        return DownloadStats(path=path, received=0, resumed=0, downloaded=False)
+
+    part_path = f"{path}.part"
+    received, resumed = fetch(entry["url"], part_path, retries, backoff, size=size)
+    try:
+        verify_file(
+            part_path,
+            size=size,
+            md5=entry.get("md5"),
+            gzipped=entry["filename"].endswith(".gz"),
+        )
+    except ValueError:
+        os.remove(part_path)
+        raise
+    os.replace(part_path, path)
+    S.logger.info(
+        "Downloaded hathifile",
+        path=path,
+        received=received,
+        resumed=resumed,
+    )
+    return DownloadStats(path=path, received=received, resumed=resumed)
+
+
+def files_to_download(
+    hathi_file_list: list, full: bool = False, since: datetime | None = None
+) -> list:
+    """
+    The entries in hathi_file_list.json to download: the update files, plus
+    the newest full file when full is True
+
+    Args:
+        hathi_file_list (list): Entries from hathi_file_list.json
+        full (bool, optional): Include the newest full file. Defaults to False.
+        since (datetime | None, optional): Leave out update files older than this. Defaults to None for all of them.
+
+    Returns:
+        list: Entries to download, oldest first
+    """
+    entries = [
+        entry
+        for entry in hathi_file_list
+        if not entry["full"]
+        and (since is None or file_date(entry["filename"]) >= since.date())
+    ]
+    full_files = [entry for entry in hathi_file_list if entry["full"]]
+    if full and full_files:
+        entries.append(max(full_files, key=lambda e: file_date(e["filename"])))
+    return sorted(entries, key=lambda e: file_date(e["filename"]))
+
+
+def prune_downloads(
+    directory: str = S.hathifiles_download_dir,
+    retention_days: int = S.hathifiles_retention_days,
+    keep_full_files: int = 1,
+    today: datetime | None = None,
+) -> list[str]:
+    """
+    Removes hathifiles from the cache directory that are past the retention
+    period. The newest full files are kept however old they are, since
+    they're what the update files apply to. Partial downloads, and files
+    that aren't named like dated hathifiles, are left alone.
+
+    Args:
+        directory (str, optional): The cache directory. Defaults to S.hathifiles_download_dir.
+        retention_days (int, optional): How many days of files to keep. Defaults to S.hathifiles_retention_days.
+        keep_full_files (int, optional): How many of the newest full files to always keep. Defaults to 1.
+        today (datetime | None, optional): The date to count from. Defaults to None for today.
+
+    Returns:
+        list[str]: paths of the removed files
+    """
+    if not os.path.isdir(directory):
+        return []
+    cutoff = ((today or datetime.today()) - timedelta(days=retention_days)).date()
+    dates = {}
+    for name in os.listdir(directory):
+        if not name.startswith("hathi_") or name.endswith(".part"):
+            continue
+        try:
+            dates[name] = file_date(name)
+        except ValueError:
+            # Not a dated hathifile, like hathi_file_list.json
+            continue
+    files = sorted(dates, key=dates.get, reverse=True)
+    full_files = [name for name in files if name.startswith("hathi_full_")]
+    keep = set(full_files[:keep_full_files])
+    removed = []
+    for name in files:
+        if name not in keep and dates[name] < cutoff:
+            path = os.path.join(directory, name)
+            os.remove(path)
+            removed.append(path)
+    if removed:
+        S.logger.info("Pruned hathifiles downloads", files=len(removed))
+    return removed
+
+
+def download_new_files(
+    hathi_file_list: list | None = None,
+    directory: str = S.hathifiles_download_dir,
+    full: bool = False,
+    prune: bool = True,
+    retention_days: int = S.hathifiles_retention_days,
+    store: StateStore | None = None,
+) -> list[DownloadStats]:
+    """
+    Downloads the files in hathi_file_list.json that aren't in the cache yet
+    and then prunes the cache. Update files past the retention period
+    aren't downloaded, so pruned files don't come back.
+
+    Args:
+        hathi_file_list (list | None, optional): Entries from hathi_file_list.json. This will call get_hathi_file_list() when None is given.
+        directory (str, optional): The cache directory. Defaults to S.hathifiles_download_dir.
+        full (bool, optional): Also download the newest full file. Defaults to False.
+        prune (bool, optional): Prune the cache afterwards. Defaults to True.
+        retention_days (int, optional): How many days of files to keep. Defaults to S.hathifiles_retention_days.
+        store (StateStore | None, optional): A state store to mark the files downloaded in. Defaults to None.
+
+    Returns:
+        list[DownloadStats]: What happened for each file
+    """
+    if hathi_file_list is None:  # pragma: no cover
+        hathi_file_list = get_hathi_file_list()
+    since = datetime.today() - timedelta(days=retention_days)
+    results = []
+    for entry in files_to_download(hathi_file_list, full, since):
+        results.append(download_file(entry, directory))
+        if store is not None:
+            store.mark(entry["filename"], DOWNLOADED)
+    if prune:
+        prune_downloads(directory, retention_days)
+    return results
@@ -0,0 +1,232 @@
+"""
+Hathifiles Parquet Exports
+==========================
+
+Writes hf, or a hathifile, to a Parquet dataset for analytics, so rights
+code breakdowns, provider counts and date histograms can be run with
+DuckDB, pandas or Spark instead of against the Hathifiles Database.
+
+The dataset is hive partitioned, by content_provider_code by default, and
+zstd compressed. oclc, isbn, issn and lccn are list columns and empty
+strings are nulls. Rows are streamed through in batches and written in row
+groups as they arrive, so memory use doesn't depend on the size of hf.
+
+Exports need pyarrow, which is in the optional ``parquet`` extra. Install
+it first with ``poetry install --extras parquet``.
+"""
+
+import os
+import shutil
+from typing import Iterable, Iterator
+from sqlalchemy import Connection, select
+from aim.hathifiles.database import models
+from aim.hathifiles.parsing import read_chunks
+from aim.hathifiles.profiles import Profile
+from aim.hathifiles.serialization import FIELDS, LIST_FIELDS
+from aim.services import S
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # pragma: no cover
+    pa = None
+
+#: The column an export is partitioned by when no other is given
+PARTITION_BY = ("content_provider_code",)
+
+
+def parquet_schema():
+    """
+    The Arrow schema of an export, with the columns in hathifiles order
+
+    Returns:
+        pyarrow.Schema: The schema
+    """
+    types = {
+        "access": pa.bool_(),
+        "bib_num": pa.int64(),
+        "rights_timestamp": pa.timestamp("us"),
+        "us_gov_doc_flag": pa.bool_(),
+        "rights_date_used": pa.int32(),
+    }
+    return pa.schema(
+        [
+            (
+                name,
+                pa.list_(pa.string())
+                if name in LIST_FIELDS
+                else types.get(name, pa.string()),
+            )
+            for name in FIELDS
+        ]
+    )
+
+
+def export_row(data) -> dict:
+    """
+    Turns an hf row or a parsed hathifiles line into a row of the export
+
+    Args:
+        data (Mapping): The row's columns
+
+    Returns:
+        dict: The row
+    """
+    row = {}
+    for name in FIELDS:
+        value = data[name]
+        if name in LIST_FIELDS:
+            value = [part for part in (value or "").split(",") if part]
+        elif value == "":
+            value = None
+        row[name] = value
+    return row
+
+
+def _record_batches(
+    batches: Iterable[list], schema, counter: list[int]
+) -> Iterator["pa.RecordBatch"]:
+    for rows in batches:
+        counter[0] += len(rows)
+        yield pa.RecordBatch.from_pylist(
+            [export_row(row._asdict()) for row in rows], schema=schema
+        )
+
+
+def write_parquet(
+    path: str,
+    batches: Iterable[list],
+    partition_by: Iterable[str] = PARTITION_BY,
+    row_group_size: int = 100000,
+    compression: str = "zstd",
+) -> int:
+    """
+    Writes batches of rows into a new Parquet dataset. The dataset is built
+    next to path and then moved into place, so nothing reads a half written
+    export.
+
+    Rows are buffered in each partition until there are a tenth of
+    row_group_size of them, so memory use grows with the number of
+    partitions, not the number of rows.
+
+    Args:
+        path (str): The directory to write the dataset to. Anything already there is replaced.
+        batches (Iterable[list]): Batches of hf rows or parsed hathifiles lines
+        partition_by (Iterable[str], optional): Columns to partition by. Defaults to PARTITION_BY.
+        row_group_size (int, optional): The most rows in each row group. Defaults to 100000.
+        compression (str, optional): Parquet compression codec. Defaults to "zstd".
+
+    Raises:
+        ModuleNotFoundError: When pyarrow isn't installed
+
+    Returns:
+        int: The number of rows in the export
+    """
+    if pa is None:  # pragma: no cover
+        raise ModuleNotFoundError(
+            "Parquet exports need pyarrow. Install it with `poetry install --extras parquet`."
+        )
+    partition_by = list(partition_by)
+    schema = parquet_schema()
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    counter = [0]
+    parquet = ds.ParquetFileFormat()
+    ds.write_dataset(
+        _record_batches(batches, schema, counter),
+        tmp_path,
+        schema=schema,
+        format=parquet,
+        file_options=parquet.make_write_options(compression=compression),
+        partitioning=partition_by or None,
+        partitioning_flavor="hive" if partition_by else None,
+        basename_template="part-{i}.parquet",
+        min_rows_per_group=max(row_group_size // 10, 1),
+        max_rows_per_group=row_group_size,
+        existing_data_behavior="error",
+    )
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return counter[0]
+
+
+def export_parquet(
+    db: Connection,
+    path: str,
+    profile: Profile | None = None,
+    partition_by: Iterable[str] = PARTITION_BY,
+    batch_size: int = 10000,
+    row_group_size: int = 100000,
+) -> int:
+    """
+    Exports hf from the Hathifiles Database to a Parquet dataset
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        path (str): The directory to write the dataset to
+        profile (Profile | None, optional): Only export the items in this subset profile. Defaults to None for every item.
+        partition_by (Iterable[str], optional): Columns to partition by. Defaults to PARTITION_BY.
+        batch_size (int, optional): How many rows to read at a time. Defaults to 10000.
+        row_group_size (int, optional): The most rows in each row group. Defaults to 100000.
+
+    Returns:
+        int: The number of rows in the export
+    """
+    stmnt = select(*[models.Item.__table__.c[name] for name in FIELDS])
+    if profile is not None and not profile.is_everything:
+        stmnt = stmnt.where(profile.where())
+    result = db.execute(stmnt.execution_options(yield_per=batch_size))
+    total = write_parquet(
+        path,
+        result.partitions(),
+        partition_by=partition_by,
+        row_group_size=row_group_size,
+    )
+    S.logger.info(
+        "Exported hathifiles to Parquet",
+        path=path,
+        profile=profile.name if profile else None,
+        rows=total,
+    )
+    return total
+
+
+def export_parquet_from_file(
+    hathifile: str,
+    path: str,
+    profile: Profile | None = None,
+    partition_by: Iterable[str] = PARTITION_BY,
+    batch_size: int = 10000,
+    row_group_size: int = 100000,
+) -> int:
+    """
+    Exports a hathifile straight to a Parquet dataset, without a Hathifiles
+    Database
+
+    Args:
+        hathifile (str): Path to a hathifile
+        path (str): The directory to write the dataset to
+        profile (Profile | None, optional): Only export the lines in this subset profile. Defaults to None for every line.
+        partition_by (Iterable[str], optional): Columns to partition by. Defaults to PARTITION_BY.
+        batch_size (int, optional): How many lines to read at a time. Defaults to 10000.
+        row_group_size (int, optional): The most rows in each row group. Defaults to 100000.
+
+    Returns:
+        int: The number of rows in the export
+    """
+    total = write_parquet(
+        path,
+        read_chunks(hathifile, batch_size, profile),
+        partition_by=partition_by,
+        row_group_size=row_group_size,
+    )
+    S.logger.info(
+        "Exported hathifiles to Parquet",
+        path=path,
+        hathifile=hathifile,
+        profile=profile.name if profile else None,
+        rows=total,
+    )
+    return total
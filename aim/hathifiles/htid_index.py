@@ -0,0 +1,271 @@
+"""
+Hathifiles htid Index
+=====================
+
+A compact binary index of the htids in a hathifile, for batch jobs that only
+need to know whether an htid is in HathiTrust and its rights. It's built
+straight from a hathifile and read through ``mmap``, so a lookup is a binary
+search over the page cache with no database or API behind it, and the file
+can be copied into a batch pod on its own.
+
+The file is a header followed by fixed-width records sorted by htid::
+
+    magic      8 bytes   b"HTIDIDX1"
+    count      uint64    number of records
+    width      uint16    bytes in the htid field
+    size       uint16    bytes in a record
+    codes_len  uint32    bytes in the rights code table
+    offset     uint32    where the records start
+    codes      codes_len bytes, the rights codes joined by newlines
+    records    count * size bytes, from offset
+
+Each record is the htid NUL padded to width, the rights_timestamp in seconds
+since the epoch as a uint32 (0 when there isn't one), access as a uint8 and
+the rights code as a uint8 index into the rights code table. All integers
+are little endian.
+
+The index is built with an external sort: chunks of lines are sorted and
+spilled to temporary files, then merged, so building from a full file
+doesn't need it all in memory.
+"""
+
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+from datetime import datetime, timedelta
+from typing import Iterator, NamedTuple
+from aim.hathifiles.parsing import read_line_chunks
+from aim.hathifiles.profiles import Profile
+from aim.services import S
+
+MAGIC = b"HTIDIDX1"
+
+#: magic, count, width, size, codes_len, offset
+HEADER = struct.Struct("<8sQHHII")
+
+#: rights_timestamp, access, rights code index
+FIELDS = struct.Struct("<IBB")
+
+EPOCH = datetime(1970, 1, 1)
+
+# Columns of the hathifiles
+ACCESS_COLUMN = 1
+RIGHTS_CODE_COLUMN = 2
+RIGHTS_TIMESTAMP_COLUMN = 14
+
+
+class IndexEntry(NamedTuple):
+    """
+    What the index knows about an htid
+    """
+
+    htid: str
+    rights_timestamp: datetime | None
+    access: bool
+    rights_code: str
+
+
+def _seconds(value: str) -> int:
+    if not value:
+        return 0
+    return int((datetime.fromisoformat(value) - EPOCH).total_seconds())
+
+
+def _spill(entries: list[bytes], directory: str) -> str:
+    entries.sort()
+    with tempfile.NamedTemporaryFile(
+        "wb", dir=directory, suffix=".run", delete=False
+    ) as run:
+        run.writelines(entries)
+    return run.name
+
+
+def _read_run(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as run:
+        yield from run
+
+
+def build_htid_index(
+    hathifile: str,
+    path: str,
+    profile: Profile | None = None,
+    chunk_size: int = 1000000,
+) -> int:
+    """
+    Builds an htid index from a hathifile. The index is written next to path
+    and renamed into place. When an htid is in the file more than once the
+    last line wins, like it does when the file is loaded.
+
+    Args:
+        hathifile (str): Path to a hathifile
+        path (str): Where to write the index
+        profile (Profile | None, optional): Only index the lines in this subset profile. Defaults to None for every line.
+        chunk_size (int, optional): Lines sorted in memory at a time. Defaults to 1000000.
+
+    Returns:
+        int: The number of htids in the index
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    runs = []
+    width = 0
+    codes = set()
+    sequence = 0
+    try:
+        for lines in read_line_chunks(hathifile, chunk_size):
+            entries = []
+            for line in lines:
+                if not line.strip() or (profile and not profile.matches(line)):
+                    continue
+                values = line.rstrip("\r\n").split("\t", RIGHTS_TIMESTAMP_COLUMN + 1)
+                values.extend([""] * (RIGHTS_TIMESTAMP_COLUMN + 1 - len(values)))
+                htid = values[0].encode()
+                width = max(width, len(htid))
+                codes.add(values[RIGHTS_CODE_COLUMN])
+                # The sequence number keeps lines for the same htid in file
+                # order through the sort, so the last one can win
+                entries.append(
+                    b"%s\t%012d\t%d\t%d\t%s\n"
+                    % (
+                        htid,
+                        sequence,
+                        _seconds(values[RIGHTS_TIMESTAMP_COLUMN]),
+                        values[ACCESS_COLUMN] == "allow",
+                        values[RIGHTS_CODE_COLUMN].encode(),
+                    )
+                )
+                sequence += 1
+            if entries:
+                runs.append(_spill(entries, directory))
+        count = _write_index(path, [_read_run(run) for run in runs], width, codes)
+    finally:
+        for run in runs:
+            os.remove(run)
+
+    S.logger.info(
+        "Built hathifiles htid index",
+        path=path,
+        hathifile=hathifile,
+        profile=profile.name if profile else None,
+        htids=count,
+    )
+    return count
+
+
+def _write_index(path: str, runs: list, width: int, codes: set[str]) -> int:
+    codes = sorted(codes)
+    if len(codes) > 256:
+        raise ValueError(f"Too many rights codes for the index: {len(codes)}")
+    code_numbers = {code.encode(): number for number, code in enumerate(codes)}
+    code_table = "\n".join(codes).encode()
+    record = struct.Struct(f"<{width}s{FIELDS.format[1:]}")
+    offset = HEADER.size + len(code_table)
+    offset += -offset % 8
+
+    tmp_path = f"{path}.tmp"
+    count = 0
+    with open(tmp_path, "wb") as index:
+        index.write(b"\0" * offset)
+        previous = None
+        for entry in heapq.merge(*runs):
+            htid, _, seconds, access, code = entry.rstrip(b"\n").split(b"\t")
+            if htid == previous:
+                # A later line for the same htid replaces the record
+                index.seek(-record.size, os.SEEK_CUR)
+                count -= 1
+            index.write(
+                record.pack(htid, int(seconds), int(access), code_numbers[code])
+            )
+            previous = htid
+            count += 1
+        index.seek(0)
+        index.write(
+            HEADER.pack(MAGIC, count, width, record.size, len(code_table), offset)
+        )
+        index.write(code_table)
+    os.replace(tmp_path, path)
+    return count
+
+
+class HtidIndex:
+    """
+    Looks htids up in an htid index
+
+    Args:
+        path (str): Path to the index
+
+    Raises:
+        ValueError: When the file isn't an htid index
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, width, size, codes_len, offset = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} isn't a hathifiles htid index")
+        self.count = count
+        self.width = width
+        self.size = size
+        self.offset = offset
+        table = self._mmap[HEADER.size : HEADER.size + codes_len].decode()
+        self.rights_codes = table.split("\n") if table else []
+
+    def _find(self, htid: str) -> int | None:
+        key = htid.encode()
+        if len(key) > self.width:
+            return None
+        key = key.ljust(self.width, b"\0")
+        mm, size, width = self._mmap, self.size, self.width
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self.offset + mid * size
+            if mm[start : start + width] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        start = self.offset + lo * size
+        if lo < self.count and mm[start : start + width] == key:
+            return start
+        return None
+
+    def get(self, htid: str) -> IndexEntry | None:
+        """
+        Looks an htid up
+
+        Args:
+            htid (str): The htid
+
+        Returns:
+            IndexEntry | None: The htid's rights. None when it isn't in the index.
+        """
+        start = self._find(htid)
+        if start is None:
+            return None
+        seconds, access, code = FIELDS.unpack_from(self._mmap, start + self.width)
+        return IndexEntry(
+            htid=htid,
+            rights_timestamp=EPOCH + timedelta(seconds=seconds) if seconds else None,
+            access=bool(access),
+            rights_code=self.rights_codes[code],
+        )
+
+    def __contains__(self, htid: str) -> bool:
+        return self._find(htid) is not None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __enter__(self) -> "HtidIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
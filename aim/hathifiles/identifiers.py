@@ -0,0 +1,198 @@
+"""
+Hathifiles Identifiers
+======================
+
+Normalized OCLC numbers, ISBNs, ISSNs and LCCNs for hathifiles items. The
+hathifiles have these identifiers as comma separated lists in the `oclc`,
+`isbn`, `issn` and `lccn` columns. They are split up and normalized into one
+row per identifier in the `hf_identifier` table so that items can be looked
+up by identifier.
+"""
+
+import re
+from sqlalchemy import Connection, Table, delete, insert, select
+from aim.hathifiles.database import models
+from aim.services import S
+
+IDENTIFIER_TYPES = ("oclc", "isbn", "issn", "lccn")
+
+
+def normalize_oclc(value: str) -> str | None:
+    """
+    Normalizes an OCLC number. Strips the `(OCoLC)`, `ocm`, `ocn` and `on`
+    prefixes and leading zeros.
+
+    Args:
+        value (str): An OCLC number
+
+    Returns:
+        str | None: The normalized OCLC number. None if it isn't an OCLC number.
+    """
+    value = re.sub(r"^(\(ocolc\))?(ocm|ocn|on)?", "", value.strip().lower())
+    value = value.strip().lstrip("0")
+    if not value.isdigit():
+        return None
+    return value
+
+
+def normalize_isbn(value: str) -> str | None:
+    """
+    Normalizes an ISBN. Strips hyphens and spaces, drops any qualifier like
+    "(pbk.)" and upper cases the check digit.
+
+    Args:
+        value (str): An ISBN
+
+    Returns:
+        str | None: The normalized ISBN. None if it isn't an ISBN.
+    """
+    value = re.sub(r"[\s-]", "", value.split("(")[0]).upper()
+    if not re.fullmatch(r"\d{9}[\dX]|\d{13}", value):
+        return None
+    return value
+
+
+def normalize_issn(value: str) -> str | None:
+    """
+    Normalizes an ISSN. Strips the hyphen and upper cases the check digit.
+
+    Args:
+        value (str): An ISSN
+
+    Returns:
+        str | None: The normalized ISSN. None if it isn't an ISSN.
+    """
+    value = re.sub(r"[\s-]", "", value).upper()
+    if not re.fullmatch(r"\d{7}[\dX]", value):
+        return None
+    return value
+
+
+def normalize_lccn(value: str) -> str | None:
+    """
+    Normalizes an LCCN the way the Library of Congress does: remove blanks,
+    remove a forward slash and everything after it, and replace a hyphen by
+    left padding the serial number with zeros to six digits.
+    https://www.loc.gov/marc/lccn-namespace.html#normalization
+
+    Args:
+        value (str): An LCCN
+
+    Returns:
+        str | None: The normalized LCCN. None if there is nothing left.
+    """
+    value = re.sub(r"\s", "", value).split("/")[0].lower()
+    if "-" in value:
+        prefix, serial = value.split("-", 1)
+        value = prefix + serial.zfill(6)
+    if not value:
+        return None
+    return value
+
+
+NORMALIZERS = {
+    "oclc": normalize_oclc,
+    "isbn": normalize_isbn,
+    "issn": normalize_issn,
+    "lccn": normalize_lccn,
+}
+
+
+def normalize(identifier_type: str, value: str) -> str | None:
+    """
+    Normalizes an identifier of the given type.
+
+    Args:
+        identifier_type (str): One of oclc, isbn, issn, or lccn
+        value (str): The identifier
+
+    Returns:
+        str | None: The normalized identifier. None if it can't be normalized.
+    """
+    return NORMALIZERS[identifier_type](value)
+
+
+def identifier_rows(row) -> list[dict]:
+    """
+    Splits up and normalizes the identifiers of a hathifiles row.
+
+    Args:
+        row: A hathifiles row with htid, oclc, isbn, issn, and lccn attributes
+
+    Returns:
+        list[dict]: One hf_identifier row for each distinct normalized identifier
+    """
+    rows = {}
+    for identifier_type in IDENTIFIER_TYPES:
+        for value in (getattr(row, identifier_type) or "").split(","):
+            normalized = normalize(identifier_type, value)
+            if normalized:
+                rows[(identifier_type, normalized)] = {
+                    "identifier_type": identifier_type,
+                    "value": normalized,
+                    "htid": row.htid,
+                }
+    return list(rows.values())
+
+
+def replace_identifiers(db: Connection, rows: list) -> None:
+    """
+    Replaces the hf_identifier rows for the given hathifiles rows. This doesn't
+    commit.
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        rows (list): hathifiles rows with htid, oclc, isbn, issn, and lccn attributes
+    """
+    if not rows:
+        return
+    db.execute(
+        delete(models.Identifier).where(
+            models.Identifier.htid.in_([row.htid for row in rows])
+        )
+    )
+    identifiers = [identifier for row in rows for identifier in identifier_rows(row)]
+    if identifiers:
+        db.execute(insert(models.Identifier), identifiers)
+
+
+def rebuild_identifiers(
+    db: Connection,
+    batch_size: int = 10000,
+    items: Table = models.Item.__table__,
+    identifiers: Table = models.Identifier.__table__,
+) -> int:
+    """
+    Rebuilds the whole hf_identifier table from hf.
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        batch_size (int, optional): How many hf rows to handle at a time. Defaults to 10000.
+        items (sqlalchemy.Table, optional): The table to read items from. Defaults to hf.
+        identifiers (sqlalchemy.Table, optional): The table to rebuild. Defaults to hf_identifier.
+
+    Returns:
+        int: the number of hf rows that were handled
+    """
+    db.execute(delete(identifiers))
+    stmnt = (
+        select(items.c.htid, items.c.oclc, items.c.isbn, items.c.issn, items.c.lccn)
+        .order_by(items.c.htid)
+        .limit(batch_size)
+    )
+    total = 0
+    last_htid = ""
+    while True:
+        # Page through hf by primary key rather than holding a streaming
+        # cursor open while inserting on the same connection
+        rows = db.execute(stmnt.where(items.c.htid > last_htid)).all()
+        if not rows:
+            break
+        found = [identifier for row in rows for identifier in identifier_rows(row)]
+        if found:
+            db.execute(insert(identifiers), found)
+        total += len(rows)
+        last_htid = rows[-1].htid
+    db.commit()
+    S.logger.info("Rebuilt hathifiles identifiers", table=identifiers.name, rows=total)
+    return total
@@ -0,0 +1,905 @@
+"""
+Hathifiles Loader
+=================
+
+Loads hathifiles into the `hf` table. They're read a chunk of lines at a
+time with `aim.hathifiles.parsing` and upserted in batches, so memory use
+doesn't depend on the size of the file.
+
+Update files are upserted straight into `hf`. Every row keeps a hash of the
+line it was loaded from, so rows that haven't changed are skipped, and the
+htids that were written are listed in a manifest for downstream jobs. Full
+files are loaded into a shadow table that is renamed into place once it's
+complete, so the API keeps reading the old table until then. hf_identifier
+and the summary tables are built from the shadow table first and renamed
+into place along with it.
+
+Loads save a checkpoint in hf_load_checkpoint as they commit each batch. A
+load that dies part way through picks up after the last committed batch
+when it's run again, and running a load that already finished does nothing
+unless it's restarted.
+"""
+
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterator
+from sqlalchemy import (
+    Column,
+    Connection,
+    Engine,
+    Index,
+    MetaData,
+    Table,
+    delete,
+    func,
+    insert,
+    inspect,
+    select,
+    update,
+)
+from sqlalchemy.dialects import mysql, sqlite
+from aim.hathifiles.database import models
+from aim.hathifiles.identifiers import replace_identifiers, rebuild_identifiers
+from aim.hathifiles.parsing import HathifilesRow, parse_chunk, read_line_chunks
+from aim.hathifiles.profiles import Profile
+from aim.hathifiles.reconcile import DigifeedsReconciler
+from aim.hathifiles.summary import rebuild_summaries, update_summaries
+from aim.services import S
+
+#: The table a full file is loaded into
+SHADOW_TABLE = "hf_shadow"
+
+#: The table hf is renamed to by a full load. It's kept until the next full
+#: load so that the load can be rolled back.
+OLD_TABLE = "hf_old"
+
+#: Tables built from hf. Full loads and rollbacks build new copies of them
+#: and swap them in with hf, so the API never sees them out of step with it.
+DERIVED_TABLES = ("hf_identifier", "hf_summary_count", "hf_summary_day")
+
+#: Checkpoint statuses. A full load is "loaded" once its shadow table is
+#: indexed and ready to swap in.
+LOADING = "loading"
+LOADED = "loaded"
+COMPLETE = "complete"
+
+
+@dataclass
+class StageStats:
+    """
+    Time spent in one stage of a parallel load. seconds is summed across the
+    stage's workers, so rows_per_second is what the stage can handle with
+    all of its workers busy. The stage with the lowest rows_per_second is the
+    one holding the load back.
+    """
+
+    #: How many processes or threads run the stage
+    workers: int = 1
+    #: Rows that went through the stage
+    rows: int = 0
+    #: Seconds the workers spent on those rows
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows * self.workers / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class LoadStats:
+    """
+    What happened while loading a hathifile
+    """
+
+    #: The hathifile
+    file: str
+    #: Lines that were loaded
+    rows: int = 0
+    #: Seconds it took
+    seconds: float = 0.0
+    #: Decompress, parse and write stage timings for parallel loads
+    stages: dict[str, StageStats] = field(default_factory=dict)
+    #: Rows for htids that weren't in hf
+    inserted: int = 0
+    #: Rows that changed
+    updated: int = 0
+    #: Rows that were skipped because they hadn't changed
+    unchanged: int = 0
+    #: Lines that were dropped because they aren't in the subset profile
+    filtered: int = 0
+    #: Path to the manifest of inserted and updated htids
+    manifest: str | None = None
+    #: The line a load that had been interrupted picked up from
+    resumed_from: int = 0
+    #: True when the file had already been loaded and nothing was done
+    already_loaded: bool = False
+    #: Digifeeds items that were recorded as being in the hathifiles
+    reconciled: int = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def upsert_statement(db: Connection, table: Table = models.Item.__table__):
+    """
+    An insert into hf that updates the existing row when the htid is already
+    there. The MySQL driver sends an executemany of this as multi-row
+    `INSERT ... ON DUPLICATE KEY UPDATE` statements. SQLite is used in the
+    tests.
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        table (sqlalchemy.Table, optional): The table to insert into. Defaults to hf.
+
+    Returns:
+        The insert statement
+    """
+    columns = [column.name for column in table.columns if column.name != "htid"]
+    if db.dialect.name == "sqlite":
+        stmnt = sqlite.insert(table)
+        return stmnt.on_conflict_do_update(
+            index_elements=["htid"],
+            set_={name: stmnt.excluded[name] for name in columns},
+        )
+    stmnt = mysql.insert(table)
+    return stmnt.on_duplicate_key_update(
+        {name: stmnt.inserted[name] for name in columns}
+    )
+
+
+def upsert_rows(db: Connection, rows: list[HathifilesRow]) -> None:
+    """
+    Upserts a batch of rows into hf and replaces their hf_identifier rows.
+    This doesn't commit.
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        rows (list[HathifilesRow]): rows to upsert
+    """
+    if not rows:
+        return
+    db.execute(upsert_statement(db), [row._asdict() for row in rows])
+    replace_identifiers(db, rows)
+
+
+def manifest_path(path: str, directory: str = S.hathifiles_manifest_dir) -> str:
+    """
+    Where the manifest for a hathifile goes
+
+    Args:
+        path (str): Path to a hathifile
+        directory (str, optional): Directory of manifests. Defaults to S.hathifiles_manifest_dir.
+
+    Returns:
+        str: path to the manifest
+    """
+    name = os.path.basename(path).split(".")[0]
+    return os.path.join(directory, f"{name}.manifest.tsv")
+
+
+def read_manifest(path: str) -> Iterator[tuple[str, str]]:
+    """
+    Reads a load manifest
+
+    Args:
+        path (str): Path to the manifest
+
+    Yields:
+        tuple[str, str]: "inserted" or "updated" and the htid
+    """
+    with open(path) as f:
+        for line in f:
+            change, htid = line.rstrip("\n").split("\t")
+            yield change, htid
+
+
+def new_checkpoint(path: str, kind: str) -> dict:
+    """
+    A checkpoint for a load that hasn't committed anything yet
+
+    Args:
+        path (str): Path to the hathifile
+        kind (str): "update" or "full"
+
+    Returns:
+        dict: hf_load_checkpoint values
+    """
+    return {
+        "file": os.path.basename(path),
+        "kind": kind,
+        "size": os.path.getsize(path),
+        "status": LOADING,
+        "line": 0,
+        "batch": 0,
+        "rows": 0,
+        "inserted": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "filtered": 0,
+        "manifest_offset": 0,
+    }
+
+
+def get_checkpoint(db: Connection, path: str) -> dict | None:
+    """
+    The saved checkpoint for a hathifile
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        path (str): Path to the hathifile
+
+    Returns:
+        dict | None: hf_load_checkpoint values. None when the file has no checkpoint.
+    """
+    table = models.LoadCheckpoint.__table__
+    stmnt = select(table).where(table.c.file == os.path.basename(path))
+    row = db.execute(stmnt).first()
+    return row._asdict() if row else None
+
+
+def save_checkpoint(db: Connection, checkpoint: dict) -> None:
+    """
+    Saves a checkpoint. This doesn't commit, so the checkpoint can be
+    committed along with the batch it describes.
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        checkpoint (dict): hf_load_checkpoint values
+    """
+    table = models.LoadCheckpoint.__table__
+    db.execute(delete(table).where(table.c.file == checkpoint["file"]))
+    db.execute(insert(table), {**checkpoint, "updated_at": datetime.now()})
+
+
+def start_checkpoint(
+    db: Connection, path: str, kind: str, restart: bool = False
+) -> dict:
+    """
+    The checkpoint a load starts from: the saved one, or a new one when
+    there isn't one, it's for a different file with the same name, or the
+    load is restarted
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        path (str): Path to the hathifile
+        kind (str): "update" or "full"
+        restart (bool, optional): Ignore the saved checkpoint. Defaults to False.
+
+    Returns:
+        dict: hf_load_checkpoint values
+    """
+    fresh = new_checkpoint(path, kind)
+    checkpoint = None if restart else get_checkpoint(db, path)
+    if checkpoint is None:
+        return fresh
+    if checkpoint["kind"] != kind or checkpoint["size"] != fresh["size"]:
+        S.logger.warning(
+            "Hathifiles checkpoint is for a different file; starting over", file=path
+        )
+        return fresh
+    return checkpoint
+
+
+def _checkpoint_stats(stats: LoadStats, checkpoint: dict) -> LoadStats:
+    for name in ("rows", "inserted", "updated", "unchanged", "filtered"):
+        setattr(stats, name, checkpoint[name])
+    return stats
+
+
+class CheckpointTracker:
+    """
+    Moves a checkpoint forward as batches are committed. Batches are
+    numbered in the order they're read, and the checkpoint only moves past
+    a batch once every batch before it has been committed too, so batches
+    that parallel writers commit out of order aren't skipped on resume.
+
+    Args:
+        checkpoint (dict): hf_load_checkpoint values
+    """
+
+    def __init__(self, checkpoint: dict) -> None:
+        self.checkpoint = checkpoint
+        self.next_batch = checkpoint["batch"] + 1
+        self._committed = {}
+        self._lock = threading.Lock()
+
+    def committed(
+        self, db: Connection, batch: int, line: int, rows: int, filtered: int
+    ) -> None:
+        """
+        Records a committed batch. When the checkpoint moves it's saved and
+        committed on db.
+
+        Args:
+            db (sqlalchemy.Connection): Hathifiles database connection
+            batch (int): Number of the batch
+            line (int): Lines of the file read through the end of the batch
+            rows (int): Rows in the batch
+            filtered (int): Lines of the batch that were dropped by the subset profile
+        """
+        with self._lock:
+            self._committed[batch] = (line, rows, filtered)
+            if self.next_batch not in self._committed:
+                return
+            while self.next_batch in self._committed:
+                line, rows, filtered = self._committed.pop(self.next_batch)
+                self.checkpoint["batch"] = self.next_batch
+                self.checkpoint["line"] = line
+                self.checkpoint["rows"] += rows
+                self.checkpoint["filtered"] += filtered
+                self.next_batch += 1
+            save_checkpoint(db, self.checkpoint)
+            db.commit()
+
+
+def changed_rows(
+    db: Connection, rows: list[HathifilesRow]
+) -> tuple[list[HathifilesRow], list[HathifilesRow], int]:
+    """
+    Sorts a batch of rows by comparing their hashes to the ones in hf
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        rows (list[HathifilesRow]): incoming rows
+
+    Returns:
+        tuple[list[HathifilesRow], list[HathifilesRow], int]: rows to insert, rows to update, and how many rows haven't changed
+    """
+    # The last line for an htid wins, like it would with plain upserts
+    rows = list({row.htid: row for row in rows}.values())
+    stmnt = select(models.Item.htid, models.Item.row_hash).where(
+        models.Item.htid.in_([row.htid for row in rows])
+    )
+    existing = dict(db.execute(stmnt).all())
+    inserted = []
+    updated = []
+    unchanged = 0
+    for row in rows:
+        if row.htid not in existing:
+            inserted.append(row)
+        elif existing[row.htid] != row.row_hash:
+            updated.append(row)
+        else:
+            unchanged += 1
+    return inserted, updated, unchanged
+
+
+def load_update_file(
+    db: Connection,
+    path: str,
+    batch_size: int = 10000,
+    manifest_dir: str = S.hathifiles_manifest_dir,
+    profile: Profile | None = None,
+    restart: bool = False,
+    reconciler: DigifeedsReconciler | None = None,
+) -> LoadStats:
+    """
+    Loads a hathifiles update file into hf. Rows whose hash matches the one
+    in hf are skipped. Inserted and updated htids are written to a manifest,
+    one `change<TAB>htid` line each.
+
+    Each batch is committed along with the load's checkpoint. A load that
+    was interrupted picks up after its last committed batch, and its
+    manifest is cut back to what that batch had written, so no htid is
+    listed twice. Loading a file that was already loaded does nothing
+    unless restart is set.
+
+    The summary tables are moved on by the batch's inserted and updated
+    rows in the same transaction.
+
+    With a reconciler, each batch is also checked for digifeeds items that
+    are waiting to show up in HathiTrust, and the ones that have are
+    recorded in the digifeeds database once the batch is committed.
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        path (str): Path to the update file
+        batch_size (int, optional): Rows in each upsert. Defaults to 10000.
+        manifest_dir (str, optional): Where to write the manifest. Defaults to S.hathifiles_manifest_dir.
+        profile (Profile | None, optional): Only load lines in this subset profile. Defaults to None for every line.
+        restart (bool, optional): Load the file from the start even if it was loaded before. Defaults to False.
+        reconciler (DigifeedsReconciler | None, optional): Digifeeds items to look for in the file. Defaults to None.
+
+    Returns:
+        LoadStats: How many rows were loaded, what changed, and how long it took
+    """
+    stats = LoadStats(file=path, manifest=manifest_path(path, manifest_dir))
+    start = time.perf_counter()
+    checkpoint = start_checkpoint(db, path, "update", restart)
+    if checkpoint["status"] == COMPLETE:
+        S.logger.info("Hathifiles update file was already loaded", file=path)
+        stats.already_loaded = True
+        return _checkpoint_stats(stats, checkpoint)
+    if checkpoint["batch"]:
+        stats.resumed_from = checkpoint["line"]
+        S.logger.info(
+            "Resuming hathifiles update file", file=path, line=checkpoint["line"]
+        )
+
+    os.makedirs(manifest_dir, exist_ok=True)
+    open(stats.manifest, "ab").close()
+    with open(stats.manifest, "r+b") as manifest:
+        # Drop anything written for a batch that didn't commit
+        manifest.truncate(checkpoint["manifest_offset"])
+        manifest.seek(checkpoint["manifest_offset"])
+        line = checkpoint["line"]
+        for lines in read_line_chunks(path, batch_size, start_line=line):
+            line += len(lines)
+            rows, _ = parse_chunk(lines, profile)
+            inserted, updated, unchanged = [], [], 0
+            if rows:
+                inserted, updated, unchanged = changed_rows(db, rows)
+                update_summaries(db, inserted, updated)
+                upsert_rows(db, inserted + updated)
+            if reconciler is not None:
+                reconciler.match(rows)
+            manifest.write(
+                "".join(
+                    [f"inserted\t{row.htid}\n" for row in inserted]
+                    + [f"updated\t{row.htid}\n" for row in updated]
+                ).encode()
+            )
+            manifest.flush()
+            os.fsync(manifest.fileno())
+            checkpoint["line"] = line
+            checkpoint["batch"] += 1
+            checkpoint["rows"] += len(rows)
+            checkpoint["inserted"] += len(inserted)
+            checkpoint["updated"] += len(updated)
+            checkpoint["unchanged"] += unchanged
+            checkpoint["filtered"] += len(lines) - len(rows)
+            checkpoint["manifest_offset"] = manifest.tell()
+            save_checkpoint(db, checkpoint)
+            db.commit()
+            if reconciler is not None:
+                stats.reconciled += reconciler.flush()
+    checkpoint["status"] = COMPLETE
+    save_checkpoint(db, checkpoint)
+    db.commit()
+
+    _checkpoint_stats(stats, checkpoint)
+    stats.seconds = time.perf_counter() - start
+    S.logger.info(
+        "Loaded hathifiles update file",
+        file=path,
+        rows=stats.rows,
+        inserted=stats.inserted,
+        updated=stats.updated,
+        unchanged=stats.unchanged,
+        filtered=stats.filtered,
+        resumed_from=stats.resumed_from,
+        reconciled=stats.reconciled,
+        seconds=round(stats.seconds, 2),
+        rows_per_second=round(stats.rows_per_second),
+    )
+    return stats
+
+
+def shadow_table(
+    name: str = SHADOW_TABLE, like: Table = models.Item.__table__
+) -> Table:
+    """
+    A table with the same columns and primary key as hf but none of its
+    secondary indexes. Those are built after the bulk insert.
+
+    Args:
+        name (str, optional): Name of the table. Defaults to SHADOW_TABLE.
+        like (sqlalchemy.Table, optional): The table to copy. Defaults to hf.
+
+    Returns:
+        sqlalchemy.Table: The table
+    """
+    return Table(
+        name,
+        MetaData(),
+        *[
+            Column(
+                column.name,
+                column.type,
+                primary_key=column.primary_key,
+                nullable=column.nullable,
+            )
+            for column in like.columns
+        ],
+    )
+
+
+def create_indexes(
+    db: Connection, table: Table, like: Table = models.Item.__table__
+) -> None:
+    """
+    Builds the secondary indexes of hf on a shadow table that it doesn't
+    have yet
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        table (sqlalchemy.Table): The shadow table
+        like (sqlalchemy.Table, optional): The table whose indexes to build. Defaults to hf.
+    """
+    # A resumed load may have built some of them before it was interrupted
+    existing = {
+        tuple(index["column_names"]) for index in inspect(db).get_indexes(table.name)
+    }
+    for index in like.indexes:
+        if tuple(column.name for column in index.columns) in existing:
+            continue
+        # MySQL index names belong to their table, so the shadow table gets
+        # the same names as hf and keeps them through the rename. SQLite
+        # index names have to be unique across the database.
+        name = index.name
+        if db.dialect.name == "sqlite":
+            name = f"{index.name}_{uuid.uuid4().hex[:8]}"
+        Index(name, *[table.c[column.name] for column in index.columns]).create(db)
+
+
+def swap_tables(db: Connection, swaps: list[tuple[str, str, str]]) -> None:
+    """
+    Atomically renames each live table to its retired name and its
+    replacement to the live name
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        swaps (list[tuple[str, str, str]]): The live table the API reads, the table that takes its place, and what the live table is renamed to
+    """
+    if db.dialect.name == "sqlite":
+        # SQLite DDL is transactional, so the renames commit together
+        for live, replacement, retired in swaps:
+            db.exec_driver_sql(f"ALTER TABLE {live} RENAME TO {retired}")
+            db.exec_driver_sql(f"ALTER TABLE {replacement} RENAME TO {live}")
+    else:
+        renames = ", ".join(
+            f"{live} TO {retired}, {replacement} TO {live}"
+            for live, replacement, retired in swaps
+        )
+        db.exec_driver_sql(f"RENAME TABLE {renames}")
+    db.commit()
+
+
+def build_derived_tables(db: Connection, items: Table) -> list[tuple[str, str, str]]:
+    """
+    Builds shadow copies of hf_identifier and the summary tables from the
+    table that's about to become hf. Copies left by an earlier load are
+    dropped first.
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        items (sqlalchemy.Table): The replacement hf
+
+    Returns:
+        list[tuple[str, str, str]]: The swaps that put the copies in place, for swap_tables
+    """
+    tables = {}
+    for name in DERIVED_TABLES:
+        db.exec_driver_sql(f"DROP TABLE IF EXISTS {name}_shadow")
+        db.exec_driver_sql(f"DROP TABLE IF EXISTS {name}_old")
+        tables[name] = shadow_table(f"{name}_shadow", models.Base.metadata.tables[name])
+        tables[name].create(db)
+    db.commit()
+    rebuild_identifiers(db, items=items, identifiers=tables["hf_identifier"])
+    rebuild_summaries(
+        db,
+        items=items,
+        counts_table=tables["hf_summary_count"],
+        days_table=tables["hf_summary_day"],
+    )
+    for name in DERIVED_TABLES:
+        create_indexes(db, tables[name], models.Base.metadata.tables[name])
+    db.commit()
+    return [(name, f"{name}_shadow", f"{name}_old") for name in DERIVED_TABLES]
+
+
+def _write_batches(
+    engine: Engine,
+    table: Table,
+    batches: queue.Queue,
+    stage: StageStats,
+    lock: threading.Lock,
+    errors: list,
+    tracker: CheckpointTracker,
+) -> None:
+    # A writer thread. After an error it keeps taking batches off the queue
+    # without writing them, so the reader never blocks on a full queue.
+    try:
+        with engine.connect() as db:
+            if db.dialect.name == "mysql":
+                db.exec_driver_sql("SET SESSION unique_checks=0, foreign_key_checks=0")
+            stmnt = upsert_statement(db, table)
+            while (batch := batches.get()) is not None:
+                if errors:
+                    continue
+                number, line, rows, filtered = batch
+                start = time.perf_counter()
+                if rows:
+                    db.execute(stmnt, [row._asdict() for row in rows])
+                    db.commit()
+                with lock:
+                    stage.rows += len(rows)
+                    stage.seconds += time.perf_counter() - start
+                tracker.committed(db, number, line, len(rows), filtered)
+    except Exception as error:
+        errors.append(error)
+        while batches.get() is not None:
+            pass
+
+
+def parallel_insert(
+    engine: Engine,
+    path: str,
+    table: Table,
+    batch_size: int = 10000,
+    workers: int = 4,
+    writers: int = 2,
+    queue_size: int = 8,
+    profile: Profile | None = None,
+    checkpoint: dict | None = None,
+) -> dict[str, StageStats]:
+    """
+    Loads a hathifile into a table in three stages that run at the same
+    time. This process decompresses the file into chunks of lines, a pool of
+    worker processes parses the chunks, and writer threads with their own
+    database connections insert the parsed rows. At most queue_size chunks
+    wait to be parsed and at most queue_size parsed chunks wait to be
+    written, so a slow stage holds back the stages before it instead of
+    letting chunks pile up in memory.
+
+    Args:
+        engine (sqlalchemy.Engine): Hathifiles database engine
+        path (str): Path to the hathifile
+        table (sqlalchemy.Table): The table to load
+        batch_size (int, optional): Lines in each chunk. Defaults to 10000.
+        workers (int, optional): Parse processes. Defaults to 4.
+        writers (int, optional): Writer connections. Defaults to 2.
+        queue_size (int, optional): Chunks that can wait between stages. Defaults to 8.
+        profile (Profile | None, optional): Only load lines in this subset profile. Defaults to None for every line.
+        checkpoint (dict | None, optional): The load's checkpoint. Loading starts after its line and it's moved forward as batches are committed. Defaults to None for a new one.
+
+    Returns:
+        dict[str, StageStats]: decompress, parse and write timings. The parse stage's rows are the ones in the profile.
+    """
+    if checkpoint is None:
+        checkpoint = new_checkpoint(path, "full")
+    tracker = CheckpointTracker(checkpoint)
+    stages = {
+        "decompress": StageStats(workers=1),
+        "parse": StageStats(workers=workers),
+        "write": StageStats(workers=writers),
+    }
+    batches = queue.Queue(maxsize=queue_size)
+    lock = threading.Lock()
+    errors = []
+    threads = [
+        threading.Thread(
+            target=_write_batches,
+            args=(engine, table, batches, stages["write"], lock, errors, tracker),
+        )
+        for _ in range(writers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            line = checkpoint["line"]
+            number = checkpoint["batch"]
+            chunks = read_line_chunks(path, batch_size, start_line=line)
+            parsing = deque()
+            done_reading = False
+            while not done_reading or parsing:
+                if not done_reading:
+                    start = time.perf_counter()
+                    lines = next(chunks, None)
+                    stages["decompress"].seconds += time.perf_counter() - start
+                    if lines is None:
+                        done_reading = True
+                    else:
+                        stages["decompress"].rows += len(lines)
+                        line += len(lines)
+                        number += 1
+                        parsing.append(
+                            (
+                                number,
+                                line,
+                                len(lines),
+                                pool.submit(parse_chunk, lines, profile),
+                            )
+                        )
+                if parsing and (done_reading or len(parsing) >= queue_size):
+                    number_parsed, end_line, count, future = parsing.popleft()
+                    rows, seconds = future.result()
+                    stages["parse"].rows += len(rows)
+                    stages["parse"].seconds += seconds
+                    if errors:
+                        raise errors[0]
+                    # Batches with no rows still go to the writers so the
+                    # checkpoint moves past them
+                    batches.put((number_parsed, end_line, rows, count - len(rows)))
+    finally:
+        for _ in threads:
+            batches.put(None)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return stages
+
+
+def load_full_file(
+    db: Connection,
+    path: str,
+    batch_size: int = 10000,
+    workers: int = 0,
+    writers: int = 2,
+    profile: Profile | None = None,
+    restart: bool = False,
+) -> LoadStats:
+    """
+    Replaces hf with the contents of a hathifiles full file.
+
+    The file is loaded into a shadow table that only has its primary key.
+    Then the secondary indexes are built, hf_identifier and the summary
+    tables are built from the shadow table, and all of them are renamed into
+    place in one step. The API keeps reading the old tables the whole time
+    and never sees a partly loaded table. The old hf is kept as OLD_TABLE
+    until the next full load; rollback_full_load puts it back.
+
+    If the load fails before the rename, hf is left alone and the shadow
+    table is kept with the load's checkpoint. Running the load again picks
+    up after the last committed batch. Batches that were committed after
+    the checkpoint was saved are upserted again, which doesn't change them.
+    Loading a file that was already loaded does nothing unless restart is
+    set.
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        path (str): Path to the full file
+        batch_size (int, optional): Rows in each insert. Defaults to 10000.
+        workers (int, optional): Parse processes for a parallel load. Defaults to 0, which loads in this process.
+        writers (int, optional): Writer connections for a parallel load. Defaults to 2.
+        profile (Profile | None, optional): Only load lines in this subset profile. Defaults to None for every line.
+        restart (bool, optional): Load the file from the start even if it was loaded before. Defaults to False.
+
+    Raises:
+        ValueError: When the file has no rows
+
+    Returns:
+        LoadStats: How many rows were loaded and how long it took
+    """
+    stats = LoadStats(file=path)
+    start = time.perf_counter()
+    checkpoint = start_checkpoint(db, path, "full", restart)
+    if checkpoint["status"] == COMPLETE:
+        S.logger.info("Hathifiles full file was already loaded", file=path)
+        stats.already_loaded = True
+        return _checkpoint_stats(stats, checkpoint)
+
+    table = shadow_table()
+    has_shadow = db.dialect.has_table(db, SHADOW_TABLE)
+    if checkpoint["status"] == LOADING and not (checkpoint["batch"] and has_shadow):
+        checkpoint = new_checkpoint(path, "full")
+        db.exec_driver_sql(f"DROP TABLE IF EXISTS {SHADOW_TABLE}")
+        db.exec_driver_sql(f"DROP TABLE IF EXISTS {OLD_TABLE}")
+        db.commit()
+        table.create(db)
+        db.commit()
+    elif checkpoint["status"] == LOADING:
+        stats.resumed_from = checkpoint["line"]
+        S.logger.info(
+            "Resuming hathifiles full file", file=path, line=checkpoint["line"]
+        )
+
+    if checkpoint["status"] == LOADING:
+        try:
+            if db.dialect.name == "mysql":
+                db.exec_driver_sql("SET SESSION unique_checks=0, foreign_key_checks=0")
+            if workers:
+                stats.stages = parallel_insert(
+                    db.engine,
+                    path,
+                    table,
+                    batch_size,
+                    workers,
+                    writers,
+                    profile=profile,
+                    checkpoint=checkpoint,
+                )
+            else:
+                tracker = CheckpointTracker(checkpoint)
+                stmnt = upsert_statement(db, table)
+                line = checkpoint["line"]
+                for lines in read_line_chunks(path, batch_size, start_line=line):
+                    line += len(lines)
+                    rows, _ = parse_chunk(lines, profile)
+                    if rows:
+                        db.execute(stmnt, [row._asdict() for row in rows])
+                    # Commits the batch and the checkpoint together
+                    tracker.committed(
+                        db, tracker.next_batch, line, len(rows), len(lines) - len(rows)
+                    )
+            if checkpoint["rows"] == 0:
+                db.exec_driver_sql(f"DROP TABLE IF EXISTS {SHADOW_TABLE}")
+                db.execute(
+                    delete(models.LoadCheckpoint.__table__).where(
+                        models.LoadCheckpoint.file == checkpoint["file"]
+                    )
+                )
+                db.commit()
+                raise ValueError(f"{path} has no rows")
+            create_indexes(db, table)
+            checkpoint["status"] = LOADED
+            save_checkpoint(db, checkpoint)
+            db.commit()
+        except BaseException:
+            db.rollback()
+            S.logger.error(
+                "Full hathifiles load failed; hf left alone",
+                file=path,
+                line=checkpoint["line"],
+            )
+            raise
+        finally:
+            if db.dialect.name == "mysql":
+                db.exec_driver_sql("SET SESSION unique_checks=1, foreign_key_checks=1")
+
+    # Without a shadow table, the swap already happened before the load was
+    # interrupted
+    if db.dialect.has_table(db, SHADOW_TABLE):
+        swaps = build_derived_tables(db, table)
+        swap_tables(db, [("hf", SHADOW_TABLE, OLD_TABLE), *swaps])
+    checkpoint["status"] = COMPLETE
+    save_checkpoint(db, checkpoint)
+    db.commit()
+
+    _checkpoint_stats(stats, checkpoint)
+    stats.seconds = time.perf_counter() - start
+    S.logger.info(
+        "Loaded hathifiles full file",
+        file=path,
+        rows=stats.rows,
+        filtered=stats.filtered,
+        resumed_from=stats.resumed_from,
+        seconds=round(stats.seconds, 2),
+        rows_per_second=round(stats.rows_per_second),
+        **{
+            f"{name}_rows_per_second": round(stage.rows_per_second)
+            for name, stage in stats.stages.items()
+        },
+    )
+    return stats
+
+
+def rollback_full_load(db: Connection) -> None:
+    """
+    Puts back the hf that the last full load replaced, with hf_identifier
+    and the summary tables built from it. The replaced table becomes the
+    shadow table and is dropped by the next full load.
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+
+    Raises:
+        ValueError: When there isn't an old hf to put back
+    """
+    if not db.dialect.has_table(db, OLD_TABLE):
+        raise ValueError(f"There isn't a {OLD_TABLE} table to roll back to")
+    db.exec_driver_sql(f"DROP TABLE IF EXISTS {SHADOW_TABLE}")
+    swaps = build_derived_tables(db, shadow_table(OLD_TABLE))
+    swap_tables(db, [("hf", OLD_TABLE, SHADOW_TABLE), *swaps])
+    # The newest checkpoint is the API's load generation, so moving it on
+    # makes the API drop what it cached from the rolled back table
+    table = models.LoadCheckpoint.__table__
+    newest = db.execute(select(func.max(table.c.updated_at))).scalar_one()
+    db.execute(
+        update(table)
+        .where(table.c.updated_at == newest)
+        .values(updated_at=datetime.now())
+    )
+    db.commit()
+    S.logger.info("Rolled back the last full hathifiles load")
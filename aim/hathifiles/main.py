@@ -1,9 +1,26 @@
-from fastapi import Depends, FastAPI, HTTPException
-from sqlalchemy import create_engine
-from sqlalchemy import text, Connection
+from fastapi import Depends, FastAPI, HTTPException, Header, Query, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import create_engine, func, select, and_, or_
+from sqlalchemy.ext.asyncio import create_async_engine
+from aim.hathifiles.database import models
+from aim.hathifiles.database.connection import (
+    Database,
+    SyncDatabase,
+    AsyncDatabase,
+)
+from aim.hathifiles.identifiers import normalize
+from aim.hathifiles import bloom
+from aim.hathifiles.cache import TTLCache, MISSING
+from aim.hathifiles.serialization import FIELDS, item_dict, dumps
+from aim.hathifiles.summary import SUMMARY_FIELDS
 from aim.services import S
-from pydantic import BaseModel, Field
-from datetime import datetime
+from pydantic import BaseModel, Field, create_model
+from datetime import date, datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from hashlib import blake2b
+from typing import Literal
+import base64
+import json
 
 
 class Item(BaseModel):
@@ -100,8 +117,217 @@ class Item(BaseModel):
     )
 
 
+ProjectedItem = create_model(
+    "ProjectedItem",
+    __doc__="A Hathifiles Item as the item endpoints return it. Only htid is always there: `fields` picks which of the other fields are returned, and empty ones are left out.",
+    htid=(str, Item.model_fields["htid"]),
+    **{
+        name: (field.annotation | None, Field(None, description=field.description))
+        for name, field in Item.model_fields.items()
+        if name != "htid"
+    },
+)
+
+
+class ItemsRequest(BaseModel):
+    """
+    A batch of HathiTrust ids to look up
+    """
+
+    htids: list[str] = Field(
+        ...,
+        min_length=1,
+        max_length=1000,
+        description="HathiTrust ids to look up. At most 1000 ids per request.",
+    )
+
+
+class Items(BaseModel):
+    """
+    The result of a batch lookup of Hathifiles Items
+    """
+
+    items: list[ProjectedItem] = Field(..., description="Items that were found")
+    missing: list[str] = Field(
+        ..., description="Requested HathiTrust ids that were not found"
+    )
+
+
+class CacheStats(BaseModel):
+    """
+    Counters for the in-process cache of Hathifiles lookups
+    """
+
+    size: int = Field(..., description="Number of cached lookups")
+    maxsize: int = Field(..., description="Most lookups the cache keeps")
+    ttl: float = Field(..., description="Seconds a lookup is kept")
+    hits: int = Field(..., description="Lookups answered from the cache")
+    misses: int = Field(..., description="Lookups that went to the database")
+    evictions: int = Field(..., description="Lookups dropped to make room")
+    expirations: int = Field(..., description="Lookups dropped for being too old")
+    invalidations: int = Field(
+        ..., description="Lookups dropped because a load changed the database"
+    )
+
+
+#: Item fields that describe the bibliographic record rather than the volume.
+#: They're the same for every item with the same bib_num.
+RECORD_FIELDS = [
+    "bib_num",
+    "title",
+    "author",
+    "imprint",
+    "oclc",
+    "isbn",
+    "issn",
+    "lccn",
+    "pub_place",
+    "lang_code",
+    "bib_fmt",
+    "us_gov_doc_flag",
+]
+
+
+#: Item fields that are about the volume
+VOLUME_FIELDS = [name for name in Item.model_fields if name not in RECORD_FIELDS]
+
+
+def _item_fields(names: list[str]) -> dict:
+    return {
+        name: (Item.model_fields[name].annotation, Item.model_fields[name])
+        for name in names
+    }
+
+
+RecordItem = create_model(
+    "RecordItem",
+    __doc__="A volume of a HathiTrust bibliographic record. It has the Item fields that aren't about the record.",
+    **_item_fields(VOLUME_FIELDS),
+)
+
+Record = create_model(
+    "Record",
+    __doc__="A HathiTrust bibliographic record and all of its volumes",
+    items=(list[RecordItem], Field(..., description="The volumes of the record")),
+    **_item_fields(RECORD_FIELDS),
+)
+
+
+class Changes(BaseModel):
+    """
+    A page of Hathifiles Items whose rights_timestamp changed
+    """
+
+    items: list[ProjectedItem] = Field(
+        ..., description="Items ordered by rights_timestamp and then htid"
+    )
+    next_cursor: str | None = Field(
+        ...,
+        description="Pass this as `cursor` to get the next page. Null on the last page.",
+    )
+
+
+#: Low cardinality hf fields that GET /items can be filtered and faceted on
+FACET_FIELDS = (
+    "access",
+    "rights_code",
+    "rights_reason",
+    "source",
+    "us_gov_doc_flag",
+    "bib_fmt",
+    "collection_code",
+    "content_provider_code",
+    "responsible_entity_code",
+    "digitization_agent_code",
+    "access_profile_code",
+)
+
+
+#: Filters that are the leading column of an index on hf. Filtered facets
+#: need one of them, or an htid namespace or rights_timestamp range, so the
+#: counts don't GROUP BY over all of hf.
+INDEXED_FILTERS = ("rights_code", "content_provider_code", "digitization_agent_code")
+
+
+class FacetCount(BaseModel):
+    """
+    How many matching items have a value of a field
+    """
+
+    value: str | bool | None = Field(..., description="The field's value")
+    count: int = Field(..., description="Matching items with the value")
+
+
+class ItemList(BaseModel):
+    """
+    A page of Hathifiles Items that match a set of filters
+    """
+
+    items: list[ProjectedItem] = Field(
+        ..., description="Items ordered by rights_timestamp and then htid"
+    )
+    next_cursor: str | None = Field(
+        ...,
+        description="Pass this as `cursor` to get the next page. Null on the last page.",
+    )
+    facets: dict[str, list[FacetCount]] | None = Field(
+        None,
+        description="Counts of every matching item by each requested facet field, most common value first. Only on the first page.",
+    )
+
+
+class DayCount(BaseModel):
+    """
+    How many items have a rights_timestamp on a day
+    """
+
+    day: date = Field(..., description="The day")
+    count: int = Field(..., description="Items with a rights_timestamp on the day")
+
+
+class Stats(BaseModel):
+    """
+    Counts of the Hathifiles Items, from the summary tables the loader keeps
+    """
+
+    total: int = Field(..., description="How many items there are")
+    counts: dict[str, list[FacetCount]] = Field(
+        ...,
+        description="Counts of the items by rights_code, access, bib_fmt and content_provider_code, most common value first",
+    )
+    days: list[DayCount] = Field(
+        ..., description="Counts of the items by the day of their rights_timestamp"
+    )
+
+
 engine = create_engine(S.hathifiles_mysql_database, pool_pre_ping=True)
 
+if S.hathifiles_async:  # pragma: no cover
+    async_engine = create_async_engine(
+        S.hathifiles_async_mysql_database, pool_pre_ping=True
+    )
+
+#: Cached hf rows by htid. None is cached for htids that aren't in hf.
+cache = TTLCache(maxsize=S.hathifiles_cache_size, ttl=S.hathifiles_cache_ttl)
+
+
+async def check_cache_generation(db: Database) -> None:
+    """
+    Drops the cache when a load has changed hf since the cache was filled.
+    Loads save their checkpoint as they commit, so the newest checkpoint is
+    the load generation. It's read at most every
+    S.hathifiles_cache_check_interval seconds.
+    """
+    if not cache.generation_due(S.hathifiles_cache_check_interval):
+        return
+    stmnt = select(func.max(models.LoadCheckpoint.updated_at))
+    generation = (await db.execute(stmnt)).scalar_one()
+    if cache.check_generation(generation):
+        S.logger.info(
+            "Dropped the hathifiles cache after a load", generation=generation
+        )
+
+
 description = """
 The Hathifiles Database API enables getting information about items in HathiTrust 
 """
@@ -109,70 +335,745 @@ app = FastAPI(title="Hathifiles", description=description)
 
 
 # Dependency
-def get_db():  # pragma: no cover
-    db = engine.connect()
+async def get_db():  # pragma: no cover
+    if S.hathifiles_async:
+        db = AsyncDatabase(async_engine)
+    else:
+        db = SyncDatabase(engine)
     try:
         yield db
     finally:
-        db.close()
+        await db.close()
+
+
+def encode_cursor(row) -> str:
+    """
+    An opaque cursor that points just past a row in rights_timestamp, htid order
+    """
+    rights_timestamp = row.rights_timestamp
+    position = [rights_timestamp and rights_timestamp.isoformat(), row.htid]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime | None, str]:
+    try:
+        rights_timestamp, htid = json.loads(base64.urlsafe_b64decode(cursor))
+        if rights_timestamp is None:
+            return None, str(htid)
+        return datetime.fromisoformat(rights_timestamp), str(htid)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after_position(after: tuple[datetime | None, str]):
+    """
+    A condition for the rows after a position in rights_timestamp, htid
+    order. Rows without a rights_timestamp sort first, as they do in MySQL
+    and SQLite.
+    """
+    last_timestamp, last_htid = after
+    if last_timestamp is None:
+        return or_(
+            models.Item.rights_timestamp.is_not(None),
+            and_(
+                models.Item.rights_timestamp.is_(None),
+                models.Item.htid > last_htid,
+            ),
+        )
+    return or_(
+        models.Item.rights_timestamp > last_timestamp,
+        and_(
+            models.Item.rights_timestamp == last_timestamp,
+            models.Item.htid > last_htid,
+        ),
+    )
+
+
+def changes_statement(
+    since: datetime,
+    after: tuple[datetime, str] | None,
+    limit: int,
+    namespace: str | None = None,
+    content_provider_code: str | None = None,
+):
+    """
+    A page of hf rows with a rights_timestamp on or after since in
+    rights_timestamp, htid order. Pages are found by seeking past the last row
+    of the previous page (keyset pagination) on the rights_timestamp index, so
+    every page costs the same no matter how deep into the feed it is.
+    """
+    stmnt = (
+        select(models.Item)
+        .where(models.Item.rights_timestamp >= since)
+        .order_by(models.Item.rights_timestamp, models.Item.htid)
+        .limit(limit)
+    )
+    if after is not None:
+        stmnt = stmnt.where(after_position(after))
+    if namespace is not None:
+        stmnt = stmnt.where(models.Item.htid.startswith(f"{namespace}."))
+    if content_provider_code is not None:
+        stmnt = stmnt.filter_by(content_provider_code=content_provider_code)
+    return stmnt
+
+
+def filter_conditions(
+    filters: dict,
+    namespace: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> list:
+    """
+    Conditions on hf for equality filters on FACET_FIELDS, an htid namespace
+    and a rights_timestamp range
+    """
+    conditions = [
+        getattr(models.Item, name) == value for name, value in filters.items()
+    ]
+    if namespace is not None:
+        conditions.append(models.Item.htid.startswith(f"{namespace}."))
+    if since is not None:
+        conditions.append(models.Item.rights_timestamp >= since)
+    if until is not None:
+        conditions.append(models.Item.rights_timestamp < until)
+    return conditions
+
+
+def listing_statement(
+    conditions: list, after: tuple[datetime | None, str] | None, limit: int
+):
+    """
+    A page of hf rows that match a set of conditions, in rights_timestamp,
+    htid order. Like the changes feed, pages are found by seeking past the
+    last row of the previous page. The composite indexes on hf end in
+    rights_timestamp, so with their leading columns filtered on a page is a
+    seek and a short range scan.
+    """
+    stmnt = (
+        select(models.Item)
+        .where(*conditions)
+        .order_by(models.Item.rights_timestamp, models.Item.htid)
+        .limit(limit)
+    )
+    if after is not None:
+        stmnt = stmnt.where(after_position(after))
+    return stmnt
+
+
+def summary_count_value(field: str, value: str) -> str | bool | None:
+    """
+    A value from hf_summary_count the way the API returns it. access is
+    stored as "1" or "0".
+    """
+    if field == "access":
+        return {"1": True, "0": False}.get(value)
+    return value
+
+
+def check_facets(facets: list[str], filters: dict, conditions: list) -> None:
+    """
+    Checks that the facets can be counted without a GROUP BY over all of hf.
+    Without any filters they're read from hf_summary_count, which only has
+    SUMMARY_FIELDS. With filters, one of them has to be backed by an index.
+    """
+    if not conditions:
+        unsummarized = [name for name in facets if name not in SUMMARY_FIELDS]
+        if unsummarized:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Without a filter, facets are only available for "
+                f"{', '.join(SUMMARY_FIELDS)}",
+            )
+    elif len(conditions) == len(filters) and not any(
+        name in filters for name in INDEXED_FILTERS
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Facets need a namespace, since, until, or one of "
+            f"{', '.join(INDEXED_FILTERS)}",
+        )
+
 
+async def facet_counts(db: Database, conditions: list, facets: list[str]) -> dict:
+    """
+    Counts the rows that match a set of conditions by each facet field.
+    Without any conditions the counts are read from hf_summary_count.
+    """
+    if not conditions:
+        stmnt = (
+            select(models.SummaryCount)
+            .where(models.SummaryCount.field.in_(facets))
+            .order_by(models.SummaryCount.count.desc(), models.SummaryCount.value)
+        )
+        counts = {name: [] for name in facets}
+        for row in await db.execute(stmnt):
+            counts[row.field].append(
+                {
+                    "value": summary_count_value(row.field, row.value),
+                    "count": row.count,
+                }
+            )
+        return counts
+
+    counts = {}
+    for name in facets:
+        column = getattr(models.Item, name)
+        count = func.count().label("count")
+        stmnt = (
+            select(column, count)
+            .where(*conditions)
+            .group_by(column)
+            .order_by(count.desc(), column)
+        )
+        counts[name] = [
+            {"value": value, "count": n} for value, n in await db.execute(stmnt)
+        ]
+    return counts
+
+
+def stream_items(
+    db: Database, statement, after, limit: int, fields: tuple | list
+) -> StreamingResponse:
+    """
+    Streams every row of a keyset paginated query as newline delimited JSON,
+    a page at a time
+
+    Args:
+        db (Database): Hathifiles database
+        statement: Makes the statement for the page after a position
+        after: The position to start after. None to start at the beginning.
+        limit (int): Rows in each page
+        fields (tuple | list): The fields to output
+    """
+
+    async def stream():
+        position = after
+        while True:
+            rows = (await db.execute(statement(position))).all()
+            for row in rows:
+                yield dumps(item_dict(row, fields)) + b"\n"
+            if len(rows) < limit:
+                break
+            position = (rows[-1].rights_timestamp, rows[-1].htid)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+fields_description = """
+Comma separated fields to return, e.g. `rights_timestamp,access`. `htid` is
+always returned. Every field is returned when left out.
+"""
+
+
+def get_fields(
+    fields: str | None = Query(None, description=fields_description),
+) -> tuple | list:
+    """
+    Parses the `fields` query parameter into the fields to return
+    """
+    if not fields:
+        return FIELDS
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return ["htid"] + [name for name in dict.fromkeys(requested) if name != "htid"]
+
+
+def get_item_filters(
+    access: bool | None = Query(
+        None, description="Only items users can view, or can't"
+    ),
+    rights_code: str | None = Query(None, description="e.g. `pd`"),
+    rights_reason: str | None = Query(None, description="e.g. `bib`"),
+    source: str | None = Query(None, description="e.g. `MIU`"),
+    us_gov_doc_flag: bool | None = Query(
+        None, description="Only US federal government documents, or not"
+    ),
+    bib_fmt: str | None = Query(None, description="e.g. `BK`"),
+    collection_code: str | None = Query(None, description="e.g. `MIU`"),
+    content_provider_code: str | None = Query(None, description="e.g. `umich`"),
+    responsible_entity_code: str | None = Query(None, description="e.g. `umich`"),
+    digitization_agent_code: str | None = Query(None, description="e.g. `google`"),
+    access_profile_code: str | None = Query(None, description="e.g. `open`"),
+) -> dict:
+    """
+    The equality filters on FACET_FIELDS that were given
+    """
+    filters = {
+        "access": access,
+        "rights_code": rights_code,
+        "rights_reason": rights_reason,
+        "source": source,
+        "us_gov_doc_flag": us_gov_doc_flag,
+        "bib_fmt": bib_fmt,
+        "collection_code": collection_code,
+        "content_provider_code": content_provider_code,
+        "responsible_entity_code": responsible_entity_code,
+        "digitization_agent_code": digitization_agent_code,
+        "access_profile_code": access_profile_code,
+    }
+    return {name: value for name, value in filters.items() if value is not None}
+
+
+facets_description = f"""
+Comma separated fields to count the matching items by, e.g.
+`rights_code,access`. Any of {", ".join(f"`{name}`" for name in FACET_FIELDS)}.
+"""
+
+
+def get_facets(
+    facets: str | None = Query(None, description=facets_description),
+) -> list[str]:
+    """
+    Parses the `facets` query parameter into the fields to count
+    """
+    if not facets:
+        return []
+    requested = [name.strip() for name in facets.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in FACET_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown facets: {', '.join(unknown)}"
+        )
+    return list(dict.fromkeys(requested))
 
-@app.get("/items/{htid}", response_model_exclude_defaults=True)
-# def get_item(htid: str, db: Connection = Depends(get_db)):
-def get_item(htid: str, db: Connection = Depends(get_db)) -> Item:
+
+def json_response(content, headers: dict | None = None) -> Response:
+    """
+    Encodes items without going through pydantic validation. The endpoints
+    still declare their response_model so the OpenAPI docs describe the
+    responses.
+    """
+    return Response(dumps(content), media_type="application/json", headers=headers)
+
+
+@app.get("/items/changes", response_model=Changes, response_model_exclude_defaults=True)
+async def get_changes(
+    since: datetime = Query(
+        ..., description="Get items with a rights_timestamp on or after this time"
+    ),
+    cursor: str | None = Query(
+        None, description="The `next_cursor` from the previous page"
+    ),
+    limit: int = Query(
+        1000, ge=1, le=10000, description="Requested number of items per page"
+    ),
+    namespace: str | None = Query(
+        None, description="Only items with this htid namespace, e.g. `mdp`"
+    ),
+    content_provider_code: str | None = Query(
+        None, description="Only items from this content provider, e.g. `umich`"
+    ),
+    format: Literal["json", "ndjson"] = Query(
+        "json",
+        description="`json` returns one page. `ndjson` streams every matching item, one per line.",
+    ),
+    fields: tuple | list = Depends(get_fields),
+    db: Database = Depends(get_db),
+):
+    """
+    Get the Hathifiles Items whose rights_timestamp changed since a time, in
+    rights_timestamp and then htid order.
+    """
+    after = decode_cursor(cursor) if cursor else None
+
+    if format == "ndjson":
+        return stream_items(
+            db,
+            lambda position: changes_statement(
+                since, position, limit, namespace, content_provider_code
+            ),
+            after,
+            limit,
+            fields,
+        )
+
+    stmnt = changes_statement(since, after, limit, namespace, content_provider_code)
+    rows = (await db.execute(stmnt)).all()
+    return json_response(
+        {
+            "items": [item_dict(row, fields) for row in rows],
+            "next_cursor": encode_cursor(rows[-1]) if len(rows) == limit else None,
+        }
+    )
+
+
+@app.get("/items", response_model=ItemList, response_model_exclude_defaults=True)
+async def list_items(
+    namespace: str | None = Query(
+        None, description="Only items with this htid namespace, e.g. `mdp`"
+    ),
+    since: datetime | None = Query(
+        None, description="Only items with a rights_timestamp on or after this time"
+    ),
+    until: datetime | None = Query(
+        None, description="Only items with a rights_timestamp before this time"
+    ),
+    cursor: str | None = Query(
+        None, description="The `next_cursor` from the previous page"
+    ),
+    limit: int = Query(
+        1000, ge=1, le=10000, description="Requested number of items per page"
+    ),
+    format: Literal["json", "ndjson"] = Query(
+        "json",
+        description="`json` returns one page. `ndjson` streams every matching item, one per line.",
+    ),
+    filters: dict = Depends(get_item_filters),
+    facets: list[str] = Depends(get_facets),
+    fields: tuple | list = Depends(get_fields),
+    db: Database = Depends(get_db),
+):
+    """
+    List the Hathifiles Items that match a set of filters, in
+    rights_timestamp and then htid order. Filters on the same request are
+    ANDed together.
+
+    Filtering on `rights_code` and `access`, on `content_provider_code`, or on
+    `digitization_agent_code`, with or without a `since`/`until` range, is
+    backed by an index. Other filters work but may scan more of hf.
+
+    Add `facets` to also get counts of every matching item by those fields.
+    They're counted for the first page only. Without any filters they come
+    from the same summary tables as `/stats`, so only `rights_code`,
+    `access`, `bib_fmt` and `content_provider_code` are available. With
+    filters, one of them has to be backed by an index, or be a `namespace`
+    or `since`/`until` range. Facets aren't available when streaming.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    conditions = filter_conditions(filters, namespace, since, until)
+    if facets and format != "ndjson":
+        check_facets(facets, filters, conditions)
+
+    if format == "ndjson":
+        if facets:
+            raise HTTPException(
+                status_code=400, detail="Facets aren't available with ndjson"
+            )
+        return stream_items(
+            db,
+            lambda position: listing_statement(conditions, position, limit),
+            after,
+            limit,
+            fields,
+        )
+
+    rows = (await db.execute(listing_statement(conditions, after, limit))).all()
+    content = {
+        "items": [item_dict(row, fields) for row in rows],
+        "next_cursor": encode_cursor(rows[-1]) if len(rows) == limit else None,
+    }
+    if facets and cursor is None:
+        content["facets"] = await facet_counts(db, conditions, facets)
+    return json_response(content)
+
+
+@app.get(
+    "/items/{htid}", response_model=ProjectedItem, response_model_exclude_defaults=True
+)
+async def get_item(
+    htid: str,
+    if_none_match: str | None = Header(None),
+    if_modified_since: str | None = Header(None),
+    fields: tuple | list = Depends(get_fields),
+    db: Database = Depends(get_db),
+):
     """
     Get a Hathifiles Item by HathiTrust id
+
+    The `ETag` header is a hash of the response, so it changes whenever any
+    of the item's fields change and differs between `fields` projections.
+    Send it back as `If-None-Match` to get an empty 304 response when the
+    item hasn't changed. `Last-Modified` is the item's `rights_timestamp`,
+    which doesn't change when only the bibliographic fields do, so
+    `If-Modified-Since` is only honored when there's no `If-None-Match`.
     """
-    query = text(f"SELECT * FROM hf WHERE htid='{htid}'")
-    result = db.execute(query)
-    item = result.first()
+    await check_cache_generation(db)
+    item = cache.get(htid)
+    if item is MISSING:
+        stmnt = select(models.Item).filter_by(htid=htid)
+        item = (await db.execute(stmnt)).first()
+        cache.set(htid, item)
+
     if item is None:
         raise HTTPException(status_code=404, detail="Item not found")
 
-    return ItemModel(item)
-
-
-class ItemModel:
-    def __init__(self, data):
-        self._data = data
-        self.htid = self._data.htid
-        self.access = self._data.access
-        self.rights_code = self._data.rights_code
-        self.bib_num = self._data.bib_num
-        self.description = self._data.description
-        self.source = self._data.source
-        self.source_bib_num = self._data.source_bib_num
-        self.title = self._data.title
-        self.imprint = self._data.imprint
-        self.rights_reason = self._data.rights_reason
-        self.rights_timestamp = self._data.rights_timestamp
-        self.us_gov_doc_flag = self._data.us_gov_doc_flag
-        self.rights_date_used = self._data.rights_date_used
-        self.pub_place = self._data.pub_place
-        self.lang_code = self._data.lang_code
-        self.bib_fmt = self._data.bib_fmt
-        self.collection_code = self._data.collection_code
-        self.content_provider_code = self._data.content_provider_code
-        self.responsible_entity_code = self._data.responsible_entity_code
-        self.digitization_agent_code = self._data.digitization_agent_code
-        self.access_profile_code = self._data.access_profile_code
-        self.author = self._data.author
-
-    @property
-    def oclc(self):
-        return self._get_list(self._data.oclc)
-
-    @property
-    def isbn(self):
-        return self._get_list(self._data.isbn)
-
-    @property
-    def issn(self):
-        return self._get_list(self._data.issn)
-
-    @property
-    def lccn(self):
-        return self._get_list(self._data.lccn)
-
-    def _get_list(self, string_list):
-        return filter(None, string_list.split(","))
+    body = dumps(item_dict(item, fields))
+    headers = validators(body, item.rights_timestamp)
+    if not_modified(headers, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def validators(body: bytes, rights_timestamp: datetime | None) -> dict:
+    """
+    The ETag and Last-Modified headers for an item
+
+    Args:
+        body (bytes): The encoded item, with only the requested fields
+        rights_timestamp (datetime | None): The item's rights_timestamp. The hathifiles don't have a timezone so it's treated as UTC.
+
+    Returns:
+        dict: ETag and Last-Modified headers. There's no Last-Modified when there isn't a rights_timestamp.
+    """
+    headers = {"ETag": f'"{blake2b(body, digest_size=16).hexdigest()}"'}
+    if rights_timestamp is not None:
+        last_modified = rights_timestamp.replace(tzinfo=timezone.utc, microsecond=0)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+
+def not_modified(
+    headers: dict, if_none_match: str | None, if_modified_since: str | None
+) -> bool:
+    """
+    Whether the client's copy of an item is still current. If-None-Match wins
+    over If-Modified-Since when both are sent.
+
+    Args:
+        headers (dict): The item's ETag and Last-Modified headers
+        if_none_match (str | None): The If-None-Match request header
+        if_modified_since (str | None): The If-Modified-Since request header
+
+    Returns:
+        bool: True when a 304 should be sent
+    """
+    if if_none_match is not None:
+        etags = [etag.strip().removeprefix("W/") for etag in if_none_match.split(",")]
+        return "*" in etags or headers["ETag"].removeprefix("W/") in etags
+    if if_modified_since is not None and "Last-Modified" in headers:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return parsedate_to_datetime(headers["Last-Modified"]) <= since
+    return False
+
+
+@app.post("/items", response_model=Items, response_model_exclude_defaults=True)
+async def get_items(
+    request: ItemsRequest,
+    fields: tuple | list = Depends(get_fields),
+    db: Database = Depends(get_db),
+):
+    """
+    Get a batch of Hathifiles Items by HathiTrust id with a single query.
+    Requested ids that aren't in the Hathifiles are listed in `missing`.
+    """
+    await check_cache_generation(db)
+    htids = list(dict.fromkeys(request.htids))
+    found = {}
+    uncached = []
+    for htid in htids:
+        item = cache.get(htid)
+        if item is MISSING:
+            uncached.append(htid)
+        elif item is not None:
+            found[htid] = item
+
+    if uncached:
+        stmnt = select(models.Item).where(models.Item.htid.in_(uncached))
+        rows = {row.htid: row for row in (await db.execute(stmnt))}
+        for htid in uncached:
+            cache.set(htid, rows.get(htid))
+        found.update(rows)
+
+    return json_response(
+        {
+            "items": [
+                item_dict(found[htid], fields) for htid in htids if htid in found
+            ],
+            "missing": [htid for htid in htids if htid not in found],
+        }
+    )
+
+
+@app.get(
+    "/records/{bib_num}", response_model=Record, response_model_exclude_defaults=True
+)
+async def get_record(bib_num: int, db: Database = Depends(get_db)):
+    """
+    Get a HathiTrust bibliographic record with all of its volumes. The record
+    level fields are shown once instead of on every volume.
+    """
+    stmnt = select(models.Item).filter_by(bib_num=bib_num).order_by(models.Item.htid)
+    rows = (await db.execute(stmnt)).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Record not found")
+
+    record = item_dict(rows[0], RECORD_FIELDS)
+    record["items"] = [item_dict(row, VOLUME_FIELDS) for row in rows]
+    return json_response(record)
+
+
+@app.get(
+    "/htids/bloom-filter",
+    response_class=FileResponse,
+    responses={
+        304: {"description": "The client's copy of the filter is current"},
+        404: {"description": "There isn't a Bloom filter for the namespace"},
+    },
+)
+async def get_bloom_filter(
+    namespace: str | None = Query(
+        None, description="Only htids in this namespace, e.g. `mdp`"
+    ),
+    if_none_match: str | None = Header(None),
+):
+    """
+    Download a Bloom filter of the htids in the Hathifiles. An htid that isn't
+    in the filter definitely isn't in the Hathifiles, so there's no need to
+    look it up. The `X-Bloom-Filter-Version` header says what the filter was
+    built from.
+
+    The `ETag` changes every time the filter is rebuilt. Send it back as
+    `If-None-Match` to get an empty 304 response while the filter is current.
+    """
+    path = bloom.filter_path(S.hathifiles_bloom_filter_dir, namespace)
+    try:
+        bloom_filter = bloom.BloomFilter.open(path)
+        etag = bloom.filter_etag(path)
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=404, detail="Bloom filter not found")
+    headers = {"ETag": etag, "X-Bloom-Filter-Version": bloom_filter.version}
+    bloom_filter.close()
+    if not_modified(headers, if_none_match, None):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="application/octet-stream", headers=headers)
+
+
+@app.get("/stats", response_model=Stats)
+async def get_stats(
+    since: date | None = Query(None, description="Only count days from this day on"),
+    until: date | None = Query(None, description="Only count days before this day"),
+    db: Database = Depends(get_db),
+):
+    """
+    Get counts of the Hathifiles Items by rights_code, access, bib_fmt and
+    content_provider_code, and by the day of their rights_timestamp. The
+    counts come from summary tables that the loader keeps up to date, so
+    they're as current as the last load. `since` and `until` limit the days.
+    """
+    count_stmnt = select(models.SummaryCount).order_by(
+        models.SummaryCount.field,
+        models.SummaryCount.count.desc(),
+        models.SummaryCount.value,
+    )
+    counts = {field: [] for field in SUMMARY_FIELDS}
+    for row in await db.execute(count_stmnt):
+        value = summary_count_value(row.field, row.value)
+        counts.setdefault(row.field, []).append({"value": value, "count": row.count})
+
+    day_stmnt = select(models.SummaryDay).order_by(models.SummaryDay.day)
+    if since is not None:
+        day_stmnt = day_stmnt.where(models.SummaryDay.day >= since)
+    if until is not None:
+        day_stmnt = day_stmnt.where(models.SummaryDay.day < until)
+    days = [{"day": row.day, "count": row.count} for row in await db.execute(day_stmnt)]
+
+    return json_response(
+        {
+            "total": sum(value["count"] for value in counts[SUMMARY_FIELDS[0]]),
+            "counts": counts,
+            "days": days,
+        }
+    )
+
+
+@app.get("/cache")
+async def get_cache_stats() -> CacheStats:
+    """
+    Get the hit, miss, and eviction counters for the in-process cache of
+    Hathifiles lookups.
+    """
+    return cache.stats()
+
+
+async def get_items_by_identifier(
+    identifier_type: str, value: str, fields: tuple | list, db: Database
+):
+    normalized = normalize(identifier_type, value)
+    if normalized is None:
+        return json_response([])
+    stmnt = (
+        select(models.Item)
+        .join(models.Identifier, models.Identifier.htid == models.Item.htid)
+        .where(
+            models.Identifier.identifier_type == identifier_type,
+            models.Identifier.value == normalized,
+        )
+        .order_by(models.Item.htid)
+    )
+    return json_response([item_dict(row, fields) for row in await db.execute(stmnt)])
+
+
+@app.get(
+    "/oclc/{oclc}",
+    response_model=list[ProjectedItem],
+    response_model_exclude_defaults=True,
+)
+async def get_items_by_oclc(
+    oclc: str,
+    fields: tuple | list = Depends(get_fields),
+    db: Database = Depends(get_db),
+):
+    """
+    Get all Hathifiles Items with an OCLC number. `ocm` and `ocn` prefixes and
+    leading zeros are ignored.
+    """
+    return await get_items_by_identifier("oclc", oclc, fields, db)
+
+
+@app.get(
+    "/isbn/{isbn}",
+    response_model=list[ProjectedItem],
+    response_model_exclude_defaults=True,
+)
+async def get_items_by_isbn(
+    isbn: str,
+    fields: tuple | list = Depends(get_fields),
+    db: Database = Depends(get_db),
+):
+    """
+    Get all Hathifiles Items with an ISBN. Hyphens are ignored.
+    """
+    return await get_items_by_identifier("isbn", isbn, fields, db)
+
+
+@app.get(
+    "/issn/{issn}",
+    response_model=list[ProjectedItem],
+    response_model_exclude_defaults=True,
+)
+async def get_items_by_issn(
+    issn: str,
+    fields: tuple | list = Depends(get_fields),
+    db: Database = Depends(get_db),
+):
+    """
+    Get all Hathifiles Items with an ISSN. Hyphens are ignored.
+    """
+    return await get_items_by_identifier("issn", issn, fields, db)
+
+
+@app.get(
+    "/lccn/{lccn}",
+    response_model=list[ProjectedItem],
+    response_model_exclude_defaults=True,
+)
+async def get_items_by_lccn(
+    lccn: str,
+    fields: tuple | list = Depends(get_fields),
+    db: Database = Depends(get_db),
+):
+    """
+    Get all Hathifiles Items with an LCCN. The LCCN is normalized the way the
+    Library of Congress normalizes LCCNs.
+    """
+    return await get_items_by_identifier("lccn", lccn, fields, db)
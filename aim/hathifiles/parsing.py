@@ -0,0 +1,159 @@
+"""
+Hathifiles Parsing
+==================
+
+Reads hathifiles into rows of hf column values. Hathifiles are gzipped tab
+separated files with one item per line and the columns in the same order as
+`hf`. It's kept apart from the loader so the snapshot builder and the
+exporters can read hathifiles without importing the loading machinery.
+"""
+
+import gzip
+import time
+from collections import namedtuple
+from datetime import datetime
+from hashlib import blake2b
+from itertools import islice
+from typing import Iterator
+from aim.hathifiles.profiles import Profile
+from aim.hathifiles.serialization import FIELDS
+
+#: A parsed hathifiles line and the hash of the line
+HathifilesRow = namedtuple("HathifilesRow", (*FIELDS, "row_hash"))
+
+
+def _int(value: str) -> int | None:
+    return int(value) if value else None
+
+
+def _timestamp(value: str) -> datetime | None:
+    return datetime.fromisoformat(value) if value else None
+
+
+def parse_line(line: str) -> HathifilesRow:
+    """
+    Parses one line of a hathifile
+
+    Args:
+        line (str): A tab separated hathifiles line
+
+    Returns:
+        HathifilesRow: The line as hf column values
+    """
+    values = line.rstrip("\r\n").split("\t")
+    # Trailing empty columns are sometimes left off
+    values.extend([""] * (len(FIELDS) - len(values)))
+    row_hash = blake2b("\t".join(values).encode(), digest_size=16).digest()
+    return HathifilesRow(
+        htid=values[0],
+        access=values[1] == "allow",
+        rights_code=values[2],
+        bib_num=_int(values[3]),
+        description=values[4],
+        source=values[5],
+        source_bib_num=values[6],
+        oclc=values[7],
+        isbn=values[8],
+        issn=values[9],
+        lccn=values[10],
+        title=values[11],
+        imprint=values[12],
+        rights_reason=values[13],
+        rights_timestamp=_timestamp(values[14]),
+        us_gov_doc_flag=values[15] == "1",
+        rights_date_used=_int(values[16]),
+        pub_place=values[17],
+        lang_code=values[18],
+        bib_fmt=values[19],
+        collection_code=values[20],
+        content_provider_code=values[21],
+        responsible_entity_code=values[22],
+        digitization_agent_code=values[23],
+        access_profile_code=values[24],
+        author=values[25],
+        row_hash=row_hash,
+    )
+
+
+def open_hathifile(path: str):
+    """
+    Opens a hathifile for reading text. Gzipped files are decompressed as
+    they're read.
+
+    Args:
+        path (str): Path to a hathifile
+
+    Returns:
+        A text file object
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="\n")
+    return open(path, encoding="utf-8", newline="\n")
+
+
+def read_line_chunks(
+    path: str, chunk_size: int = 10000, start_line: int = 0
+) -> Iterator[list[str]]:
+    """
+    Reads a hathifile a chunk of unparsed lines at a time. Chunks always end
+    on a line boundary.
+
+    Args:
+        path (str): Path to a hathifile
+        chunk_size (int, optional): Lines in each chunk. Defaults to 10000.
+        start_line (int, optional): Lines to skip first. Gzipped files can't be seeked into, so these are still decompressed, but they aren't parsed. Defaults to 0.
+
+    Yields:
+        list[str]: The next chunk of lines
+    """
+    with open_hathifile(path) as f:
+        lines = []
+        for line in islice(f, start_line, None):
+            lines.append(line)
+            if len(lines) == chunk_size:
+                yield lines
+                lines = []
+        if lines:
+            yield lines
+
+
+def parse_chunk(
+    lines: list[str], profile: Profile | None = None
+) -> tuple[list[HathifilesRow], float]:
+    """
+    Parses a chunk of lines. This runs in the parse worker processes.
+
+    Args:
+        lines (list[str]): hathifiles lines
+        profile (Profile | None, optional): Only parse lines in this subset profile. Defaults to None for every line.
+
+    Returns:
+        tuple[list[HathifilesRow], float]: The rows and the seconds it took to parse them
+    """
+    start = time.perf_counter()
+    rows = [
+        parse_line(line)
+        for line in lines
+        if line.strip() and (profile is None or profile.matches(line))
+    ]
+    return rows, time.perf_counter() - start
+
+
+def read_chunks(
+    path: str, chunk_size: int = 10000, profile: Profile | None = None
+) -> Iterator[list[HathifilesRow]]:
+    """
+    Reads a hathifile a chunk of rows at a time
+
+    Args:
+        path (str): Path to a hathifile
+        chunk_size (int, optional): Lines in each chunk. Chunks have fewer rows when the profile drops some. Defaults to 10000.
+        profile (Profile | None, optional): Only read lines in this subset profile. Defaults to None for every line.
+
+    Yields:
+        list[HathifilesRow]: The next chunk of rows
+    """
+    for lines in read_line_chunks(path, chunk_size):
+        rows, _ = parse_chunk(lines, profile)
+        if rows:
+            yield rows
@@ -1,10 +1,13 @@
 import requests
 import json
 import os
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 from typing import Type
+from aim.hathifiles.state import StateStore
 from aim.services import S
 
+FILE_LIST_URL = "https://www.hathitrust.org/files/hathifiles/hathi_file_list.json"
+
 
 def filter_for_update_files(hathi_file_list: list) -> list:
     """
@@ -38,50 +41,94 @@ def get_hathi_file_list() -> list:
     Returns:
         list: list of dictionairies that describe hathifiles
     """
+    response = requests.get(FILE_LIST_URL)
+    if response.status_code != 200:
+        response.raise_for_status()
+    return response.json()
+
+
+def poll_hathi_file_list(store: StateStore) -> tuple[list | None, dict]:
+    """
+    Gets the list of hathifiles from hathitrust.org if it has changed since
+    the last time its validators were saved in the store. An unchanged list
+    costs a 304 with no body.
+
+    Args:
+        store (StateStore): The hathifiles state store
+
+    Returns:
+        tuple[list | None, dict]: The list, or None when it hasn't changed, and the response's ETag and Last-Modified to save once the list has been handled
+    """
     response = requests.get(
-        "https://www.hathitrust.org/files/hathifiles/hathi_file_list.json"
+        FILE_LIST_URL, headers=store.validators(FILE_LIST_URL), timeout=60
     )
+    if response.status_code == 304:
+        return None, {}
     if response.status_code != 200:
         response.raise_for_status()
-    return response.json()
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    return response.json(), validators
 
 
-def get_store(store_path: str = S.hathifiles_store_path) -> list:
+def get_store(
+    state_path: str = S.hathifiles_state_path,
+    legacy_store_path: str = S.hathifiles_store_path,
+) -> StateStore:
     """
-    Loads the store file that contains the list of all hathifile update files
-    that have been seen before.
+    Opens the state store of hathifiles that have been seen before. The first
+    time it's opened on a deployment that still has an old JSON store file,
+    the files in it are carried over into a new state store.
 
     Args:
-        store_path (str, optional): path to the store file. Defaults to S.hathifiles_store_path.
+        state_path (str, optional): path to the state store. Defaults to S.hathifiles_state_path.
+        legacy_store_path (str, optional): path to an old JSON store file. Defaults to S.hathifiles_store_path.
+
+    Raises:
+        FileNotFoundError: When there isn't a state store or an old JSON store file. Make one with create_store_file.
 
     Returns:
-        list: list of hathifile update files that have been seen before
+        StateStore: the state store
     """
-    with open(store_path) as f:
-        file_list = json.load(f)
-    return file_list
+    if not os.path.exists(state_path):
+        if not os.path.exists(legacy_store_path):
+            raise FileNotFoundError(state_path)
+        create_store_file(state_path, legacy_store_path)
+    return StateStore(state_path)
 
 
-def create_store_file(store_path: str = S.hathifiles_store_path) -> None:
+def create_store_file(
+    state_path: str = S.hathifiles_state_path,
+    legacy_store_path: str = S.hathifiles_store_path,
+) -> None:
     """
-    Creates a store file of the current list of update files from hathitrust.org
-    if there does not already exist a store file.
+    Creates the state store if there isn't one already. The files from an
+    old JSON store file are carried over when there is one. Otherwise the
+    store starts with the current list of update files from hathitrust.org.
 
     Args:
-        store_path (str, optional): path to store file. Defaults to S.hathifiles_store_path.
+        state_path (str, optional): path to the state store. Defaults to S.hathifiles_state_path.
+        legacy_store_path (str, optional): path to an old JSON store file. Defaults to S.hathifiles_store_path.
     """
 
-    if os.path.exists(store_path):
+    if os.path.exists(state_path):
         S.logger.info("HathiFiles store file already exists. Leaving alone.")
+        return
+    if os.path.exists(legacy_store_path):
+        with open(legacy_store_path) as f:
+            update_files_list = json.load(f)
     else:
         update_files_list = get_latest_update_files()
-        with open(store_path, "w") as f:
-            json.dump(update_files_list, f, ensure_ascii=False, indent=4)
-        S.logger.info("Created Hathifiles store file")
+    store = StateStore(state_path)
+    store.record_seen(update_files_list)
+    store.close()
+    S.logger.info("Created Hathifiles store file", files=len(update_files_list))
 
 
 class NewFileHandler:
-    def __init__(self, new_files: list, store: list) -> None:
+    def __init__(self, new_files: list, store: StateStore) -> None:
         self.new_files = new_files
         self.store = store
 
@@ -98,60 +145,47 @@ class NewFileHandler:
         else:
             response.raise_for_status()
 
-    @property
-    def slim_store(self):
-        """
-        Removes files from the store that are over one year old
-
-        Returns:
-            list: list of update files that are newer than one year
-        """
-        last_year = datetime.today() - timedelta(days=365)
-        slimmed_store = []
-        for file_name in self.store:
-            end = file_name.split("_")[2]
-            date = datetime.strptime(end.split(".")[0], "%Y%m%d")
-            if date > last_year:
-                slimmed_store.append(file_name)
-        return slimmed_store
-
-    def replace_store(self, store_path: str = S.hathifiles_store_path):
+    def update_store(self):
         """
-        Replaces the store file with a list of hathifile update files
-
-        Args:
-            store_path (str, optional):  path to hathifiles store file. Defaults to S.hathifiles_store_path.
+        Records the new files as seen and removes files from the store that
+        are over one year old
         """
-        with open(store_path, "w") as f:
-            json.dump(
-                (self.slim_store + self.new_files), f, ensure_ascii=False, indent=4
-            )
-
-        S.logger.info("Update store SUCCESS")
+        self.store.record_seen(self.new_files)
+        pruned = self.store.prune(date.today() - timedelta(days=365))
+        S.logger.info("Update store SUCCESS", pruned=pruned)
 
 
 def check_for_new_update_files(
     latest_update_files: list | None = None,
-    store: list | None = None,
+    store: StateStore | None = None,
     new_file_handler_klass: Type[NewFileHandler] = NewFileHandler,
-):
+) -> list | None:
     """
-    Gets the latest list of hathifiles from hathitrust.org, loads up the store
-    file and compares them. If there are new files triggers the argo events
-    webhook and updates the store. If there are no new files, it exits.
+    Gets the latest list of hathifiles from hathitrust.org and compares it
+    with the state store. If the list hasn't changed since the last poll it
+    exits. If there are new files triggers the argo events webhook and
+    records them in the store. If there are no new files, it exits.
 
     Args:
-        latest_update_files (list | None, optional): list of latest update files. This will call get_latest_update_files() when None is given.
-        store (list | None, optional): list of hathifiles update files that have been seen before. This will call get_store() if None is given.
+        latest_update_files (list | None, optional): list of latest update files. This will poll hathitrust.org when None is given.
+        store (StateStore | None, optional): the state store of hathifiles that have been seen before. This will call get_store() if None is given.
         new_file_handler_klass (Type[NewFileHandler], optional): Class that handles new update files. Defaults to NewFileHandler.
-    """
-    if latest_update_files is None:  # pragma: no cover
-        latest_update_files = get_latest_update_files()
 
+    Returns:
+        list | None: The new update files. None when the list hasn't changed.
+    """
     if store is None:  # pragma: no cover
         store = get_store()
 
-    new_files = [filename for filename in latest_update_files if filename not in store]
+    validators = {}
+    if latest_update_files is None:
+        hathi_file_list, validators = poll_hathi_file_list(store)
+        if hathi_file_list is None:
+            S.logger.info("Hathifiles file list hasn't changed")
+            return None
+        latest_update_files = filter_for_update_files(hathi_file_list)
+
+    new_files = store.unseen(latest_update_files)
 
     if not new_files:
         S.logger.info("No new Hathifiles update files")
@@ -160,4 +194,10 @@ def check_for_new_update_files(
 
         handler = new_file_handler_klass(new_files=new_files, store=store)
         handler.notify_webhook()
-        handler.replace_store()
+        handler.update_store()
+
+    # Saved last, so a list whose new files couldn't be handled is fetched
+    # again next time instead of getting a 304
+    if validators:
+        store.save_validators(FILE_LIST_URL, **validators)
+    return new_files
@@ -0,0 +1,151 @@
+"""
+Hathifiles Subset Profiles
+==========================
+
+Some environments only need part of HathiTrust, for example our own items
+and a few partners'. A profile says which part: items in any of its htid
+namespaces or from any of its content providers. The loaders drop lines that
+don't match a profile while they parse, before anything is written to the
+database.
+
+Profiles are declared in PROFILES. More can be declared in a TOML file at
+HATHIFILES_PROFILES_PATH, one table per profile:
+
+.. code-block:: toml
+
+    [partners]
+    namespaces = ["mdp", "uc1"]
+    content_provider_codes = ["umich"]
+"""
+
+import os
+import tomllib
+from dataclasses import dataclass
+from sqlalchemy import or_
+from aim.hathifiles.database import models
+from aim.services import S
+
+# The content_provider_code column of a hathifiles line
+CONTENT_PROVIDER_COLUMN = 21
+
+
+@dataclass(frozen=True)
+class Profile:
+    """
+    A subset of the hathifiles. A profile with no namespaces and no content
+    providers is all of the hathifiles.
+    """
+
+    #: Name of the profile
+    name: str
+    #: htid namespaces to keep, e.g. "mdp"
+    namespaces: frozenset[str] = frozenset()
+    #: content_provider_codes to keep, e.g. "umich"
+    content_provider_codes: frozenset[str] = frozenset()
+
+    @property
+    def is_everything(self) -> bool:
+        return not self.namespaces and not self.content_provider_codes
+
+    def matches(self, line: str) -> bool:
+        """
+        Whether a raw hathifiles line is in the profile. The namespace is
+        checked first since it doesn't need the line to be split up.
+
+        Args:
+            line (str): A tab separated hathifiles line
+
+        Returns:
+            bool: True when the line should be loaded
+        """
+        if self.is_everything:
+            return True
+        if line.split(".", 1)[0] in self.namespaces:
+            return True
+        if self.content_provider_codes:
+            values = line.split("\t", CONTENT_PROVIDER_COLUMN + 1)
+            return (
+                len(values) > CONTENT_PROVIDER_COLUMN
+                and values[CONTENT_PROVIDER_COLUMN] in self.content_provider_codes
+            )
+        return False
+
+    def where(self):
+        """
+        The profile as a condition on hf, for copying a subset out of the
+        database
+
+        Returns:
+            A SQLAlchemy condition. None for a profile of everything.
+        """
+        if self.is_everything:
+            return None
+        conditions = [
+            models.Item.htid.startswith(f"{namespace}.")
+            for namespace in sorted(self.namespaces)
+        ]
+        if self.content_provider_codes:
+            conditions.append(
+                models.Item.content_provider_code.in_(
+                    sorted(self.content_provider_codes)
+                )
+            )
+        return or_(*conditions)
+
+
+#: Built in profiles
+PROFILES = {
+    "full": Profile(name="full"),
+    "umich": Profile(
+        name="umich",
+        namespaces=frozenset({"mdp", "miua", "miun"}),
+        content_provider_codes=frozenset({"umich"}),
+    ),
+}
+
+
+def load_profiles(path: str | None = S.hathifiles_profiles_path) -> dict:
+    """
+    The built in profiles plus the ones declared in a TOML file
+
+    Args:
+        path (str | None, optional): Path to a TOML file of profiles. Defaults to S.hathifiles_profiles_path.
+
+    Returns:
+        dict: Profiles by name
+    """
+    profiles = dict(PROFILES)
+    if path and os.path.exists(path):
+        with open(path, "rb") as f:
+            declared = tomllib.load(f)
+        for name, options in declared.items():
+            profiles[name] = Profile(
+                name=name,
+                namespaces=frozenset(options.get("namespaces", [])),
+                content_provider_codes=frozenset(
+                    options.get("content_provider_codes", [])
+                ),
+            )
+    return profiles
+
+
+def get_profile(name: str, path: str | None = S.hathifiles_profiles_path) -> Profile:
+    """
+    Looks up a profile by name
+
+    Args:
+        name (str): Name of the profile
+        path (str | None, optional): Path to a TOML file of profiles. Defaults to S.hathifiles_profiles_path.
+
+    Raises:
+        ValueError: When there isn't a profile with that name
+
+    Returns:
+        Profile: The profile
+    """
+    profiles = load_profiles(path)
+    if name not in profiles:
+        raise ValueError(
+            f"Unknown hathifiles profile {name}. Choose from {', '.join(profiles)}"
+        )
+    return profiles[name]
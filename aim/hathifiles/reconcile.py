@@ -0,0 +1,102 @@
+"""
+Digifeeds Reconciliation
+========================
+
+Finds digifeeds items that have reached HathiTrust while a hathifiles update
+file is being loaded. Before the load, the barcodes of the items that are
+``pending_deletion`` without ``in_hathifiles`` are fetched from the digifeeds
+API in one listing. Each batch of rows the loader reads is checked against
+them by looking up ``mdp.<barcode>`` htids in a set. The matches are recorded
+in the digifeeds database in bulk with the row's rights_timestamp as the
+item's hathifiles_timestamp.
+
+Matches are recorded after the batch they came from has been committed. When
+the digifeeds API can't be reached they're kept and tried again after the
+next batch, so a short outage doesn't lose them. Items that still aren't
+recorded are picked up by the next load or by
+``aim digifeeds check-and-update-hathifiles-timestamp``.
+"""
+
+from datetime import datetime
+import requests
+from aim.digifeeds.db_client import DBClient
+from aim.services import S
+
+#: Digifeeds items are deposited in the mdp namespace
+NAMESPACE = "mdp"
+
+
+class DigifeedsReconciler:
+    """
+    Matches hathifiles rows against digifeeds items waiting to show up in
+    HathiTrust
+
+    Args:
+        barcodes (set[str]): Barcodes of the items that are waiting
+    """
+
+    def __init__(self, barcodes: set[str]) -> None:
+        self.barcodes = set(barcodes)
+        #: Matched barcodes that haven't been recorded yet, with their rights_timestamp
+        self.matches: dict[str, datetime] = {}
+        #: Barcodes that have been recorded in the digifeeds database
+        self.recorded: list[str] = []
+
+    @classmethod
+    def pending(cls) -> "DigifeedsReconciler":
+        """
+        A reconciler for the items that are pending_deletion without
+        in_hathifiles in the digifeeds database
+
+        Returns:
+            DigifeedsReconciler: The reconciler
+        """
+        items = DBClient().get_items(q="status:pending_deletion -status:in_hathifiles")
+        S.logger.info("Digifeeds items waiting for hathifiles", count=len(items))
+        return cls({item["barcode"] for item in items})
+
+    def match(self, rows: list) -> int:
+        """
+        Picks out the rows for waiting digifeeds items
+
+        Args:
+            rows (list[HathifilesRow]): A batch of parsed hathifiles rows
+
+        Returns:
+            int: How many rows matched
+        """
+        if not self.barcodes:
+            return 0
+        matched = 0
+        for row in rows:
+            namespace, _, barcode = row.htid.partition(".")
+            if namespace == NAMESPACE and barcode in self.barcodes:
+                self.barcodes.discard(barcode)
+                self.matches[barcode] = row.rights_timestamp or datetime.now()
+                matched += 1
+        return matched
+
+    def flush(self) -> int:
+        """
+        Records the matches in the digifeeds database in one request. When
+        the request fails the matches are kept for the next flush.
+
+        Returns:
+            int: How many items were recorded
+        """
+        if not self.matches:
+            return 0
+        try:
+            DBClient().update_hathifiles_timestamps(self.matches)
+        except requests.RequestException as error:
+            S.logger.error(
+                "Recording digifeeds items in hathifiles failed",
+                barcodes=list(self.matches),
+                error=str(error),
+            )
+            return 0
+        recorded = list(self.matches)
+        self.recorded.extend(recorded)
+        self.matches = {}
+        S.logger.info("Recorded digifeeds items in hathifiles", barcodes=recorded)
+        return len(recorded)
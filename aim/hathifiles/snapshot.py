@@ -0,0 +1,228 @@
+"""
+Hathifiles Snapshots
+====================
+
+Read-only SQLite copies of hf for batch jobs. A snapshot has the same hf
+table as the Hathifiles Database, optionally cut down to a subset profile,
+so that jobs that do thousands of lookups can answer them from a
+local file instead of going through the Hathifiles API.
+
+open_snapshot() keeps one Snapshot for each path, so the clients in a
+process share its engine instead of each opening the file again.
+"""
+
+import os
+from functools import lru_cache
+from typing import Iterable
+from sqlalchemy import Connection, Engine, create_engine, event, insert, select
+from aim.hathifiles.database import models
+from aim.hathifiles.parsing import read_chunks
+from aim.hathifiles.profiles import Profile
+from aim.hathifiles.serialization import item_dict
+from aim.services import S
+
+
+def write_snapshot(path: str, batches: Iterable[list[dict]]) -> int:
+    """
+    Writes batches of hf rows into a new SQLite file. The file is built next
+    to path and then renamed, so jobs reading an older snapshot at path
+    aren't disturbed.
+
+    Args:
+        path (str): Where to write the snapshot
+        batches (Iterable[list[dict]]): Batches of hf rows
+
+    Returns:
+        int: The number of rows in the snapshot
+    """
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    snapshot = create_engine(f"sqlite:///{tmp_path}")
+    total = 0
+    with snapshot.connect() as conn:
+        # Nothing reads the file until it's renamed into place, so skip the
+        # journal and fsyncs while building it
+        conn.exec_driver_sql("PRAGMA journal_mode=OFF")
+        conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        models.Item.__table__.create(conn)
+        for rows in batches:
+            conn.execute(insert(models.Item.__table__), rows)
+            total += len(rows)
+        conn.exec_driver_sql("ANALYZE")
+        conn.commit()
+    snapshot.dispose()
+
+    os.replace(tmp_path, path)
+    return total
+
+
+def build_snapshot(
+    db: Connection,
+    path: str,
+    profile: Profile | None = None,
+    batch_size: int = 10000,
+) -> int:
+    """
+    Copies hf from the Hathifiles Database into a new snapshot
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        path (str): Where to write the snapshot
+        profile (Profile | None, optional): Only copy the items in this subset profile. Defaults to None for every item.
+        batch_size (int, optional): How many rows to copy at a time. Defaults to 10000.
+
+    Returns:
+        int: The number of rows in the snapshot
+    """
+    stmnt = select(models.Item.__table__)
+    if profile is not None and not profile.is_everything:
+        stmnt = stmnt.where(profile.where())
+    result = db.execute(stmnt.execution_options(yield_per=batch_size))
+    total = write_snapshot(
+        path, ([row._asdict() for row in rows] for rows in result.partitions())
+    )
+    S.logger.info(
+        "Built hathifiles snapshot",
+        path=path,
+        profile=profile.name if profile else None,
+        rows=total,
+    )
+    return total
+
+
+def build_snapshot_from_file(
+    hathifile: str,
+    path: str,
+    profile: Profile | None = None,
+    batch_size: int = 10000,
+) -> int:
+    """
+    Builds a snapshot straight from a hathifile, without a Hathifiles
+    Database. With a subset profile this regenerates a small sample database
+    like umich_small.db from a full file in one step.
+
+    Args:
+        hathifile (str): Path to a hathifile
+        path (str): Where to write the snapshot
+        profile (Profile | None, optional): Only keep the lines in this subset profile. Defaults to None for every line.
+        batch_size (int, optional): How many lines to read at a time. Defaults to 10000.
+
+    Returns:
+        int: The number of rows in the snapshot
+    """
+    total = write_snapshot(
+        path,
+        (
+            [row._asdict() for row in rows]
+            for rows in read_chunks(hathifile, batch_size, profile)
+        ),
+    )
+    S.logger.info(
+        "Built hathifiles snapshot",
+        path=path,
+        hathifile=hathifile,
+        profile=profile.name if profile else None,
+        rows=total,
+    )
+    return total
+
+
+def snapshot_engine(path: str) -> Engine:
+    """
+    A read-only engine for a snapshot. The file is opened immutable, so
+    SQLite skips locking, and memory mapped, so lookups read pages straight
+    from the page cache.
+
+    Args:
+        path (str): Path to the snapshot
+
+    Raises:
+        FileNotFoundError: When there isn't a snapshot at path
+
+    Returns:
+        sqlalchemy.Engine: The engine
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    engine = create_engine(
+        f"sqlite:///file:{os.path.abspath(path)}?mode=ro&immutable=1&uri=true"
+    )
+    mmap_size = os.path.getsize(path)
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA query_only=ON")
+        cursor.execute(f"PRAGMA mmap_size={mmap_size}")
+        cursor.close()
+
+    return engine
+
+
+class Snapshot:
+    """
+    Looks up Hathifiles Items in a snapshot. Items come back the same way the
+    Hathifiles API returns them. Each lookup checks a connection out of the
+    engine's pool, so one Snapshot can be shared between threads.
+
+    Args:
+        path (str): Path to the snapshot
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.engine = snapshot_engine(path)
+
+    def get_item(self, htid: str) -> dict | None:
+        stmnt = select(models.Item).filter_by(htid=htid)
+        with self.engine.connect() as connection:
+            row = connection.execute(stmnt).first()
+        if row is None:
+            return None
+        return _json_item(row)
+
+    def get_items(self, htids: list[str], batch_size: int = 500) -> dict:
+        found = {}
+        with self.engine.connect() as connection:
+            for start in range(0, len(htids), batch_size):
+                stmnt = select(models.Item).where(
+                    models.Item.htid.in_(htids[start : start + batch_size])
+                )
+                found.update({row.htid: row for row in connection.execute(stmnt)})
+        return {
+            "items": [
+                _json_item(found[htid])
+                for htid in dict.fromkeys(htids)
+                if htid in found
+            ],
+            "missing": list(dict.fromkeys(h for h in htids if h not in found)),
+        }
+
+    def close(self) -> None:
+        self.engine.dispose()
+
+
+def _json_item(row) -> dict:
+    # The item as the API returns it. rights_timestamp is the only value that
+    # isn't already a JSON type.
+    item = item_dict(row)
+    if "rights_timestamp" in item:
+        item["rights_timestamp"] = item["rights_timestamp"].isoformat()
+    return item
+
+
+@lru_cache(maxsize=None)
+def open_snapshot(path: str) -> Snapshot:
+    """
+    The shared Snapshot for a path. Snapshots are opened immutable, so build
+    a new snapshot at a new path rather than over one that's in use.
+
+    Args:
+        path (str): Path to the snapshot
+
+    Returns:
+        Snapshot: The snapshot, opened the first time it's asked for
+    """
+    return Snapshot(path)
@@ -0,0 +1,338 @@
+"""
+Hathifiles State Store
+======================
+
+A small SQLite database of the hathifiles the poller has seen and how far
+each one has got: seen, downloaded, loaded. It also keeps the ETag and
+Last-Modified of hathi_file_list.json so the poller can ask for the list
+conditionally and get a cheap 304 when nothing has changed.
+
+Webhook notifications about new files wait in the store until they're
+delivered, so a notification survives a webhook outage or a restart.
+
+The store is an ordinary SQLite file, so it can be queried with ``sqlite3``
+or ``aim hathifiles list-files``.
+"""
+
+import json
+import os
+from datetime import date, datetime
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    delete,
+    event,
+    func,
+    select,
+    update,
+)
+from sqlalchemy.dialects.sqlite import insert
+from aim.services import S
+
+#: Lifecycle statuses, in order
+SEEN = "seen"
+DOWNLOADED = "downloaded"
+LOADED = "loaded"
+STATUSES = (SEEN, DOWNLOADED, LOADED)
+
+metadata = MetaData()
+
+hathifile = Table(
+    "hathifile",
+    metadata,
+    Column("filename", String, primary_key=True),
+    Column("full", Boolean, nullable=False),
+    # The date in the filename, so pruning doesn't parse names
+    Column("file_date", Date, nullable=False, index=True),
+    Column("status", String, nullable=False, index=True),
+    Column("seen_at", DateTime, nullable=False),
+    Column("downloaded_at", DateTime),
+    Column("loaded_at", DateTime),
+)
+
+http_validator = Table(
+    "http_validator",
+    metadata,
+    Column("url", String, primary_key=True),
+    Column("etag", String),
+    Column("last_modified", String),
+)
+
+webhook_notification = Table(
+    "webhook_notification",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    # JSON list of the new filenames
+    Column("file_names", String, nullable=False),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("next_attempt_at", DateTime, nullable=False, index=True),
+    Column("last_error", String),
+    Column("created_at", DateTime, nullable=False),
+)
+
+
+def file_date(filename: str) -> date:
+    """
+    The date in a hathifile name, e.g. 2024-12-02 for hathi_upd_20241202.txt.gz
+
+    Args:
+        filename (str): A hathifile name
+
+    Raises:
+        ValueError: When the name isn't like hathi_upd_YYYYMMDD or hathi_full_YYYYMMDD
+
+    Returns:
+        date: The date of the file
+    """
+    parts = filename.split("_")
+    if len(parts) < 3:
+        raise ValueError(f"{filename} isn't a hathifile name")
+    return datetime.strptime(parts[2].split(".")[0], "%Y%m%d").date()
+
+
+class StateStore:
+    """
+    The hathifiles state store
+
+    Args:
+        path (str, optional): Path to the SQLite file. It's created if it doesn't exist. Defaults to S.hathifiles_state_path.
+    """
+
+    def __init__(self, path: str = S.hathifiles_state_path) -> None:
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.engine = create_engine(f"sqlite:///{path}")
+
+        @event.listens_for(self.engine, "connect")
+        def set_pragmas(dbapi_connection, connection_record):
+            # Readers like list-files don't block a running poller
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.close()
+
+        metadata.create_all(self.engine)
+
+    def unseen(self, filenames: list[str]) -> list[str]:
+        """
+        The filenames that aren't in the store, in the order they were given
+
+        Args:
+            filenames (list[str]): hathifile names
+
+        Returns:
+            list[str]: The ones that haven't been seen
+        """
+        stmnt = select(hathifile.c.filename).where(hathifile.c.filename.in_(filenames))
+        with self.engine.connect() as conn:
+            seen = set(conn.execute(stmnt).scalars())
+        return [filename for filename in filenames if filename not in seen]
+
+    def record_seen(self, filenames: list[str]) -> None:
+        """
+        Adds hathifiles to the store. Files that are already there keep
+        their status.
+
+        Args:
+            filenames (list[str]): hathifile names
+        """
+        if not filenames:
+            return
+        now = datetime.now()
+        rows = [
+            {
+                "filename": filename,
+                "full": filename.startswith("hathi_full_"),
+                "file_date": file_date(filename),
+                "status": SEEN,
+                "seen_at": now,
+            }
+            for filename in filenames
+        ]
+        with self.engine.begin() as conn:
+            conn.execute(insert(hathifile).on_conflict_do_nothing(), rows)
+
+    def mark(self, filename: str, status: str) -> None:
+        """
+        Moves a hathifile to a later status, adding it to the store if it
+        isn't there yet. A file never moves back to an earlier status.
+
+        Args:
+            filename (str): hathifile name
+            status (str): DOWNLOADED or LOADED
+
+        Raises:
+            ValueError: For an unknown status
+        """
+        if status not in STATUSES:
+            raise ValueError(f"Unknown hathifile status {status}")
+        self.record_seen([filename])
+        earlier = list(STATUSES[: STATUSES.index(status)])
+        stmnt = (
+            update(hathifile)
+            .where(hathifile.c.filename == filename, hathifile.c.status.in_(earlier))
+            .values(status=status, **{f"{status}_at": datetime.now()})
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmnt)
+
+    def files(self, status: str | None = None) -> list[dict]:
+        """
+        The hathifiles in the store, oldest first
+
+        Args:
+            status (str | None, optional): Only files with this status. Defaults to None for all of them.
+
+        Returns:
+            list[dict]: hathifile rows
+        """
+        stmnt = select(hathifile).order_by(hathifile.c.file_date, hathifile.c.filename)
+        if status is not None:
+            stmnt = stmnt.where(hathifile.c.status == status)
+        with self.engine.connect() as conn:
+            return [row._asdict() for row in conn.execute(stmnt)]
+
+    def prune(self, before: date) -> int:
+        """
+        Removes hathifiles dated before a day
+
+        Args:
+            before (date): The earliest file date to keep
+
+        Returns:
+            int: How many files were removed
+        """
+        stmnt = delete(hathifile).where(hathifile.c.file_date < before)
+        with self.engine.begin() as conn:
+            return conn.execute(stmnt).rowcount
+
+    def validators(self, url: str) -> dict:
+        """
+        Conditional request headers for a URL from its last response
+
+        Args:
+            url (str): The URL
+
+        Returns:
+            dict: If-None-Match and If-Modified-Since headers. Empty when the URL hasn't been fetched.
+        """
+        stmnt = select(http_validator).where(http_validator.c.url == url)
+        with self.engine.connect() as conn:
+            row = conn.execute(stmnt).first()
+        headers = {}
+        if row is not None and row.etag:
+            headers["If-None-Match"] = row.etag
+        if row is not None and row.last_modified:
+            headers["If-Modified-Since"] = row.last_modified
+        return headers
+
+    def save_validators(
+        self, url: str, etag: str | None, last_modified: str | None
+    ) -> None:
+        """
+        Keeps the ETag and Last-Modified of a response for the next request
+
+        Args:
+            url (str): The URL
+            etag (str | None): The response's ETag header
+            last_modified (str | None): The response's Last-Modified header
+        """
+        stmnt = insert(http_validator).values(
+            url=url, etag=etag, last_modified=last_modified
+        )
+        stmnt = stmnt.on_conflict_do_update(
+            index_elements=["url"],
+            set_={"etag": etag, "last_modified": last_modified},
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmnt)
+
+    def enqueue_notification(self, file_names: list[str]) -> None:
+        """
+        Queues a webhook notification about new files
+
+        Args:
+            file_names (list[str]): The new hathifile names
+        """
+        now = datetime.now()
+        stmnt = insert(webhook_notification).values(
+            file_names=json.dumps(file_names),
+            attempts=0,
+            next_attempt_at=now,
+            created_at=now,
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmnt)
+
+    def due_notifications(self, now: datetime | None = None) -> list[dict]:
+        """
+        Queued notifications that are due to be sent, oldest first
+
+        Args:
+            now (datetime | None, optional): The time to compare with. Defaults to None for now.
+
+        Returns:
+            list[dict]: webhook_notification rows with file_names decoded
+        """
+        stmnt = (
+            select(webhook_notification)
+            .where(webhook_notification.c.next_attempt_at <= (now or datetime.now()))
+            .order_by(webhook_notification.c.id)
+        )
+        with self.engine.connect() as conn:
+            rows = [row._asdict() for row in conn.execute(stmnt)]
+        for row in rows:
+            row["file_names"] = json.loads(row["file_names"])
+        return rows
+
+    def notification_delivered(self, id: int) -> None:
+        """
+        Removes a delivered notification from the queue
+
+        Args:
+            id (int): The notification's id
+        """
+        stmnt = delete(webhook_notification).where(webhook_notification.c.id == id)
+        with self.engine.begin() as conn:
+            conn.execute(stmnt)
+
+    def notification_failed(self, id: int, error: str, retry_at: datetime) -> None:
+        """
+        Records a failed delivery and when to try again
+
+        Args:
+            id (int): The notification's id
+            error (str): What went wrong
+            retry_at (datetime): When to try again
+        """
+        stmnt = (
+            update(webhook_notification)
+            .where(webhook_notification.c.id == id)
+            .values(
+                attempts=webhook_notification.c.attempts + 1,
+                last_error=error,
+                next_attempt_at=retry_at,
+            )
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmnt)
+
+    def pending_notifications(self) -> int:
+        """
+        Returns:
+            int: How many notifications are waiting to be delivered
+        """
+        stmnt = select(func.count()).select_from(webhook_notification)
+        with self.engine.connect() as conn:
+            return conn.execute(stmnt).scalar_one()
+
+    def close(self) -> None:
+        self.engine.dispose()
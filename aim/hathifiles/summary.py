@@ -0,0 +1,174 @@
+"""
+Hathifiles Summaries
+====================
+
+Counts of hf by rights_code, access, bib_fmt and content_provider_code, and
+by the day of rights_timestamp, kept in the `hf_summary_count` and
+`hf_summary_day` tables so that dashboards don't have to GROUP BY over all
+of hf.
+
+Update loads keep the tables current. The rows a batch inserts and updates
+are the ones that go into the load's change manifest. Before the batch is
+upserted, each inserted row adds one to its counts, and each updated row
+takes its old values off and adds its new ones. The deltas are written in
+the batch's transaction, so an interrupted load can't count a batch twice.
+Full loads and rollbacks replace hf wholesale, so they build new copies of
+the tables from the replacement hf and swap them in along with it.
+"""
+
+from collections import Counter
+from sqlalchemy import Connection, Date, Table, delete, func, insert, select
+from sqlalchemy.dialects import mysql, sqlite
+from aim.hathifiles.database import models
+from aim.services import S
+
+#: The hf columns that are counted by value
+SUMMARY_FIELDS = ("rights_code", "access", "bib_fmt", "content_provider_code")
+
+
+def summary_value(field: str, value) -> str:
+    """
+    How a value of an hf column is stored in hf_summary_count
+
+    Args:
+        field (str): One of SUMMARY_FIELDS
+        value: The column's value
+
+    Returns:
+        str: The value. "" for an empty one, and "1" or "0" for access.
+    """
+    if value is None:
+        return ""
+    if field == "access":
+        return str(int(value))
+    return value
+
+
+def summary_deltas(rows: list, sign: int = 1) -> tuple[Counter, Counter]:
+    """
+    What a set of rows adds to the summary counts
+
+    Args:
+        rows (list): hf rows or parsed hathifiles rows
+        sign (int, optional): -1 to take the rows off instead. Defaults to 1.
+
+    Returns:
+        tuple[Counter, Counter]: Changes to the (field, value) counts and the day counts
+    """
+    counts = Counter()
+    days = Counter()
+    for row in rows:
+        for field in SUMMARY_FIELDS:
+            counts[(field, summary_value(field, getattr(row, field)))] += sign
+        if row.rights_timestamp is not None:
+            days[row.rights_timestamp.date()] += sign
+    return counts, days
+
+
+def _add_counts(db: Connection, table: Table, rows: list[dict]) -> None:
+    # Adds each row's count to the one that's there, then drops the rows
+    # that have come down to nothing
+    rows = [row for row in rows if row["count"]]
+    if not rows:
+        return
+    if db.dialect.name == "sqlite":
+        stmnt = sqlite.insert(table)
+        stmnt = stmnt.on_conflict_do_update(
+            index_elements=[column.name for column in table.primary_key],
+            set_={"count": table.c.count + stmnt.excluded["count"]},
+        )
+    else:
+        stmnt = mysql.insert(table)
+        stmnt = stmnt.on_duplicate_key_update(
+            {"count": table.c.count + stmnt.inserted["count"]}
+        )
+    db.execute(stmnt, rows)
+    db.execute(delete(table).where(table.c.count <= 0))
+
+
+def update_summaries(db: Connection, inserted: list, updated: list) -> None:
+    """
+    Applies a batch of changes to the summary tables. It has to run before
+    the batch is upserted, while hf still has the old values of the updated
+    rows. This doesn't commit.
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        inserted (list): parsed hathifiles rows for htids that aren't in hf
+        updated (list): parsed hathifiles rows for htids whose rows have changed
+    """
+    counts, days = summary_deltas(inserted + updated)
+    if updated:
+        stmnt = select(
+            models.Item.rights_timestamp,
+            *[getattr(models.Item, field) for field in SUMMARY_FIELDS],
+        ).where(models.Item.htid.in_([row.htid for row in updated]))
+        old_counts, old_days = summary_deltas(db.execute(stmnt).all(), sign=-1)
+        counts.update(old_counts)
+        days.update(old_days)
+    _add_counts(
+        db,
+        models.SummaryCount.__table__,
+        [
+            {"field": field, "value": value, "count": count}
+            for (field, value), count in counts.items()
+        ],
+    )
+    _add_counts(
+        db,
+        models.SummaryDay.__table__,
+        [{"day": day, "count": count} for day, count in days.items()],
+    )
+
+
+def rebuild_summaries(
+    db: Connection,
+    items: Table = models.Item.__table__,
+    counts_table: Table = models.SummaryCount.__table__,
+    days_table: Table = models.SummaryDay.__table__,
+) -> int:
+    """
+    Rebuilds the summary tables from hf with GROUP BY queries
+
+    Args:
+        db (sqlalchemy.Connection): Hathifiles database connection
+        items (sqlalchemy.Table, optional): The table to count. Defaults to hf.
+        counts_table (sqlalchemy.Table, optional): The table to rebuild the counts by value in. Defaults to hf_summary_count.
+        days_table (sqlalchemy.Table, optional): The table to rebuild the counts by day in. Defaults to hf_summary_day.
+
+    Returns:
+        int: the number of rows in hf
+    """
+    db.execute(delete(counts_table))
+    db.execute(delete(days_table))
+    counts = Counter()
+    for field in SUMMARY_FIELDS:
+        column = items.c[field]
+        for value, count in db.execute(select(column, func.count()).group_by(column)):
+            # NULL and "" are counted together
+            counts[(field, summary_value(field, value))] += count
+    if counts:
+        db.execute(
+            insert(counts_table),
+            [
+                {"field": field, "value": value, "count": count}
+                for (field, value), count in counts.items()
+            ],
+        )
+    day = func.date(items.c.rights_timestamp, type_=Date)
+    days = db.execute(
+        select(day, func.count())
+        .where(items.c.rights_timestamp.is_not(None))
+        .group_by(day)
+    ).all()
+    if days:
+        db.execute(
+            insert(days_table),
+            [{"day": day, "count": count} for day, count in days],
+        )
+    db.commit()
+    total = sum(
+        count for (field, _), count in counts.items() if field == SUMMARY_FIELDS[0]
+    )
+    S.logger.info("Rebuilt hathifiles summaries", rows=total, days=len(days))
+    return total
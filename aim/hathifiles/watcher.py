@@ -0,0 +1,311 @@
+"""
+Hathifiles Watcher
+==================
+
+The long running form of check_for_new_update_files, for
+``aim hathifiles watch``. It stays resident and polls hathi_file_list.json
+on a jittered schedule, so polling every few minutes doesn't start a new
+interpreter each time. Polls that fail are retried with exponential
+backoff.
+
+Webhook notifications go through a durable queue in the state store. They
+are retried with backoff until the webhook accepts them, including after a
+restart. A notification can be sent twice if the watcher dies between
+sending it and removing it from the queue, but it's never lost.
+
+The watcher serves ``/healthz`` and Prometheus ``/metrics`` on
+HATHIFILES_WATCH_PORT.
+"""
+
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from aim.hathifiles.poll import NewFileHandler, check_for_new_update_files
+from aim.hathifiles.state import StateStore
+from aim.services import S
+
+
+def jittered(seconds: float, jitter: float = 0.1) -> float:
+    """
+    Spreads a delay out by up to jitter of it either way, so that watchers
+    and retries don't line up
+
+    Args:
+        seconds (float): The delay
+        jitter (float, optional): The most the delay is moved, as a fraction of it. Defaults to 0.1.
+
+    Returns:
+        float: The jittered delay
+    """
+    return seconds * (1 + random.uniform(-jitter, jitter))
+
+
+def backoff_delay(failures: int, base: float, maximum: float) -> float:
+    """
+    The delay after a number of failures in a row. It doubles with each
+    failure up to maximum.
+
+    Args:
+        failures (int): Failures in a row
+        base (float): The delay after the first failure
+        maximum (float): The longest delay
+
+    Returns:
+        float: Seconds to wait
+    """
+    return min(maximum, base * 2 ** max(failures - 1, 0))
+
+
+@dataclass
+class WatchMetrics:
+    """
+    Counters for /metrics
+    """
+
+    polls: int = 0
+    not_modified: int = 0
+    poll_errors: int = 0
+    new_files: int = 0
+    deliveries: int = 0
+    delivery_failures: int = 0
+    #: Notifications waiting to be delivered after the last round
+    queue_depth: int = 0
+    #: Unix time of the last successful poll
+    last_success: float = 0.0
+    #: Unix time the last round finished
+    last_round: float = field(default_factory=time.time)
+
+    def render(self) -> str:
+        """
+        The metrics in the Prometheus text format
+
+        Returns:
+            str: The metrics
+        """
+        metrics = [
+            ("polls_total", "counter", self.polls),
+            ("not_modified_total", "counter", self.not_modified),
+            ("poll_errors_total", "counter", self.poll_errors),
+            ("new_files_total", "counter", self.new_files),
+            ("webhook_deliveries_total", "counter", self.deliveries),
+            ("webhook_delivery_failures_total", "counter", self.delivery_failures),
+            ("webhook_queue_depth", "gauge", self.queue_depth),
+            ("last_success_timestamp_seconds", "gauge", self.last_success),
+        ]
+        lines = []
+        for name, kind, value in metrics:
+            lines.append(f"# TYPE hathifiles_watch_{name} {kind}")
+            lines.append(f"hathifiles_watch_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class QueuedNewFileHandler(NewFileHandler):
+    """
+    Puts the webhook notification about new files on the state store's
+    queue instead of sending it straight away
+    """
+
+    def notify_webhook(self):
+        self.store.enqueue_notification(self.new_files)
+        S.logger.info("Queued webhook notification", file_names=self.new_files)
+
+
+def deliver_notifications(
+    store: StateStore,
+    metrics: WatchMetrics | None = None,
+    base_delay: float = 30,
+    max_delay: float = 3600,
+    timeout: float = 30,
+) -> int:
+    """
+    Sends the queued webhook notifications that are due. Ones that fail are
+    put back with a later due time.
+
+    Args:
+        store (StateStore): The state store
+        metrics (WatchMetrics | None, optional): Metrics to count deliveries in. Defaults to None.
+        base_delay (float, optional): Seconds before retrying a first failure. Defaults to 30.
+        max_delay (float, optional): The longest wait between retries. Defaults to 3600.
+        timeout (float, optional): Request timeout in seconds. Defaults to 30.
+
+    Returns:
+        int: How many notifications were delivered
+    """
+    metrics = metrics or WatchMetrics()
+    delivered = 0
+    for notification in store.due_notifications():
+        try:
+            response = requests.post(
+                S.hathifiles_webhook_url,
+                json={"file_names": notification["file_names"]},
+                timeout=timeout,
+            )
+            response.raise_for_status()
+        except requests.RequestException as error:
+            attempts = notification["attempts"] + 1
+            delay = jittered(backoff_delay(attempts, base_delay, max_delay))
+            store.notification_failed(
+                notification["id"],
+                str(error),
+                datetime.now() + timedelta(seconds=delay),
+            )
+            metrics.delivery_failures += 1
+            S.logger.warning(
+                "Webhook notification failed",
+                file_names=notification["file_names"],
+                attempts=attempts,
+                retry_in=round(delay),
+                error=str(error),
+            )
+        else:
+            store.notification_delivered(notification["id"])
+            metrics.deliveries += 1
+            delivered += 1
+            S.logger.info(
+                "Notify webhook SUCCESS", file_names=notification["file_names"]
+            )
+    return delivered
+
+
+class Watcher:
+    """
+    Polls for new hathifiles until it's stopped
+
+    Args:
+        store (StateStore): The state store
+        interval (float, optional): Seconds between polls. Defaults to S.hathifiles_poll_interval.
+        max_backoff (float, optional): The longest wait after failed polls. Defaults to 3600.
+        jitter (float, optional): How much to spread the waits out, as a fraction of them. Defaults to 0.1.
+    """
+
+    def __init__(
+        self,
+        store: StateStore,
+        interval: float = S.hathifiles_poll_interval,
+        max_backoff: float = 3600,
+        jitter: float = 0.1,
+    ) -> None:
+        self.store = store
+        self.interval = interval
+        self.max_backoff = max(max_backoff, interval)
+        self.jitter = jitter
+        self.failures = 0
+        self.next_delay = interval
+        self.metrics = WatchMetrics()
+        self._stop = threading.Event()
+
+    def run_once(self) -> float:
+        """
+        Polls once and delivers the notifications that are due
+
+        Returns:
+            float: Seconds to wait before the next round
+        """
+        try:
+            new_files = check_for_new_update_files(
+                store=self.store, new_file_handler_klass=QueuedNewFileHandler
+            )
+            self.metrics.polls += 1
+            if new_files is None:
+                self.metrics.not_modified += 1
+            else:
+                self.metrics.new_files += len(new_files)
+            self.metrics.last_success = time.time()
+            self.failures = 0
+        except Exception as error:
+            self.failures += 1
+            self.metrics.poll_errors += 1
+            S.logger.warning(
+                "Hathifiles poll failed", failures=self.failures, error=str(error)
+            )
+        try:
+            deliver_notifications(self.store, self.metrics)
+            self.metrics.queue_depth = self.store.pending_notifications()
+        except Exception as error:
+            S.logger.error("Delivering webhook notifications failed", error=str(error))
+
+        if self.failures:
+            delay = backoff_delay(
+                self.failures, min(60, self.interval), self.max_backoff
+            )
+        else:
+            delay = self.interval
+        self.next_delay = jittered(delay, self.jitter)
+        self.metrics.last_round = time.time()
+        return self.next_delay
+
+    def healthy(self, now: float | None = None) -> bool:
+        """
+        Whether the polling loop is still going round. It's unhealthy when a
+        round is well overdue, not when polls fail; failures show up in the
+        metrics.
+
+        Args:
+            now (float | None, optional): Unix time to check at. Defaults to None for now.
+
+        Returns:
+            bool: True when the loop is alive
+        """
+        now = time.time() if now is None else now
+        return now - self.metrics.last_round <= 2 * self.next_delay + 120
+
+    def run(self) -> None:
+        """
+        Polls until stop is called
+        """
+        S.logger.info("Watching for new hathifiles", interval=self.interval)
+        while not self._stop.is_set():
+            self._stop.wait(self.run_once())
+        S.logger.info("Stopped watching for new hathifiles")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        watcher = self.server.watcher
+        if self.path == "/healthz":
+            status = 200 if watcher.healthy() else 503
+            body = b"ok\n" if status == 200 else b"stalled\n"
+            content_type = "text/plain"
+        elif self.path == "/metrics":
+            status = 200
+            body = watcher.metrics.render().encode()
+            content_type = "text/plain; version=0.0.4"
+        else:
+            status = 404
+            body = b"not found\n"
+            content_type = "text/plain"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_status(
+    watcher: Watcher, port: int = S.hathifiles_watch_port, host: str = "0.0.0.0"
+) -> ThreadingHTTPServer:
+    """
+    Serves /healthz and /metrics for a watcher in a background thread
+
+    Args:
+        watcher (Watcher): The watcher
+        port (int, optional): Port to listen on. Defaults to S.hathifiles_watch_port.
+        host (str, optional): Address to listen on. Defaults to "0.0.0.0".
+
+    Returns:
+        ThreadingHTTPServer: The server. Call shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), StatusHandler)
+    server.watcher = watcher
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -95,18 +95,66 @@ class Services:
     #: The path to the directory on the fileserver remote for processed barcodes of new items that are safe to prune when found in hathifiles
     digifeeds_fileserver_prunable_path: str
 
-    #: file path to store of the hathi_file_list update items
+    #: file path to the old JSON store of the hathi_file_list update items. It's only read when the state store is created.
     hathifiles_store_path: str
 
+    #: file path to the SQLite state store of hathifiles that have been seen, downloaded and loaded
+    hathifiles_state_path: str
+
     #: url to argo events webhook for triggering the update of the hathifiles database
     hathifiles_webhook_url: str
 
     #: The Hathifiles MySQL database
     hathifiles_mysql_database: sa.engine.URL
 
+    #: The Hathifiles MySQL database for the async driver
+    hathifiles_async_mysql_database: sa.engine.URL
+
+    #: Whether the Hathifiles API uses the async database driver
+    hathifiles_async: bool
+
     #: The Hathifiles API URL
     hathifiles_api_url: str
 
+    #: The most hathifiles lookups the Hathifiles API keeps in memory. 0 turns the cache off.
+    hathifiles_cache_size: int
+
+    #: How many seconds the Hathifiles API keeps a cached lookup
+    hathifiles_cache_ttl: float
+
+    #: How many seconds apart each Hathifiles API worker checks whether a load has changed hf and its cache should be dropped
+    hathifiles_cache_check_interval: float
+
+    #: Directory of Bloom filters of hathifiles htids. The API serves them from here and the client downloads them to here.
+    hathifiles_bloom_filter_dir: str
+
+    #: How many seconds the Hathifiles client trusts a downloaded Bloom filter before checking with the API that it hasn't been rebuilt
+    hathifiles_bloom_filter_max_age: float
+
+    #: A local SQLite snapshot of the Hathifiles Database. When set, the Hathifiles client looks items up in it instead of calling the API.
+    hathifiles_snapshot_path: str | None
+
+    #: Directory of the manifests of htids changed by each hathifiles load
+    hathifiles_manifest_dir: str
+
+    #: The hathifiles subset profile the loaders use by default
+    hathifiles_profile: str
+
+    #: A TOML file of extra hathifiles subset profiles
+    hathifiles_profiles_path: str | None
+
+    #: Directory that hathifiles are downloaded into
+    hathifiles_download_dir: str
+
+    #: How many days of downloaded hathifiles to keep
+    hathifiles_retention_days: int
+
+    #: Seconds between polls of hathi_file_list.json by aim hathifiles watch
+    hathifiles_poll_interval: float
+
+    #: Port that aim hathifiles watch serves /healthz and /metrics on
+    hathifiles_watch_port: int
+
 
 S = Services(
     app_name=os.getenv("APP_NAME") or "aim",
@@ -145,6 +193,8 @@ S = Services(
     or "digifeeds/fileserver/prunable/path",
     hathifiles_store_path=os.getenv("HATHIFILES_STORE_PATH")
     or "tmp/hathi_file_list_store.json",
+    hathifiles_state_path=os.getenv("HATHIFILES_STATE_PATH")
+    or "tmp/hathifiles_state.db",
     hathifiles_webhook_url=os.getenv("HATHIFILES_WEBHOOK_URL")
     or "http://localhost:1200/new_hathifile",
     hathifiles_mysql_database=sa.engine.URL.create(
@@ -154,5 +204,32 @@ S = Services(
         host=os.getenv("HATHIFILES_DB_HOST") or "hathifiles-db",
         database=os.getenv("HATHIFILES_DB_DATABASE") or "database",
     ),
+    hathifiles_async_mysql_database=sa.engine.URL.create(
+        drivername="mysql+aiomysql",
+        username=os.getenv("HATHIFILES_DB_USER") or "user",
+        password=os.getenv("HATHIFILES_DB_PASSWORD") or "password",
+        host=os.getenv("HATHIFILES_DB_HOST") or "hathifiles-db",
+        database=os.getenv("HATHIFILES_DB_DATABASE") or "database",
+    ),
+    hathifiles_async=(os.getenv("HATHIFILES_ASYNC") or "false").lower() == "true",
     hathifiles_api_url=os.getenv("HATHIFILES_API_URL") or "http://hathifiles-api:8000",
+    hathifiles_cache_size=int(os.getenv("HATHIFILES_CACHE_SIZE") or 10000),
+    hathifiles_cache_ttl=float(os.getenv("HATHIFILES_CACHE_TTL") or 300),
+    hathifiles_cache_check_interval=float(
+        os.getenv("HATHIFILES_CACHE_CHECK_INTERVAL") or 5
+    ),
+    hathifiles_bloom_filter_dir=os.getenv("HATHIFILES_BLOOM_FILTER_DIR")
+    or "tmp/hathifiles_bloom_filters",
+    hathifiles_bloom_filter_max_age=float(
+        os.getenv("HATHIFILES_BLOOM_FILTER_MAX_AGE") or 300
+    ),
+    hathifiles_snapshot_path=os.getenv("HATHIFILES_SNAPSHOT_PATH"),
+    hathifiles_manifest_dir=os.getenv("HATHIFILES_MANIFEST_DIR")
+    or "tmp/hathifiles_manifests",
+    hathifiles_profile=os.getenv("HATHIFILES_PROFILE") or "full",
+    hathifiles_profiles_path=os.getenv("HATHIFILES_PROFILES_PATH"),
+    hathifiles_download_dir=os.getenv("HATHIFILES_DOWNLOAD_DIR") or "tmp/hathifiles",
+    hathifiles_retention_days=int(os.getenv("HATHIFILES_RETENTION_DAYS") or 30),
+    hathifiles_poll_interval=float(os.getenv("HATHIFILES_POLL_INTERVAL") or 300),
+    hathifiles_watch_port=int(os.getenv("HATHIFILES_WATCH_PORT") or 9100),
 )
@@ -0,0 +1,73 @@
+"""
+Compares encoding hf rows through the pydantic Item model with encoding them
+through aim.hathifiles.serialization.
+
+Usage: python bin/hathifiles/benchmark_serialization.py [path/to/hathifiles.db]
+
+Defaults to the umich_small.db sample in the hathifiles directory.
+"""
+
+import sys
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import create_engine, select, text
+
+from aim.hathifiles.database.models import Base, Item as ItemRow
+from aim.hathifiles.main import Item
+from aim.hathifiles.serialization import LIST_FIELDS, item_dict, dumps
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def pydantic_item(row) -> Item:
+    # The pydantic Item for an hf row, the way the API built it before rows
+    # were encoded directly
+    data = dict(row._mapping)
+    for name in LIST_FIELDS:
+        data[name] = [value for value in (data[name] or "").split(",") if value]
+    return Item.model_validate(data)
+
+
+def load_rows(path):
+    source = create_engine(f"sqlite:///{path}")
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with source.connect() as src, engine.connect() as conn:
+        rows = [dict(row._mapping) for row in src.execute(text("SELECT * FROM hf"))]
+        for row in rows:
+            row["rights_timestamp"] = datetime.fromisoformat(row["rights_timestamp"])
+        conn.execute(ItemRow.__table__.insert(), rows)
+        return conn.execute(select(ItemRow)).all()
+
+
+def pydantic_path(rows):
+    return [pydantic_item(row).model_dump_json(exclude_defaults=True) for row in rows]
+
+
+def direct_path(rows):
+    return dumps([item_dict(row) for row in rows])
+
+
+def direct_projection_path(rows):
+    return dumps([item_dict(row, ("htid", "rights_timestamp")) for row in rows])
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else ROOT / "hathifiles" / "umich_small.db"
+    rows = load_rows(path)
+    number = 50
+    print(f"{len(rows)} rows, best of 5 runs of {number}")
+    for name, func in [
+        ("pydantic Item", pydantic_path),
+        ("item_dict + dumps", direct_path),
+        ("item_dict + dumps, 2 fields", direct_projection_path),
+    ]:
+        best = min(timeit.repeat(lambda: func(rows), number=number, repeat=5))
+        per_row = best / number / len(rows) * 1e6
+        print(f"{name:<30} {per_row:8.2f} µs/row")
+
+
+if __name__ == "__main__":
+    main()
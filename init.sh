@@ -21,6 +21,7 @@ docker compose run --rm app poetry install
 echo "🧳 Run database migrations"
 #docker compose up -d database
 docker compose run --rm app sh -c "cd aim/digifeeds/database && poetry run alembic upgrade heads"
+docker compose run --rm app sh -c "cd aim/hathifiles/database && poetry run alembic upgrade heads"
 
 echo "🗄️ Load statuses"
 docker compose run --rm app sh -c "poetry run aim digifeeds load-statuses"
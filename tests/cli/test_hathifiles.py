@@ -1,6 +1,20 @@
 from typer.testing import CliRunner
 from aim.cli.main import app
-from aim.hathifiles import poll
+from aim.hathifiles import (
+    poll,
+    identifiers,
+    main,
+    bloom,
+    snapshot,
+    loader,
+    profiles,
+    download,
+    export,
+    htid_index,
+    reconcile,
+    summary,
+    watcher,
+)
 
 runner = CliRunner()
 
@@ -21,3 +35,376 @@ def test_hathifiles_check_for_new_update_files(mocker):
 
     assert result.exit_code == 0
     assert create_files_mock.call_count == 1
+
+
+def test_hathifiles_build_identifiers(mocker):
+    rebuild_mock = mocker.patch.object(identifiers, "rebuild_identifiers")
+    mocker.patch.object(main, "engine")
+
+    result = runner.invoke(app, ["hathifiles", "build-identifiers"])
+
+    assert result.exit_code == 0
+    assert rebuild_mock.call_count == 1
+
+
+def test_hathifiles_build_summaries(mocker):
+    rebuild_mock = mocker.patch.object(summary, "rebuild_summaries", return_value=500)
+    mocker.patch.object(main, "engine")
+
+    result = runner.invoke(app, ["hathifiles", "build-summaries"])
+
+    assert result.exit_code == 0
+    assert rebuild_mock.call_count == 1
+    assert "Summarized 500 items" in result.stdout
+
+
+def test_hathifiles_build_bloom_filters(mocker):
+    write_mock = mocker.patch.object(bloom, "write_bloom_filters")
+    mocker.patch.object(main, "engine")
+
+    result = runner.invoke(
+        app,
+        ["hathifiles", "build-bloom-filters", "--version", "v1", "--namespace", "mdp"],
+    )
+
+    assert result.exit_code == 0
+    assert write_mock.call_args.kwargs["version"] == "v1"
+    assert write_mock.call_args.kwargs["namespaces"] == ["mdp"]
+
+
+def test_hathifiles_build_snapshot(mocker):
+    build_mock = mocker.patch.object(snapshot, "build_snapshot")
+    mocker.patch.object(main, "engine")
+
+    result = runner.invoke(
+        app, ["hathifiles", "build-snapshot", "tmp/hf.db", "--profile", "umich"]
+    )
+
+    assert result.exit_code == 0
+    assert build_mock.call_args.args[1] == "tmp/hf.db"
+    assert build_mock.call_args.kwargs["profile"] == profiles.PROFILES["umich"]
+
+
+def test_hathifiles_build_snapshot_from_file(mocker):
+    build_mock = mocker.patch.object(snapshot, "build_snapshot_from_file")
+
+    result = runner.invoke(
+        app,
+        [
+            "hathifiles",
+            "build-snapshot",
+            "tmp/hf.db",
+            "--from-file",
+            "hathi_full_20241201.txt.gz",
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert build_mock.call_args.args == ("hathi_full_20241201.txt.gz", "tmp/hf.db")
+    assert build_mock.call_args.kwargs["profile"] is None
+
+
+def test_hathifiles_build_snapshot_unknown_profile(mocker):
+    build_mock = mocker.patch.object(snapshot, "build_snapshot")
+
+    result = runner.invoke(
+        app, ["hathifiles", "build-snapshot", "tmp/hf.db", "--profile", "nope"]
+    )
+
+    assert result.exit_code == 2
+    assert build_mock.call_count == 0
+
+
+def test_hathifiles_load_update(mocker, tmp_path):
+    manifest = tmp_path / "hathi_upd_20241202.manifest.tsv"
+    manifest.write_text("inserted\tmdp.1\nupdated\tmdp.2\n")
+    stats = loader.LoadStats(
+        file="hathi_upd_20241202.txt.gz",
+        rows=10,
+        seconds=2,
+        inserted=1,
+        updated=1,
+        unchanged=8,
+        manifest=str(manifest),
+    )
+    load_mock = mocker.patch.object(loader, "load_update_file", return_value=stats)
+    write_mock = mocker.patch.object(bloom, "write_bloom_filters")
+    mocker.patch.object(bloom, "filter_namespaces", return_value=["mdp"])
+    mocker.patch.object(main, "engine")
+    store_mock = mocker.patch.object(poll, "get_store")
+
+    result = runner.invoke(
+        app, ["hathifiles", "load-update", "tmp/hathi_upd_20241202.txt.gz"]
+    )
+
+    assert result.exit_code == 0
+    assert load_mock.call_args.args[1] == "tmp/hathi_upd_20241202.txt.gz"
+    assert write_mock.call_args.kwargs["version"] == "hathi_upd_20241202.txt.gz"
+    assert write_mock.call_args.kwargs["namespaces"] == ["mdp"]
+    store_mock.return_value.mark.assert_called_once_with(
+        "hathi_upd_20241202.txt.gz", "loaded"
+    )
+    assert (
+        "Loaded 10 rows in 2.0s (5 rows/sec): 1 inserted, 1 updated, 8 unchanged"
+        in result.stdout
+    )
+
+
+def test_hathifiles_load_update_reconciles_digifeeds(mocker):
+    stats = loader.LoadStats(file="hathi_upd_20241202.txt.gz", rows=10, reconciled=2)
+    load_mock = mocker.patch.object(loader, "load_update_file", return_value=stats)
+    pending_mock = mocker.patch.object(reconcile.DigifeedsReconciler, "pending")
+    pending_mock.return_value.matches = {}
+    mocker.patch.object(main, "engine")
+    mocker.patch.object(poll, "get_store")
+
+    result = runner.invoke(
+        app,
+        [
+            "hathifiles",
+            "load-update",
+            "tmp/hathi_upd_20241202.txt.gz",
+            "--reconcile-digifeeds",
+            "--no-build-bloom-filters",
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert load_mock.call_args.kwargs["reconciler"] == pending_mock.return_value
+    assert "Recorded 2 digifeeds items as in_hathifiles" in result.stdout
+
+
+def test_hathifiles_load_full(mocker):
+    stats = loader.LoadStats(
+        file="hathi_full_20241201.txt.gz",
+        rows=10,
+        seconds=2,
+        stages={"parse": loader.StageStats(workers=4, rows=10, seconds=4)},
+    )
+    load_mock = mocker.patch.object(loader, "load_full_file", return_value=stats)
+    write_mock = mocker.patch.object(bloom, "write_bloom_filters")
+    mocker.patch.object(bloom, "filter_namespaces", return_value=[])
+    mocker.patch.object(main, "engine")
+    mocker.patch.object(poll, "get_store")
+
+    result = runner.invoke(
+        app,
+        ["hathifiles", "load-full", "tmp/hathi_full_20241201.txt.gz", "--workers", "4"],
+    )
+
+    assert result.exit_code == 0
+    assert load_mock.call_args.args[1] == "tmp/hathi_full_20241201.txt.gz"
+    assert load_mock.call_args.kwargs["workers"] == 4
+    assert write_mock.call_args.kwargs["version"] == "hathi_full_20241201.txt.gz"
+    assert "Loaded 10 rows" in result.stdout
+    assert "parse: 10 rows/sec with 4 worker(s)" in result.stdout
+
+
+def test_hathifiles_load_full_resumed(mocker):
+    stats = loader.LoadStats(
+        file="hathi_full_20241201.txt.gz", rows=10, seconds=2, resumed_from=5
+    )
+    load_mock = mocker.patch.object(loader, "load_full_file", return_value=stats)
+    mocker.patch.object(main, "engine")
+    mocker.patch.object(poll, "get_store")
+
+    result = runner.invoke(
+        app,
+        [
+            "hathifiles",
+            "load-full",
+            "tmp/hathi_full_20241201.txt.gz",
+            "--restart",
+            "--no-build-bloom-filters",
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert load_mock.call_args.kwargs["restart"] is True
+    assert "Resumed from line 5" in result.stdout
+
+
+def test_hathifiles_load_update_already_loaded(mocker):
+    stats = loader.LoadStats(file="hathi_upd_20241202.txt.gz", already_loaded=True)
+    mocker.patch.object(loader, "load_update_file", return_value=stats)
+    write_mock = mocker.patch.object(bloom, "write_bloom_filters")
+    mocker.patch.object(main, "engine")
+    mocker.patch.object(poll, "get_store")
+
+    result = runner.invoke(
+        app, ["hathifiles", "load-update", "tmp/hathi_upd_20241202.txt.gz"]
+    )
+
+    assert result.exit_code == 0
+    assert "hathi_upd_20241202.txt.gz was already loaded" in result.stdout
+    assert write_mock.call_count == 0
+
+
+def test_hathifiles_load_update_marks_hathifiles_only(mocker):
+    stats = loader.LoadStats(file="updates.txt.gz", rows=10)
+    mocker.patch.object(loader, "load_update_file", return_value=stats)
+    mocker.patch.object(main, "engine")
+    store_mock = mocker.patch.object(poll, "get_store")
+
+    result = runner.invoke(
+        app, ["hathifiles", "load-update", "updates.txt.gz", "--no-build-bloom-filters"]
+    )
+
+    assert result.exit_code == 0
+    assert store_mock.call_count == 0
+    assert "Loaded 10 rows" in result.stdout
+
+
+def test_hathifiles_load_update_without_a_state_store(mocker):
+    stats = loader.LoadStats(file="hathi_upd_20241202.txt.gz", rows=10)
+    mocker.patch.object(loader, "load_update_file", return_value=stats)
+    mocker.patch.object(main, "engine")
+    mocker.patch.object(poll, "get_store", side_effect=FileNotFoundError)
+
+    result = runner.invoke(
+        app,
+        [
+            "hathifiles",
+            "load-update",
+            "tmp/hathi_upd_20241202.txt.gz",
+            "--no-build-bloom-filters",
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert "Loaded 10 rows" in result.stdout
+
+
+def test_hathifiles_rollback_full_load(mocker):
+    rollback_mock = mocker.patch.object(loader, "rollback_full_load")
+    write_mock = mocker.patch.object(bloom, "write_bloom_filters")
+    mocker.patch.object(bloom, "filter_namespaces", return_value=[])
+    mocker.patch.object(main, "engine")
+
+    result = runner.invoke(app, ["hathifiles", "rollback-full-load"])
+
+    assert result.exit_code == 0
+    assert rollback_mock.call_count == 1
+    assert write_mock.call_count == 1
+
+
+def test_hathifiles_export_parquet(mocker):
+    export_mock = mocker.patch.object(export, "export_parquet", return_value=500)
+    mocker.patch.object(main, "engine")
+
+    result = runner.invoke(
+        app,
+        ["hathifiles", "export-parquet", "tmp/hf", "--partition-by", "rights_code"],
+    )
+
+    assert result.exit_code == 0
+    assert export_mock.call_args.args[1] == "tmp/hf"
+    assert export_mock.call_args.kwargs["partition_by"] == ["rights_code"]
+    assert result.stdout == "Exported 500 rows to tmp/hf\n"
+
+
+def test_hathifiles_export_parquet_from_file(mocker):
+    export_mock = mocker.patch.object(
+        export, "export_parquet_from_file", return_value=9
+    )
+
+    result = runner.invoke(
+        app,
+        [
+            "hathifiles",
+            "export-parquet",
+            "tmp/hf",
+            "--from-file",
+            "hathi_upd_20241202.txt.gz",
+            "--profile",
+            "umich",
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert export_mock.call_args.args == ("hathi_upd_20241202.txt.gz", "tmp/hf")
+    assert export_mock.call_args.kwargs["partition_by"] == export.PARTITION_BY
+    assert export_mock.call_args.kwargs["profile"] == profiles.PROFILES["umich"]
+
+
+def test_hathifiles_build_htid_index(mocker):
+    build_mock = mocker.patch.object(htid_index, "build_htid_index", return_value=9)
+
+    result = runner.invoke(
+        app,
+        [
+            "hathifiles",
+            "build-htid-index",
+            "hathi_full_20241201.txt.gz",
+            "tmp/htids.idx",
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert build_mock.call_args.args == ("hathi_full_20241201.txt.gz", "tmp/htids.idx")
+    assert build_mock.call_args.kwargs["profile"] is None
+    assert result.stdout == "Indexed 9 htids in tmp/htids.idx\n"
+
+
+def test_hathifiles_download(mocker):
+    stats = [
+        download.DownloadStats(
+            path="tmp/hathi_upd_20241201.txt.gz",
+            received=0,
+            resumed=0,
+            downloaded=False,
+        ),
+        download.DownloadStats(
+            path="tmp/hathi_upd_20241202.txt.gz", received=10, resumed=1
+        ),
+    ]
+    download_mock = mocker.patch.object(
+        download, "download_new_files", return_value=stats
+    )
+    mocker.patch.object(poll, "get_store")
+
+    result = runner.invoke(app, ["hathifiles", "download", "--full", "--no-prune"])
+
+    assert result.exit_code == 0
+    assert download_mock.call_args.kwargs["full"] is True
+    assert download_mock.call_args.kwargs["prune"] is False
+    assert result.stdout == "Downloaded tmp/hathi_upd_20241202.txt.gz\n"
+
+
+def test_hathifiles_list_files(mocker):
+    store_mock = mocker.patch.object(poll, "get_store")
+    store_mock.return_value.files.return_value = [
+        {"filename": "hathi_upd_20241202.txt.gz", "status": "loaded"}
+    ]
+
+    result = runner.invoke(app, ["hathifiles", "list-files", "--status", "loaded"])
+
+    assert result.exit_code == 0
+    store_mock.return_value.files.assert_called_once_with("loaded")
+    assert result.stdout == "hathi_upd_20241202.txt.gz\tloaded\n"
+
+
+def test_hathifiles_watch(mocker):
+    mocker.patch.object(poll, "get_store")
+    watcher_mock = mocker.patch.object(watcher, "Watcher")
+    serve_mock = mocker.patch.object(watcher, "serve_status")
+    mocker.patch("aim.cli.hathifiles.signal.signal")
+
+    result = runner.invoke(
+        app, ["hathifiles", "watch", "--interval", "60", "--port", "9200"]
+    )
+
+    assert result.exit_code == 0
+    assert watcher_mock.call_args.kwargs["interval"] == 60
+    assert serve_mock.call_args.args[1] == 9200
+    watcher_mock.return_value.run.assert_called_once()
+    serve_mock.return_value.shutdown.assert_called_once()
+
+
+def test_hathifiles_list_files_without_a_state_store(mocker):
+    mocker.patch.object(poll, "get_store", side_effect=FileNotFoundError)
+
+    result = runner.invoke(app, ["hathifiles", "list-files"])
+
+    assert result.exit_code == 1
+    assert "There isn't a state store" in result.stderr
@@ -5,6 +5,20 @@ from sqlalchemy import StaticPool, create_engine
 from sqlalchemy.orm import sessionmaker
 from aim.digifeeds.database.main import app, get_db
 from aim.digifeeds.database.models import Base, load_statuses
+from aim.hathifiles.main import (
+    app as hathifiles_app,
+    get_db as hathifiles_get_db,
+    cache as hathifiles_cache,
+)
+from aim.hathifiles.database.models import (
+    Base as HathifilesBase,
+    Item as HathifilesItem,
+)
+from aim.hathifiles.database.connection import SyncDatabase
+from aim.hathifiles.identifiers import rebuild_identifiers
+from aim.hathifiles.summary import rebuild_summaries
+from datetime import datetime
+import sqlite3
 
 from aim.services import S
 
@@ -84,3 +98,40 @@ def client(db_session):
     app.dependency_overrides[get_db] = override_get_db
     yield TestClient(app)
     del app.dependency_overrides[get_db]
+
+
+@pytest.fixture()
+def hathifiles_db():
+    # An in memory hathifiles database with the rows from the small umich
+    # hathifiles sqlite database
+    hf_engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    HathifilesBase.metadata.create_all(bind=hf_engine)
+    with sqlite3.connect("hathifiles/umich_small.db") as umich_small:
+        umich_small.row_factory = sqlite3.Row
+        rows = [dict(row) for row in umich_small.execute("SELECT * FROM hf")]
+    for row in rows:
+        row["rights_timestamp"] = datetime.fromisoformat(row["rights_timestamp"])
+
+    connection = hf_engine.connect()
+    connection.execute(sa.insert(HathifilesItem), rows)
+    connection.commit()
+    rebuild_identifiers(connection)
+    rebuild_summaries(connection)
+    yield connection
+    connection.close()
+    hf_engine.dispose()
+
+
+@pytest.fixture()
+def hathifiles_client(hathifiles_db):
+    def override_get_db():
+        yield SyncDatabase(connection=hathifiles_db)
+
+    hathifiles_app.dependency_overrides[hathifiles_get_db] = override_get_db
+    hathifiles_cache.clear()
+    yield TestClient(hathifiles_app)
+    del hathifiles_app.dependency_overrides[hathifiles_get_db]
@@ -8,6 +8,7 @@ from aim.digifeeds.database.crud import (
     get_items_total,
     delete_item,
     update_hathifiles_timestamp,
+    update_hathifiles_timestamps,
     NotFoundError,
 )
 from aim.digifeeds.database import models
@@ -349,3 +350,25 @@ class TestCrud:
         assert result.hathifiles_timestamp == timestamp
         assert item.hathifiles_timestamp == timestamp
         assert "in_hathifiles" in [status.status_name for status in item.statuses]
+
+    def test_update_hathifiles_timestamps(self, db_session):
+        item = add_item(db=db_session, item=ItemCreate(barcode="valid_barcode"))
+        done = add_item(db=db_session, item=ItemCreate(barcode="done_barcode"))
+        earlier = datetime.datetime(2024, 1, 1)
+        update_hathifiles_timestamp(db=db_session, item=done, timestamp=earlier)
+        timestamp = datetime.datetime(2024, 12, 2, 3, 4, 5)
+
+        result = update_hathifiles_timestamps(
+            db=db_session,
+            timestamps={
+                "valid_barcode": timestamp,
+                "done_barcode": timestamp,
+                "missing_barcode": timestamp,
+            },
+        )
+
+        assert [i.barcode for i in result] == ["valid_barcode"]
+        assert item.hathifiles_timestamp == timestamp
+        assert "in_hathifiles" in [status.status_name for status in item.statuses]
+        assert done.hathifiles_timestamp == earlier
+        assert len(done.statuses) == 1
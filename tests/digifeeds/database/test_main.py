@@ -124,6 +124,21 @@ def test_update_item_that_is_already_is_in_hf(client, valid_item):
     assert response.json() == {"detail": "Item already has a hathifiles_timestamp"}
 
 
+def test_update_items_with_hathifiles_timestamps(client, valid_item):
+    timestamp = "2012-09-13T18:30:03"
+    response = client.put(
+        "/items/hathifiles_timestamps",
+        json=[
+            {"barcode": valid_item.barcode, "hathifiles_timestamp": timestamp},
+            {"barcode": "does_not_exist", "hathifiles_timestamp": timestamp},
+        ],
+    )
+    assert response.status_code == 200, response.text
+    [item] = response.json()
+    assert item["barcode"] == valid_item.barcode
+    assert item["hathifiles_timestamp"] == timestamp
+
+
 def test_delete_item(client, valid_item):
     response = client.delete(f"/items/{valid_item.barcode}")
     assert response.status_code == 200, response.text
@@ -122,6 +122,27 @@ def test_update_hathifiles_timestamp_failure():
     assert exc_info.type is HTTPError
 
 
+@responses.activate
+def test_update_hathifiles_timestamps():
+    timestamp = datetime(2024, 12, 2, 3, 4, 5)
+    responses.put(
+        f"{S.digifeeds_api_url}/items/hathifiles_timestamps",
+        match=[
+            matchers.json_params_matcher(
+                [
+                    {
+                        "barcode": "my_barcode",
+                        "hathifiles_timestamp": timestamp.isoformat(),
+                    }
+                ]
+            )
+        ],
+        json=[{"item": "my_item"}],
+    )
+    items = DBClient().update_hathifiles_timestamps({"my_barcode": timestamp})
+    assert items == [{"item": "my_item"}]
+
+
 @responses.activate
 def test_get_items_multiple_pages(item_list):
     page_2 = copy.copy(item_list)
@@ -0,0 +1,91 @@
+import pytest
+from aim.hathifiles.bloom import (
+    BloomFilter,
+    build_bloom_filter,
+    filter_namespaces,
+    filter_path,
+    write_bloom_filters,
+)
+
+
+def test_bloom_filter_contains_added_htids():
+    bloom_filter = BloomFilter.for_capacity(100)
+    bloom_filter.add("mdp.39015018415946")
+    assert "mdp.39015018415946" in bloom_filter
+    assert "mdp.not_a_barcode" not in bloom_filter
+    assert bloom_filter.count == 1
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom_filter = BloomFilter.for_capacity(10000, error_rate=0.01)
+    for i in range(10000):
+        bloom_filter.add(f"mdp.{i}")
+    false_positives = sum(f"miun.{i}" in bloom_filter for i in range(10000))
+    assert false_positives < 200
+
+
+def test_bloom_filter_round_trips_through_bytes():
+    bloom_filter = BloomFilter.for_capacity(10, version="hathi_upd_20241202.txt.gz")
+    bloom_filter.add("mdp.39015018415946")
+    copy = BloomFilter.from_buffer(bloom_filter.to_bytes())
+    assert copy.version == "hathi_upd_20241202.txt.gz"
+    assert copy.count == 1
+    assert copy.num_bits == bloom_filter.num_bits
+    assert "mdp.39015018415946" in copy
+
+
+def test_bloom_filter_from_buffer_rejects_other_files():
+    with pytest.raises(ValueError):
+        BloomFilter.from_buffer(b"not a bloom filter at all")
+
+
+def test_bloom_filter_from_buffer_rejects_truncated_files():
+    bloom_filter = BloomFilter.for_capacity(100)
+    with pytest.raises(ValueError):
+        BloomFilter.from_buffer(bloom_filter.to_bytes()[:-1])
+
+
+def test_bloom_filter_write_and_open(tmp_path):
+    bloom_filter = BloomFilter.for_capacity(10, version="v1")
+    bloom_filter.add("mdp.39015018415946")
+    path = str(tmp_path / "htids.bloom")
+    bloom_filter.write(path)
+    opened = BloomFilter.open(path)
+    assert opened.version == "v1"
+    assert "mdp.39015018415946" in opened
+    assert "mdp.not_a_barcode" not in opened
+    opened.close()
+
+
+def test_build_bloom_filter(hathifiles_db):
+    bloom_filter = build_bloom_filter(hathifiles_db, version="v1")
+    assert bloom_filter.count == 500
+    assert "mdp.39015018415946" in bloom_filter
+    assert "mdp.not_a_barcode" not in bloom_filter
+
+
+def test_build_bloom_filter_for_namespace(hathifiles_db):
+    bloom_filter = build_bloom_filter(hathifiles_db, version="v1", namespace="miun")
+    assert bloom_filter.count == 50
+    assert "mdp.39015018415946" not in bloom_filter
+
+
+def test_write_bloom_filters(hathifiles_db, tmp_path):
+    paths = write_bloom_filters(
+        hathifiles_db, version="v1", directory=str(tmp_path), namespaces=["mdp"]
+    )
+    assert paths == [filter_path(str(tmp_path)), filter_path(str(tmp_path), "mdp")]
+    opened = BloomFilter.open(paths[1])
+    assert opened.count == 400
+    opened.close()
+
+
+def test_filter_namespaces(hathifiles_db, tmp_path):
+    assert filter_namespaces(str(tmp_path / "missing")) == []
+    write_bloom_filters(
+        hathifiles_db,
+        version="v1",
+        directory=str(tmp_path),
+        namespaces=["mdp", "miun"],
+    )
+    assert filter_namespaces(str(tmp_path)) == ["mdp", "miun"]
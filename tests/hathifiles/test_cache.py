@@ -0,0 +1,87 @@
+from aim.hathifiles.cache import TTLCache, MISSING
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_returns_missing_for_uncached_key():
+    cache = TTLCache(maxsize=2, ttl=10)
+    assert cache.get("key") is MISSING
+    assert cache.stats()["misses"] == 1
+
+
+def test_caches_none():
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("key", None)
+    assert cache.get("key") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expires_entries():
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=2, ttl=10, timer=timer)
+    cache.set("a", 1)
+    timer.now = 9
+    assert cache.get("a") == 1
+    timer.now = 10
+    assert cache.get("a") is MISSING
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidate_keys():
+    cache = TTLCache(maxsize=3, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.invalidate(["a", "not_cached"])
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == 2
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_invalidate_everything():
+    cache = TTLCache(maxsize=3, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.invalidate()
+    assert cache.stats()["size"] == 0
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_maxsize_zero_turns_off_cache():
+    cache = TTLCache(maxsize=0, ttl=10)
+    cache.set("a", 1)
+    assert cache.get("a") is MISSING
+
+
+def test_check_generation_drops_everything_when_it_changes():
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=2, ttl=10, timer=timer)
+    assert cache.generation_due(5)
+    assert not cache.check_generation(None)
+    cache.set("a", 1)
+    assert not cache.generation_due(5)
+
+    timer.now = 5
+    assert cache.generation_due(5)
+    assert cache.check_generation("load 1")
+    assert cache.get("a") is MISSING
+    assert cache.stats()["invalidations"] == 1
+    assert not cache.check_generation("load 1")
@@ -1,8 +1,18 @@
 import responses
+from responses import matchers
 from aim.services import S
-from aim.hathifiles.client import Client
+from aim.hathifiles.client import Client, clear_shared_state, _bloom_filters_lock
+from aim.hathifiles.bloom import BloomFilter
+from aim.hathifiles.snapshot import build_snapshot
 from requests.exceptions import HTTPError
 import pytest
+from datetime import datetime
+
+
+@pytest.fixture(autouse=True)
+def shared_state():
+    yield
+    clear_shared_state()
 
 
 @responses.activate
@@ -28,3 +38,243 @@ def test_get_item_raises_error():
     with pytest.raises(Exception) as exc_info:
         Client().get_item(htid="my_htid")
     assert exc_info.type is HTTPError
+
+
+@responses.activate
+def test_get_items_success():
+    url = f"{S.hathifiles_api_url}/items"
+    responses.post(
+        url,
+        match=[matchers.json_params_matcher({"htids": ["htid1", "htid2"]})],
+        json={"items": [{"htid": "htid1"}], "missing": ["htid2"]},
+        status=200,
+    )
+    result = Client().get_items(htids=["htid1", "htid2"])
+    assert result == {"items": [{"htid": "htid1"}], "missing": ["htid2"]}
+
+
+@responses.activate
+def test_get_items_sends_batches():
+    url = f"{S.hathifiles_api_url}/items"
+    first = responses.post(
+        url,
+        match=[matchers.json_params_matcher({"htids": ["htid1", "htid2"]})],
+        json={"items": [{"htid": "htid1"}, {"htid": "htid2"}], "missing": []},
+        status=200,
+    )
+    second = responses.post(
+        url,
+        match=[matchers.json_params_matcher({"htids": ["htid3"]})],
+        json={"items": [], "missing": ["htid3"]},
+        status=200,
+    )
+    result = Client().get_items(htids=["htid1", "htid2", "htid3"], batch_size=2)
+    assert first.call_count == 1
+    assert second.call_count == 1
+    assert result == {
+        "items": [{"htid": "htid1"}, {"htid": "htid2"}],
+        "missing": ["htid3"],
+    }
+
+
+@responses.activate
+def test_get_items_raises_error():
+    url = f"{S.hathifiles_api_url}/items"
+    responses.post(url, status=500)
+    with pytest.raises(Exception) as exc_info:
+        Client().get_items(htids=["htid1"])
+    assert exc_info.type is HTTPError
+
+
+@responses.activate
+def test_get_items_by_identifier():
+    url = f"{S.hathifiles_api_url}/oclc/726527"
+    responses.get(url, json=[{"htid": "htid1"}], status=200)
+    items = Client().get_items_by_identifier("oclc", "726527")
+    assert items == [{"htid": "htid1"}]
+
+
+@responses.activate
+def test_get_item_sends_validators_and_uses_304():
+    url = f"{S.hathifiles_api_url}/items/my_htid"
+    validators = {"ETag": '"1"', "Last-Modified": "Thu, 01 Jan 1970 00:00:01 GMT"}
+    responses.get(url, json={"item": "my_item"}, headers=validators, status=200)
+    not_modified = responses.get(
+        url,
+        match=[matchers.header_matcher({"If-None-Match": '"1"'}, strict_match=False)],
+        status=304,
+    )
+    with Client() as client:
+        assert client.get_item(htid="my_htid") == {"item": "my_item"}
+    # Another client revalidates the item the first one fetched
+    with Client() as client:
+        assert client.get_item(htid="my_htid") == {"item": "my_item"}
+    assert not_modified.call_count == 1
+
+
+@responses.activate
+def test_get_changes_follows_cursor():
+    url = f"{S.hathifiles_api_url}/items/changes"
+    responses.get(
+        url,
+        match=[
+            matchers.query_param_matcher(
+                {"since": "2025-01-01T00:00:00", "limit": "2", "namespace": "mdp"}
+            )
+        ],
+        json={"items": [{"htid": "mdp.1"}, {"htid": "mdp.2"}], "next_cursor": "abc"},
+    )
+    responses.get(
+        url,
+        match=[
+            matchers.query_param_matcher(
+                {
+                    "since": "2025-01-01T00:00:00",
+                    "limit": "2",
+                    "namespace": "mdp",
+                    "cursor": "abc",
+                }
+            )
+        ],
+        json={"items": [{"htid": "mdp.3"}], "next_cursor": None},
+    )
+    items = Client().get_changes(since=datetime(2025, 1, 1), namespace="mdp", limit=2)
+    assert [item["htid"] for item in items] == ["mdp.1", "mdp.2", "mdp.3"]
+
+
+@responses.activate
+def test_get_record():
+    url = f"{S.hathifiles_api_url}/records/50220"
+    responses.get(url, json={"bib_num": 50220, "items": []}, status=200)
+    assert Client().get_record(50220) == {"bib_num": 50220, "items": []}
+
+
+@responses.activate
+def test_get_record_not_found():
+    url = f"{S.hathifiles_api_url}/records/50220"
+    responses.get(url, status=404)
+    assert Client().get_record(50220) is None
+
+
+@responses.activate
+def test_download_bloom_filter_skips_definitely_missing_htids(tmp_path):
+    bloom_filter = BloomFilter.for_capacity(10, version="v1")
+    bloom_filter.add("mdp.1")
+    responses.get(
+        f"{S.hathifiles_api_url}/htids/bloom-filter",
+        body=bloom_filter.to_bytes(),
+        status=200,
+    )
+    items = responses.post(
+        f"{S.hathifiles_api_url}/items",
+        match=[matchers.json_params_matcher({"htids": ["mdp.1"]})],
+        json={"items": [{"htid": "mdp.1"}], "missing": []},
+        status=200,
+    )
+    client = Client()
+    downloaded = client.download_bloom_filter(directory=str(tmp_path))
+    assert downloaded.version == "v1"
+    assert client.get_item("mdp.not_a_barcode") is None
+    result = client.get_items(["mdp.not_a_barcode", "mdp.1"])
+    assert result == {"items": [{"htid": "mdp.1"}], "missing": ["mdp.not_a_barcode"]}
+    assert items.call_count == 1
+
+
+@responses.activate
+def test_download_bloom_filter_for_namespace(tmp_path):
+    bloom_filter = BloomFilter.for_capacity(10)
+    responses.get(
+        f"{S.hathifiles_api_url}/htids/bloom-filter",
+        match=[matchers.query_param_matcher({"namespace": "mdp"})],
+        body=bloom_filter.to_bytes(),
+        status=200,
+    )
+    item = responses.get(f"{S.hathifiles_api_url}/items/miun.1", status=404)
+    Client().download_bloom_filter(namespace="mdp", directory=str(tmp_path))
+    # Every client uses the downloaded filter
+    client = Client()
+    assert client.get_item("mdp.1") is None
+    assert client.get_item("miun.1") is None
+    assert item.call_count == 1
+
+
+@responses.activate
+def test_stale_bloom_filter_is_checked_before_trusting_it(tmp_path, mocker):
+    old_filter = BloomFilter.for_capacity(10, version="v1")
+    new_filter = BloomFilter.for_capacity(10, version="v2")
+    new_filter.add("mdp.new")
+    url = f"{S.hathifiles_api_url}/htids/bloom-filter"
+    responses.get(url, body=old_filter.to_bytes(), headers={"ETag": '"v1"'})
+    client = Client()
+    client.download_bloom_filter(directory=str(tmp_path))
+
+    # Within the max age a negative is trusted without asking the API
+    assert client.get_item("mdp.new") is None
+
+    mocker.patch("aim.hathifiles.client.time.monotonic", return_value=1e12)
+    responses.replace(
+        responses.GET,
+        url,
+        match=[matchers.header_matcher({"If-None-Match": '"v1"'})],
+        body=new_filter.to_bytes(),
+        headers={"ETag": '"v2"'},
+    )
+    item = responses.get(
+        f"{S.hathifiles_api_url}/items/mdp.new", json={"htid": "mdp.new"}
+    )
+    assert client.get_item("mdp.new") == {"htid": "mdp.new"}
+    assert item.call_count == 1
+
+
+@responses.activate
+def test_unchecked_bloom_filter_is_not_trusted(tmp_path, mocker):
+    url = f"{S.hathifiles_api_url}/htids/bloom-filter"
+    responses.get(url, body=BloomFilter.for_capacity(10).to_bytes())
+    client = Client()
+    client.download_bloom_filter(directory=str(tmp_path))
+
+    mocker.patch("aim.hathifiles.client.time.monotonic", return_value=1e12)
+    responses.replace(responses.GET, url, status=503)
+    item = responses.get(f"{S.hathifiles_api_url}/items/mdp.1", json={"htid": "mdp.1"})
+    assert client.get_item("mdp.1") == {"htid": "mdp.1"}
+    assert item.call_count == 1
+
+
+@responses.activate
+def test_bloom_filter_is_checked_without_holding_the_lock(tmp_path, mocker):
+    url = f"{S.hathifiles_api_url}/htids/bloom-filter"
+    responses.get(url, body=BloomFilter.for_capacity(10).to_bytes())
+    client = Client()
+    client.download_bloom_filter(directory=str(tmp_path))
+
+    locked_during_request = []
+
+    def not_modified(request):
+        locked_during_request.append(_bloom_filters_lock.locked())
+        return (304, {}, "")
+
+    mocker.patch("aim.hathifiles.client.time.monotonic", return_value=1e12)
+    responses.remove(responses.GET, url)
+    responses.add_callback(responses.GET, url, callback=not_modified)
+    assert client.get_item("mdp.1") is None
+    assert locked_during_request == [False]
+
+
+def test_client_snapshot_mode(hathifiles_db, tmp_path):
+    path = str(tmp_path / "hathifiles.db")
+    build_snapshot(hathifiles_db, path)
+    client = Client(snapshot_path=path)
+    assert client.get_item("mdp.39015018415946")["htid"] == "mdp.39015018415946"
+    assert client.get_item("mdp.not_a_barcode") is None
+    assert client.get_items(["mdp.not_a_barcode"]) == {
+        "items": [],
+        "missing": ["mdp.not_a_barcode"],
+    }
+
+
+def test_clients_share_a_snapshot(hathifiles_db, tmp_path):
+    path = str(tmp_path / "hathifiles.db")
+    build_snapshot(hathifiles_db, path)
+    with Client(snapshot_path=path) as first, Client(snapshot_path=path) as second:
+        assert first._snapshot is second._snapshot
+    assert second.get_item("mdp.39015018415946")["htid"] == "mdp.39015018415946"
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+from sqlalchemy import text
+from aim.hathifiles.database.connection import SyncDatabase, AsyncDatabase
+
+
+def test_sync_database_runs_statements(hathifiles_db):
+    db = SyncDatabase(connection=hathifiles_db)
+    result = asyncio.run(db.execute(text("SELECT COUNT(*) FROM hf")))
+    assert result.scalar_one() == 500
+
+
+def test_sync_database_connects_lazily(mocker):
+    engine = mocker.Mock()
+    db = SyncDatabase(engine=engine)
+    asyncio.run(db.close())
+    assert engine.connect.call_count == 0
+
+
+def test_sync_database_connects_and_closes_in_the_threadpool(mocker):
+    threads = {}
+    connection = mocker.Mock()
+    connection.close.side_effect = lambda: threads.update(close=threading.get_ident())
+    engine = mocker.Mock()
+
+    def connect():
+        threads["connect"] = threading.get_ident()
+        return connection
+
+    engine.connect.side_effect = connect
+    db = SyncDatabase(engine=engine)
+
+    async def run():
+        await db.execute("statement")
+        await db.close()
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert threads["connect"] != loop_thread
+    assert threads["close"] != loop_thread
+    assert connection.execute.call_count == 1
+
+
+def test_async_database_connects_lazily_and_closes(mocker):
+    connection = mocker.AsyncMock()
+    engine = mocker.Mock()
+    engine.connect = mocker.AsyncMock(return_value=connection)
+    db = AsyncDatabase(engine)
+
+    async def run():
+        await db.execute("statement")
+        await db.execute("statement")
+        await db.close()
+
+    asyncio.run(run())
+    assert engine.connect.await_count == 1
+    assert connection.execute.await_count == 2
+    assert connection.close.await_count == 1
@@ -0,0 +1,273 @@
+import gzip
+import os
+import threading
+import pytest
+import requests
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from aim.hathifiles.download import (
+    download_file,
+    download_new_files,
+    files_to_download,
+    prune_downloads,
+    verify_file,
+)
+from aim.hathifiles.state import StateStore
+
+# These tests talk to a local stand-in server, so they need sockets, but only
+# to localhost
+pytestmark = [pytest.mark.enable_socket, pytest.mark.allow_hosts(["127.0.0.1"])]
+
+CONTENT = gzip.compress(b"".join(b"mdp.%d\tdeny\tic\n" % i for i in range(5000)))
+
+
+class HathifilesServer(ThreadingHTTPServer):
+    """
+    A stand-in for www.hathitrust.org that serves CONTENT with Range support.
+    cut_after drops the connection after that many bytes of the next
+    response, and fail_with answers the next request with that status.
+    """
+
+    content = CONTENT
+    cut_after = None
+    fail_with = None
+    honor_range = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/hathi_upd_20241202.txt.gz"
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.headers.get("Range"))
+        if server.fail_with is not None:
+            self.send_response(server.fail_with)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            server.fail_with = None
+            return
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and server.honor_range:
+            start = int(range_header.removeprefix("bytes=").rstrip("-"))
+            if start >= len(server.content):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(server.content)}")
+                self.end_headers()
+                return
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        body = server.content[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if server.cut_after is not None:
+            body = body[: server.cut_after]
+            server.cut_after = None
+            self.wfile.write(body)
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = HathifilesServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def entry(server):
+    return {
+        "filename": "hathi_upd_20241202.txt.gz",
+        "full": False,
+        "size": len(CONTENT),
+        "url": server.url,
+    }
+
+
+def test_download_file(server, entry, tmp_path):
+    stats = download_file(entry, str(tmp_path))
+    assert stats.received == len(CONTENT)
+    assert stats.resumed == 0
+    assert (tmp_path / "hathi_upd_20241202.txt.gz").read_bytes() == CONTENT
+    assert not (tmp_path / "hathi_upd_20241202.txt.gz.part").exists()
+
+
+def test_download_file_resumes_after_a_dropped_connection(
+    server, entry, tmp_path, mocker
+):
+    # Bytes in a chunk that was only partly read are lost with the connection
+    mocker.patch("aim.hathifiles.download.CHUNK_SIZE", 100)
+    server.cut_after = 1000
+    stats = download_file(entry, str(tmp_path), backoff=0)
+    assert stats.resumed == 1
+    assert server.requests == [None, "bytes=1000-"]
+    assert (tmp_path / "hathi_upd_20241202.txt.gz").read_bytes() == CONTENT
+
+
+def test_download_file_picks_up_a_partial_file(server, entry, tmp_path):
+    (tmp_path / "hathi_upd_20241202.txt.gz.part").write_bytes(CONTENT[:500])
+    stats = download_file(entry, str(tmp_path))
+    assert stats.received == len(CONTENT) - 500
+    assert server.requests == ["bytes=500-"]
+    assert (tmp_path / "hathi_upd_20241202.txt.gz").read_bytes() == CONTENT
+
+
+def test_download_file_when_range_is_ignored(server, entry, tmp_path):
+    server.honor_range = False
+    (tmp_path / "hathi_upd_20241202.txt.gz.part").write_bytes(CONTENT[:500])
+    download_file(entry, str(tmp_path))
+    assert (tmp_path / "hathi_upd_20241202.txt.gz").read_bytes() == CONTENT
+
+
+def test_download_file_starts_over_on_416(server, entry, tmp_path):
+    (tmp_path / "hathi_upd_20241202.txt.gz.part").write_bytes(CONTENT + b"extra")
+    download_file(entry, str(tmp_path))
+    assert server.requests == [f"bytes={len(CONTENT) + 5}-", None]
+    assert (tmp_path / "hathi_upd_20241202.txt.gz").read_bytes() == CONTENT
+
+
+def test_download_file_keeps_a_complete_partial_file(server, entry, tmp_path):
+    (tmp_path / "hathi_upd_20241202.txt.gz.part").write_bytes(CONTENT)
+    stats = download_file(entry, str(tmp_path))
+    assert stats.received == 0
+    assert server.requests == []
+    assert (tmp_path / "hathi_upd_20241202.txt.gz").read_bytes() == CONTENT
+
+
+def test_download_file_keeps_a_complete_partial_file_on_416(server, entry, tmp_path):
+    del entry["size"]
+    (tmp_path / "hathi_upd_20241202.txt.gz.part").write_bytes(CONTENT)
+    download_file(entry, str(tmp_path))
+    assert server.requests == [f"bytes={len(CONTENT)}-"]
+    assert (tmp_path / "hathi_upd_20241202.txt.gz").read_bytes() == CONTENT
+
+
+def test_download_file_retries_server_errors(server, entry, tmp_path):
+    server.fail_with = 503
+    stats = download_file(entry, str(tmp_path), backoff=0)
+    assert stats.resumed == 1
+    assert (tmp_path / "hathi_upd_20241202.txt.gz").read_bytes() == CONTENT
+
+
+def test_download_file_does_not_retry_client_errors(server, entry, tmp_path):
+    server.fail_with = 404
+    with pytest.raises(requests.HTTPError):
+        download_file(entry, str(tmp_path), backoff=0)
+    assert len(server.requests) == 1
+
+
+def test_download_file_gives_up_after_retries(server, entry, tmp_path):
+    entry["url"] = "http://127.0.0.1:1/hathi_upd_20241202.txt.gz"
+    with pytest.raises(requests.ConnectionError):
+        download_file(entry, str(tmp_path), retries=1, backoff=0)
+
+
+def test_download_file_removes_a_file_with_the_wrong_size(server, entry, tmp_path):
+    entry["size"] = len(CONTENT) + 1
+    with pytest.raises(ValueError):
+        download_file(entry, str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+
+def test_download_file_skips_a_cached_file(server, entry, tmp_path):
+    download_file(entry, str(tmp_path))
+    stats = download_file(entry, str(tmp_path))
+    assert stats.downloaded is False
+    assert len(server.requests) == 1
+
+
+def test_verify_file_checks_the_gzip_crc(tmp_path):
+    path = tmp_path / "hathi_upd_20241202.txt.gz"
+    corrupt = bytearray(CONTENT)
+    corrupt[-8] ^= 0xFF
+    path.write_bytes(bytes(corrupt))
+    verify_file(str(path), size=len(CONTENT))
+    with pytest.raises(ValueError):
+        verify_file(str(path), size=len(CONTENT), gzipped=True)
+
+
+def test_verify_file_checks_md5(tmp_path):
+    path = tmp_path / "hathi_upd_20241202.txt.gz"
+    path.write_bytes(CONTENT)
+    with pytest.raises(ValueError):
+        verify_file(str(path), md5="0" * 32)
+
+
+def test_files_to_download():
+    file_list = [
+        {"filename": "hathi_full_20241101.txt.gz", "full": True},
+        {"filename": "hathi_full_20241201.txt.gz", "full": True},
+        {"filename": "hathi_upd_20241202.txt.gz", "full": False},
+        {"filename": "hathi_upd_20241102.txt.gz", "full": False},
+    ]
+    assert [e["filename"] for e in files_to_download(file_list)] == [
+        "hathi_upd_20241102.txt.gz",
+        "hathi_upd_20241202.txt.gz",
+    ]
+    entries = files_to_download(file_list, full=True, since=datetime(2024, 12, 1))
+    assert [e["filename"] for e in entries] == [
+        "hathi_full_20241201.txt.gz",
+        "hathi_upd_20241202.txt.gz",
+    ]
+
+
+def test_prune_downloads(tmp_path):
+    for name in [
+        "hathi_full_20240101.txt.gz",
+        "hathi_full_20240201.txt.gz",
+        "hathi_upd_20240102.txt.gz",
+        "hathi_upd_20240301.txt.gz",
+        "hathi_upd_20240302.txt.gz.part",
+    ]:
+        (tmp_path / name).write_bytes(b"")
+    removed = prune_downloads(
+        str(tmp_path), retention_days=10, today=datetime(2024, 3, 5)
+    )
+    assert sorted(os.path.basename(path) for path in removed) == [
+        "hathi_full_20240101.txt.gz",
+        "hathi_upd_20240102.txt.gz",
+    ]
+    assert sorted(os.listdir(tmp_path)) == [
+        "hathi_full_20240201.txt.gz",
+        "hathi_upd_20240301.txt.gz",
+        "hathi_upd_20240302.txt.gz.part",
+    ]
+
+
+def test_prune_downloads_leaves_other_files_alone(tmp_path):
+    for name in ["hathi_file_list.json", "hathi_upd_20240102.txt.gz"]:
+        (tmp_path / name).write_bytes(b"")
+    removed = prune_downloads(
+        str(tmp_path), retention_days=10, today=datetime(2024, 3, 5)
+    )
+    assert [os.path.basename(path) for path in removed] == ["hathi_upd_20240102.txt.gz"]
+    assert os.listdir(tmp_path) == ["hathi_file_list.json"]
+
+
+def test_download_new_files(server, entry, tmp_path):
+    entry["filename"] = f"hathi_upd_{datetime.today():%Y%m%d}.txt.gz"
+    old = tmp_path / "hathi_upd_20000101.txt.gz"
+    old.write_bytes(b"")
+    old_entry = {**entry, "filename": old.name}
+    store = StateStore(str(tmp_path.parent / f"{tmp_path.name}_state.db"))
+    results = download_new_files([entry, old_entry], str(tmp_path), store=store)
+    assert [os.path.basename(stats.path) for stats in results] == [entry["filename"]]
+    assert os.listdir(tmp_path) == [entry["filename"]]
+    assert [row["filename"] for row in store.files("downloaded")] == [entry["filename"]]
+    store.close()
@@ -0,0 +1,59 @@
+import os
+import pytest
+from datetime import datetime
+from aim.hathifiles.export import export_parquet, export_parquet_from_file
+from aim.hathifiles.profiles import Profile
+
+pa = pytest.importorskip("pyarrow")
+ds = pytest.importorskip("pyarrow.dataset")
+
+UPDATE_FILE = "tests/fixtures/hathifiles/loader/hathi_upd_20241202.txt.gz"
+
+
+def read_export(path):
+    return ds.dataset(path, format="parquet", partitioning="hive").to_table()
+
+
+def test_export_parquet(hathifiles_db, tmp_path):
+    path = str(tmp_path / "hf")
+    assert export_parquet(hathifiles_db, path, batch_size=100) == 500
+
+    table = read_export(path)
+    assert table.num_rows == 500
+    assert table.schema.field("oclc").type == pa.list_(pa.string())
+    assert table.schema.field("rights_timestamp").type == pa.timestamp("us")
+    assert all(name.startswith("content_provider_code=") for name in os.listdir(path))
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_export_parquet_with_a_profile(hathifiles_db, tmp_path):
+    path = str(tmp_path / "hf")
+    profile = Profile(name="mdp", namespaces=frozenset({"mdp"}))
+    total = export_parquet(
+        hathifiles_db, path, profile=profile, partition_by=["rights_code"]
+    )
+
+    table = read_export(path)
+    assert table.num_rows == total
+    assert all(htid.startswith("mdp.") for htid in table["htid"].to_pylist())
+
+
+def test_export_parquet_from_file(tmp_path):
+    path = str(tmp_path / "hf")
+    assert export_parquet_from_file(UPDATE_FILE, path, partition_by=[]) == 9
+
+    [row] = (
+        read_export(path).filter(ds.field("htid") == "mdp.35112102391887").to_pylist()
+    )
+    assert row["access"] is True
+    assert row["rights_timestamp"] == datetime(2024, 12, 2, 3, 4, 5)
+    assert isinstance(row["isbn"], list)
+
+
+def test_export_parquet_replaces_an_old_export(tmp_path):
+    path = tmp_path / "hf"
+    path.mkdir()
+    (path / "stale.parquet").write_bytes(b"")
+    export_parquet_from_file(UPDATE_FILE, str(path))
+    assert "stale.parquet" not in os.listdir(path)
+    assert read_export(str(path)).num_rows == 9
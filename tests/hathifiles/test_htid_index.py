@@ -0,0 +1,76 @@
+import gzip
+import os
+import pytest
+from datetime import datetime
+from aim.hathifiles.htid_index import HtidIndex, IndexEntry, build_htid_index
+from aim.hathifiles.profiles import Profile
+
+UPDATE_FILE = "tests/fixtures/hathifiles/loader/hathi_upd_20241202.txt.gz"
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    path = str(tmp_path / "htids.idx")
+    # Small chunks so the runs have to be merged
+    build_htid_index(UPDATE_FILE, path, chunk_size=4)
+    return path
+
+
+def test_build_htid_index(index_path, tmp_path):
+    # The sorted runs are cleaned up
+    assert os.listdir(tmp_path) == ["htids.idx"]
+    with HtidIndex(index_path) as index:
+        assert len(index) == 9
+        assert index.get("mdp.35112102391887") == IndexEntry(
+            htid="mdp.35112102391887",
+            rights_timestamp=datetime(2024, 12, 2, 3, 4, 5),
+            access=True,
+            rights_code="pd",
+        )
+        assert "mdp.39015000000001" in index
+
+
+def test_htid_index_finds_every_htid(index_path):
+    with gzip.open(UPDATE_FILE, "rt") as f:
+        htids = [line.split("\t", 1)[0] for line in f]
+    with HtidIndex(index_path) as index:
+        assert all(index.get(htid).htid == htid for htid in htids)
+
+
+def test_htid_index_missing_htids(index_path):
+    with HtidIndex(index_path) as index:
+        assert index.get("mdp.0") is None
+        assert index.get("mdp.99999999999999") is None
+        assert index.get("mdp.3511210239188") is None
+        assert "x" * 100 not in index
+
+
+def test_build_htid_index_keeps_the_last_line_for_an_htid(tmp_path):
+    hathifile = tmp_path / "hathi_upd_20241203.txt"
+    hathifile.write_text(
+        "mdp.2\tdeny\tic\n"
+        "mdp.1\tdeny\tic\t\t\t\t\t\t\t\t\t\t\t\t2024-12-01 00:00:00\n"
+        "mdp.1\tallow\tpd\t\t\t\t\t\t\t\t\t\t\t\t2024-12-03 00:00:00\n"
+    )
+    path = str(tmp_path / "htids.idx")
+    assert build_htid_index(str(hathifile), path, chunk_size=2) == 2
+    with HtidIndex(path) as index:
+        assert index.get("mdp.1") == IndexEntry(
+            "mdp.1", datetime(2024, 12, 3), True, "pd"
+        )
+        assert index.get("mdp.2").rights_timestamp is None
+
+
+def test_build_htid_index_with_a_profile(tmp_path):
+    path = str(tmp_path / "htids.idx")
+    profile = Profile(name="none", namespaces=frozenset({"uc1"}))
+    assert build_htid_index(UPDATE_FILE, path, profile=profile) == 0
+    with HtidIndex(path) as index:
+        assert index.get("mdp.35112102391887") is None
+
+
+def test_htid_index_rejects_other_files(tmp_path):
+    path = tmp_path / "not_an_index"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        HtidIndex(str(path))
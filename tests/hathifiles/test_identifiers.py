@@ -0,0 +1,96 @@
+import pytest
+from sqlalchemy import select, func
+from aim.hathifiles.database import models
+from aim.hathifiles.identifiers import (
+    normalize,
+    identifier_rows,
+    replace_identifiers,
+    rebuild_identifiers,
+)
+from types import SimpleNamespace
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("726527", "726527"),
+        ("ocm00726527", "726527"),
+        ("ocn243871750", "243871750"),
+        ("(OCoLC)ocm00726527", "726527"),
+        ("on1234567890", "1234567890"),
+        ("not_an_oclc", None),
+        ("", None),
+    ],
+)
+def test_normalize_oclc(value, expected):
+    assert normalize("oclc", value) == expected
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("978-0-518-19004-2", "9780518190042"),
+        ("0518190048", "0518190048"),
+        ("080442957x", "080442957X"),
+        ("0518190048 (pbk.)", "0518190048"),
+        ("12345", None),
+    ],
+)
+def test_normalize_isbn(value, expected):
+    assert normalize("isbn", value) == expected
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [("0028-0836", "00280836"), ("0000-006x", "0000006X"), ("123", None)],
+)
+def test_normalize_issn(value, expected):
+    assert normalize("issn", value) == expected
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("73925389/SA", "73925389"),
+        ("68017809//r71", "68017809"),
+        ("n78-890351", "n78890351"),
+        ("85-2 ", "85000002"),
+        ("", None),
+    ],
+)
+def test_normalize_lccn(value, expected):
+    assert normalize("lccn", value) == expected
+
+
+def test_identifier_rows_dedupes_normalized_values():
+    row = SimpleNamespace(
+        htid="mdp.1",
+        oclc="ocm00726527,726527",
+        isbn="",
+        issn=None,
+        lccn="73925389/SA,73925389",
+    )
+    assert identifier_rows(row) == [
+        {"identifier_type": "oclc", "value": "726527", "htid": "mdp.1"},
+        {"identifier_type": "lccn", "value": "73925389", "htid": "mdp.1"},
+    ]
+
+
+def test_rebuild_identifiers(hathifiles_db):
+    total = rebuild_identifiers(hathifiles_db, batch_size=7)
+    assert total == 500
+    count = hathifiles_db.execute(
+        select(func.count()).select_from(models.Identifier)
+    ).scalar_one()
+    assert count > 500
+
+
+def test_replace_identifiers(hathifiles_db):
+    row = SimpleNamespace(
+        htid="mdp.39015018415946", oclc="ocm1", isbn="", issn="", lccn=""
+    )
+    replace_identifiers(hathifiles_db, [row])
+    values = hathifiles_db.execute(
+        select(models.Identifier.value).filter_by(htid="mdp.39015018415946")
+    ).all()
+    assert values == [("1",)]
@@ -0,0 +1,371 @@
+import gzip
+import os
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine, select, func, inspect
+from aim.hathifiles.database import models
+from aim.hathifiles.profiles import Profile
+from aim.hathifiles.reconcile import DigifeedsReconciler
+from aim.hathifiles.parsing import parse_line
+from aim.hathifiles.loader import (
+    load_update_file,
+    manifest_path,
+    read_manifest,
+    upsert_rows,
+    load_full_file,
+    rollback_full_load,
+    parallel_insert,
+    shadow_table,
+    get_checkpoint,
+    CheckpointTracker,
+    new_checkpoint,
+    OLD_TABLE,
+    SHADOW_TABLE,
+)
+
+UPDATE_FILE = "tests/fixtures/hathifiles/loader/hathi_upd_20241202.txt.gz"
+
+
+@pytest.fixture
+def line():
+    with gzip.open(UPDATE_FILE, "rt") as f:
+        return f.readline()
+
+
+def test_load_update_file(hathifiles_db, tmp_path):
+    stats = load_update_file(
+        hathifiles_db, UPDATE_FILE, batch_size=4, manifest_dir=str(tmp_path)
+    )
+    assert stats.rows == 9
+    assert stats.rows_per_second > 0
+
+    count = hathifiles_db.execute(select(func.count()).select_from(models.Item))
+    assert count.scalar_one() == 501
+    updated = hathifiles_db.execute(
+        select(models.Item).filter_by(htid="mdp.35112102391887")
+    ).first()
+    assert updated.rights_code == "pd"
+    assert updated.access is True
+    assert updated.rights_timestamp == datetime(2024, 12, 2, 3, 4, 5)
+    assert (
+        updated.row_hash == parse_line(gzip.open(UPDATE_FILE, "rt").readline()).row_hash
+    )
+
+
+def test_load_update_file_is_repeatable(hathifiles_db, tmp_path):
+    load_update_file(hathifiles_db, UPDATE_FILE, manifest_dir=str(tmp_path))
+    load_update_file(hathifiles_db, UPDATE_FILE, manifest_dir=str(tmp_path))
+    count = hathifiles_db.execute(select(func.count()).select_from(models.Item))
+    assert count.scalar_one() == 501
+
+
+def test_load_update_file_skips_unchanged_rows(hathifiles_db, tmp_path):
+    first = load_update_file(hathifiles_db, UPDATE_FILE, manifest_dir=str(tmp_path))
+    # The sample database doesn't have row hashes, so every existing row
+    # counts as updated the first time
+    assert (first.inserted, first.updated, first.unchanged) == (1, 8, 0)
+
+    second = load_update_file(
+        hathifiles_db, UPDATE_FILE, manifest_dir=str(tmp_path), restart=True
+    )
+    assert (second.inserted, second.updated, second.unchanged) == (0, 0, 9)
+    assert list(read_manifest(second.manifest)) == []
+
+
+def test_load_update_file_manifest(hathifiles_db, tmp_path):
+    load_update_file(hathifiles_db, UPDATE_FILE, manifest_dir=str(tmp_path))
+    changed = tmp_path / "hathi_upd_20241202.txt"
+    with gzip.open(UPDATE_FILE, "rt") as f:
+        lines = f.readlines()
+    lines[0] = lines[0].replace("\tpd\t", "\tic\t")
+    changed.write_text("".join(lines))
+
+    stats = load_update_file(hathifiles_db, str(changed), manifest_dir=str(tmp_path))
+    assert stats.manifest == str(tmp_path / "hathi_upd_20241202.manifest.tsv")
+    assert list(read_manifest(stats.manifest)) == [("updated", "mdp.35112102391887")]
+    assert (stats.inserted, stats.updated, stats.unchanged) == (0, 1, 8)
+
+
+def test_manifest_path():
+    assert (
+        manifest_path("tmp/hathi_upd_20241202.txt.gz", "manifests")
+        == "manifests/hathi_upd_20241202.manifest.tsv"
+    )
+
+
+def test_upsert_rows_replaces_identifiers(hathifiles_db):
+    upsert_rows(
+        hathifiles_db, [parse_line("mdp.39015000000001\tdeny\tic\t1\t\t\t\t42")]
+    )
+    stmnt = select(models.Identifier.value).filter_by(htid="mdp.39015000000001")
+    assert hathifiles_db.execute(stmnt).scalars().all() == ["42"]
+
+
+def hf_count(db):
+    return db.execute(select(func.count()).select_from(models.Item)).scalar_one()
+
+
+def test_load_full_file(hathifiles_db):
+    stats = load_full_file(hathifiles_db, UPDATE_FILE, batch_size=4)
+    assert stats.rows == 9
+    assert hf_count(hathifiles_db) == 9
+    assert inspect(hathifiles_db).has_table(OLD_TABLE)
+    assert not inspect(hathifiles_db).has_table(SHADOW_TABLE)
+    indexed = {
+        tuple(index["column_names"])
+        for index in inspect(hathifiles_db).get_indexes("hf")
+    }
+    assert ("bib_num",) in indexed
+    assert ("rights_timestamp",) in indexed
+    identifiers = select(models.Identifier.value).filter_by(
+        htid="mdp.39015000000001", identifier_type="oclc"
+    )
+    assert hathifiles_db.execute(identifiers).scalars().all() == ["42"]
+
+
+def test_load_full_file_twice(hathifiles_db):
+    load_full_file(hathifiles_db, UPDATE_FILE)
+    load_full_file(hathifiles_db, UPDATE_FILE)
+    assert hf_count(hathifiles_db) == 9
+
+
+def test_load_full_file_leaves_hf_alone_on_failure(hathifiles_db, mocker):
+    mocker.patch(
+        "aim.hathifiles.loader.create_indexes", side_effect=RuntimeError("boom")
+    )
+    with pytest.raises(RuntimeError):
+        load_full_file(hathifiles_db, UPDATE_FILE)
+    assert hf_count(hathifiles_db) == 500
+    # Kept for the next run to pick up
+    assert inspect(hathifiles_db).has_table(SHADOW_TABLE)
+
+
+def test_load_full_file_swaps_in_identifiers_with_hf(hathifiles_db, mocker):
+    identifiers = select(func.count()).select_from(models.Identifier)
+    before = hathifiles_db.execute(identifiers).scalar_one()
+    mocker.patch("aim.hathifiles.loader.swap_tables", side_effect=RuntimeError("boom"))
+    with pytest.raises(RuntimeError):
+        load_full_file(hathifiles_db, UPDATE_FILE)
+    # The new identifiers are built, but the live ones are left with hf
+    assert hf_count(hathifiles_db) == 500
+    assert hathifiles_db.execute(identifiers).scalar_one() == before
+    assert inspect(hathifiles_db).has_table("hf_identifier_shadow")
+
+    mocker.stopall()
+    load_full_file(hathifiles_db, UPDATE_FILE)
+    htids = select(models.Identifier.htid).distinct()
+    assert set(hathifiles_db.execute(htids).scalars()) <= set(
+        hathifiles_db.execute(select(models.Item.htid)).scalars()
+    )
+    assert inspect(hathifiles_db).has_table("hf_identifier_old")
+    assert not inspect(hathifiles_db).has_table("hf_identifier_shadow")
+
+
+def test_load_full_file_refuses_an_empty_file(hathifiles_db, tmp_path):
+    path = tmp_path / "hathi_full_20241201.txt"
+    path.write_text("")
+    with pytest.raises(ValueError):
+        load_full_file(hathifiles_db, str(path))
+    assert hf_count(hathifiles_db) == 500
+
+
+def test_rollback_full_load(hathifiles_db):
+    load_full_file(hathifiles_db, UPDATE_FILE)
+    rollback_full_load(hathifiles_db)
+    assert hf_count(hathifiles_db) == 500
+    assert not inspect(hathifiles_db).has_table(OLD_TABLE)
+    identifiers = select(models.Identifier.htid).filter_by(value="42")
+    assert "mdp.39015000000001" not in hathifiles_db.execute(identifiers).scalars()
+
+
+def test_rollback_full_load_moves_the_load_generation_on(hathifiles_db):
+    load_full_file(hathifiles_db, UPDATE_FILE)
+    generation = select(func.max(models.LoadCheckpoint.updated_at))
+    loaded = hathifiles_db.execute(generation).scalar_one()
+    rollback_full_load(hathifiles_db)
+    assert hathifiles_db.execute(generation).scalar_one() > loaded
+
+
+def test_rollback_full_load_needs_an_old_table(hathifiles_db):
+    with pytest.raises(ValueError):
+        rollback_full_load(hathifiles_db)
+
+
+def test_load_full_file_in_parallel(hathifiles_db):
+    stats = load_full_file(
+        hathifiles_db, UPDATE_FILE, batch_size=2, workers=2, writers=1
+    )
+    assert stats.rows == 9
+    assert hf_count(hathifiles_db) == 9
+    assert set(stats.stages) == {"decompress", "parse", "write"}
+    assert stats.stages["parse"].workers == 2
+    assert all(stage.rows == 9 for stage in stats.stages.values())
+
+
+@pytest.fixture
+def file_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'hathifiles.db'}")
+    table = shadow_table()
+    table.create(engine)
+    models.LoadCheckpoint.__table__.create(engine)
+    yield engine, table
+    engine.dispose()
+
+
+def test_parallel_insert_with_several_writers(file_engine):
+    engine, table = file_engine
+    stages = parallel_insert(
+        engine, UPDATE_FILE, table, batch_size=1, workers=2, writers=3, queue_size=2
+    )
+    assert stages["write"].rows == 9
+    assert stages["write"].rows_per_second > 0
+    with engine.connect() as db:
+        count = db.execute(select(func.count()).select_from(table)).scalar_one()
+        checkpoint = get_checkpoint(db, UPDATE_FILE)
+    assert count == 9
+    assert (checkpoint["batch"], checkpoint["line"], checkpoint["rows"]) == (9, 9, 9)
+
+
+def test_parallel_insert_from_a_checkpoint(file_engine):
+    engine, table = file_engine
+    checkpoint = {**new_checkpoint(UPDATE_FILE, "full"), "line": 6, "batch": 2}
+    stages = parallel_insert(
+        engine, UPDATE_FILE, table, batch_size=3, workers=1, checkpoint=checkpoint
+    )
+    assert stages["write"].rows == 3
+    assert (checkpoint["batch"], checkpoint["line"], checkpoint["rows"]) == (3, 9, 3)
+
+
+def test_parallel_insert_raises_writer_errors(file_engine, mocker):
+    engine, table = file_engine
+    mocker.patch(
+        "aim.hathifiles.loader.upsert_statement", side_effect=RuntimeError("boom")
+    )
+    with pytest.raises(RuntimeError):
+        parallel_insert(engine, UPDATE_FILE, table, batch_size=1, workers=1)
+
+
+def test_load_update_file_with_a_profile(hathifiles_db, tmp_path, line):
+    path = tmp_path / "hathi_upd_20241202.txt"
+    path.write_text(line + line.replace("mdp.35112102391887", "uc1.b000001"))
+    profile = Profile("mdp", namespaces=frozenset({"mdp"}))
+
+    stats = load_update_file(
+        hathifiles_db, str(path), manifest_dir=str(tmp_path), profile=profile
+    )
+
+    assert (stats.rows, stats.filtered) == (1, 1)
+    assert hf_count(hathifiles_db) == 500
+
+
+def test_load_full_file_with_a_profile(hathifiles_db):
+    profile = Profile("none", namespaces=frozenset({"uc1"}))
+    with pytest.raises(ValueError):
+        load_full_file(hathifiles_db, UPDATE_FILE, profile=profile)
+    assert hf_count(hathifiles_db) == 500
+
+
+def test_load_update_file_only_once(hathifiles_db, tmp_path):
+    load_update_file(hathifiles_db, UPDATE_FILE, manifest_dir=str(tmp_path))
+    stats = load_update_file(hathifiles_db, UPDATE_FILE, manifest_dir=str(tmp_path))
+    assert stats.already_loaded
+    assert (stats.inserted, stats.updated) == (1, 8)
+    assert len(list(read_manifest(stats.manifest))) == 9
+
+
+def test_load_update_file_resumes_after_a_failure(hathifiles_db, tmp_path, mocker):
+    def fail(db, rows):
+        raise RuntimeError("boom")
+
+    # The first batch goes in and the second one fails
+    upserts = iter([upsert_rows, fail])
+    mocker.patch(
+        "aim.hathifiles.loader.upsert_rows",
+        side_effect=lambda db, rows: next(upserts)(db, rows),
+    )
+    with pytest.raises(RuntimeError):
+        load_update_file(
+            hathifiles_db, UPDATE_FILE, batch_size=4, manifest_dir=str(tmp_path)
+        )
+    hathifiles_db.rollback()
+    checkpoint = get_checkpoint(hathifiles_db, UPDATE_FILE)
+    assert (checkpoint["line"], checkpoint["batch"]) == (4, 1)
+    mocker.stopall()
+
+    stats = load_update_file(
+        hathifiles_db, UPDATE_FILE, batch_size=4, manifest_dir=str(tmp_path)
+    )
+    assert stats.resumed_from == 4
+    assert (stats.rows, stats.inserted, stats.updated) == (9, 1, 8)
+    htids = [htid for _, htid in read_manifest(stats.manifest)]
+    assert len(htids) == len(set(htids)) == 9
+    assert hf_count(hathifiles_db) == 501
+
+
+def test_load_update_file_starts_over_for_a_different_file(hathifiles_db, tmp_path):
+    load_update_file(hathifiles_db, UPDATE_FILE, manifest_dir=str(tmp_path))
+    path = tmp_path / os.path.basename(UPDATE_FILE)
+    path.write_bytes(b"")
+    stats = load_update_file(hathifiles_db, str(path), manifest_dir=str(tmp_path))
+    assert not stats.already_loaded
+    assert stats.rows == 0
+
+
+def test_load_full_file_resumes_after_a_failure(hathifiles_db, mocker):
+    mocker.patch(
+        "aim.hathifiles.loader.create_indexes", side_effect=RuntimeError("boom")
+    )
+    with pytest.raises(RuntimeError):
+        load_full_file(hathifiles_db, UPDATE_FILE, batch_size=4)
+    mocker.stopall()
+
+    stats = load_full_file(hathifiles_db, UPDATE_FILE, batch_size=4)
+    assert stats.resumed_from == 9
+    assert stats.rows == 9
+    assert hf_count(hathifiles_db) == 9
+    assert get_checkpoint(hathifiles_db, UPDATE_FILE)["status"] == "complete"
+
+
+def test_load_full_file_only_once(hathifiles_db):
+    load_full_file(hathifiles_db, UPDATE_FILE)
+    stats = load_full_file(hathifiles_db, UPDATE_FILE)
+    assert stats.already_loaded
+    assert stats.rows == 9
+    assert inspect(hathifiles_db).has_table(OLD_TABLE)
+
+    load_full_file(hathifiles_db, UPDATE_FILE, restart=True)
+    # The restart replaced hf_old with the first load
+    assert hf_count(hathifiles_db) == 9
+
+
+def test_checkpoint_tracker_waits_for_earlier_batches(hathifiles_db):
+    tracker = CheckpointTracker(new_checkpoint(UPDATE_FILE, "full"))
+    tracker.committed(hathifiles_db, 2, 8, 4, 0)
+    assert get_checkpoint(hathifiles_db, UPDATE_FILE) is None
+    tracker.committed(hathifiles_db, 1, 4, 3, 1)
+    checkpoint = get_checkpoint(hathifiles_db, UPDATE_FILE)
+    assert (checkpoint["batch"], checkpoint["line"]) == (2, 8)
+    assert (checkpoint["rows"], checkpoint["filtered"]) == (7, 1)
+
+
+def test_load_update_file_reconciles_digifeeds_items(hathifiles_db, tmp_path, mocker):
+    update_mock = mocker.patch(
+        "aim.hathifiles.reconcile.DBClient.update_hathifiles_timestamps"
+    )
+    reconciler = DigifeedsReconciler({"35128000816833", "39015000000001", "1"})
+
+    stats = load_update_file(
+        hathifiles_db,
+        UPDATE_FILE,
+        batch_size=4,
+        manifest_dir=str(tmp_path),
+        reconciler=reconciler,
+    )
+
+    assert stats.reconciled == 2
+    # Matches are recorded after the batch they're in
+    assert [call.args[0] for call in update_mock.call_args_list] == [
+        {"35128000816833": datetime(2024, 12, 2, 3, 4, 6)},
+        {"39015000000001": datetime(2024, 12, 2, 4, 0, 0)},
+    ]
+    assert reconciler.barcodes == {"1"}
@@ -0,0 +1,487 @@
+import json
+from sqlalchemy import update
+from dataclasses import replace
+from aim.hathifiles import main
+from aim.hathifiles.database import models
+from aim.hathifiles.bloom import BloomFilter, write_bloom_filters
+from aim.hathifiles.loader import new_checkpoint, save_checkpoint
+
+UPDATE_FILE = "tests/fixtures/hathifiles/loader/hathi_upd_20241202.txt.gz"
+
+
+def test_get_item(hathifiles_client):
+    response = hathifiles_client.get("/items/mdp.39015018415946")
+    assert response.status_code == 200
+    item = response.json()
+    assert item["htid"] == "mdp.39015018415946"
+    assert item["isbn"] == ["9788081281587", "8081281584"]
+
+
+def test_get_item_not_found(hathifiles_client):
+    response = hathifiles_client.get("/items/mdp.not_a_barcode")
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Item not found"}
+
+
+def test_get_items(hathifiles_client):
+    response = hathifiles_client.post(
+        "/items",
+        json={
+            "htids": [
+                "mdp.39015066356547",
+                "mdp.not_a_barcode",
+                "mdp.39015018415946",
+                "mdp.39015066356547",
+            ]
+        },
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["htid"] for item in body["items"]] == [
+        "mdp.39015066356547",
+        "mdp.39015018415946",
+    ]
+    assert body["missing"] == ["mdp.not_a_barcode"]
+
+
+def test_get_items_all_found_has_empty_missing(hathifiles_client):
+    response = hathifiles_client.post("/items", json={"htids": ["mdp.39015018415946"]})
+    assert response.json()["missing"] == []
+
+
+def test_get_items_rejects_empty_list(hathifiles_client):
+    response = hathifiles_client.post("/items", json={"htids": []})
+    assert response.status_code == 422
+
+
+def test_get_items_by_oclc(hathifiles_client):
+    response = hathifiles_client.get("/oclc/ocm02779601")
+    assert response.status_code == 200
+    htids = [item["htid"] for item in response.json()]
+    assert "mdp.39015018415946" in htids
+    assert "mdp.39015066356547" in htids
+
+
+def test_get_items_by_isbn(hathifiles_client):
+    response = hathifiles_client.get("/isbn/978-80-81281-58-7")
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+
+
+def test_get_items_by_lccn(hathifiles_client):
+    response = hathifiles_client.get("/lccn/73925389")
+    assert [item["htid"] for item in response.json()] == ["miua.0010489.0001.001"]
+
+
+def test_get_items_by_issn_not_found(hathifiles_client):
+    response = hathifiles_client.get("/issn/0028-0836")
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_get_item_is_cached(hathifiles_client, hathifiles_db, mocker):
+    hathifiles_client.get("/items/mdp.39015018415946")
+    hathifiles_client.get("/items/mdp.not_a_barcode")
+    execute = mocker.spy(hathifiles_db, "execute")
+
+    assert hathifiles_client.get("/items/mdp.39015018415946").status_code == 200
+    assert hathifiles_client.get("/items/mdp.not_a_barcode").status_code == 404
+    assert execute.call_count == 0
+
+    stats = hathifiles_client.get("/cache").json()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+
+
+def test_get_items_only_queries_uncached_htids(hathifiles_client):
+    hathifiles_client.get("/items/mdp.39015018415946")
+    response = hathifiles_client.post(
+        "/items", json={"htids": ["mdp.39015018415946", "mdp.39015066356547"]}
+    )
+    assert [item["htid"] for item in response.json()["items"]] == [
+        "mdp.39015018415946",
+        "mdp.39015066356547",
+    ]
+    stats = hathifiles_client.get("/cache").json()
+    assert stats["hits"] == 1
+    assert stats["size"] == 2
+
+
+def test_load_drops_the_cache(hathifiles_client, hathifiles_db):
+    hathifiles_client.get("/items/mdp.39015018415946")
+    hathifiles_client.get("/items/mdp.39015018415946")
+    assert hathifiles_client.get("/cache").json()["hits"] == 1
+
+    checkpoint = new_checkpoint(UPDATE_FILE, "update")
+    save_checkpoint(hathifiles_db, checkpoint)
+    hathifiles_db.commit()
+    # Nothing is checked until the interval is up
+    hathifiles_client.get("/items/mdp.39015018415946")
+    assert hathifiles_client.get("/cache").json()["hits"] == 2
+
+    main.cache._generation_checked_at = None
+    hathifiles_client.get("/items/mdp.39015018415946")
+    stats = hathifiles_client.get("/cache").json()
+    assert stats["hits"] == 2
+    assert stats["invalidations"] == 1
+
+
+def test_get_item_has_validators(hathifiles_client):
+    response = hathifiles_client.get("/items/mdp.39015018415946")
+    assert response.headers["ETag"].startswith('"')
+    assert response.headers["Last-Modified"] == "Thu, 15 Sep 2011 04:30:52 GMT"
+
+
+def test_get_item_if_none_match(hathifiles_client):
+    etag = hathifiles_client.get("/items/mdp.39015018415946").headers["ETag"]
+    response = hathifiles_client.get(
+        "/items/mdp.39015018415946", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+
+def test_get_item_if_none_match_changed(hathifiles_client):
+    response = hathifiles_client.get(
+        "/items/mdp.39015018415946", headers={"If-None-Match": 'W/"1"'}
+    )
+    assert response.status_code == 200
+
+
+def test_get_item_etag_changes_with_the_item(hathifiles_client, hathifiles_db):
+    etag = hathifiles_client.get("/items/mdp.39015018415946").headers["ETag"]
+    # An update that changes the title but not the rights_timestamp
+    hathifiles_db.execute(
+        update(models.Item)
+        .where(models.Item.htid == "mdp.39015018415946")
+        .values(title="A new title")
+    )
+    hathifiles_db.commit()
+    main.cache.clear()
+    response = hathifiles_client.get(
+        "/items/mdp.39015018415946",
+        headers={
+            "If-None-Match": etag,
+            "If-Modified-Since": "Thu, 15 Sep 2011 04:30:52 GMT",
+        },
+    )
+    assert response.status_code == 200
+    assert response.json()["title"] == "A new title"
+
+
+def test_get_item_etag_varies_with_fields(hathifiles_client):
+    etag = hathifiles_client.get("/items/mdp.39015018415946").headers["ETag"]
+    response = hathifiles_client.get(
+        "/items/mdp.39015018415946?fields=rights_code",
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_get_item_if_modified_since(hathifiles_client):
+    response = hathifiles_client.get(
+        "/items/mdp.39015018415946",
+        headers={"If-Modified-Since": "Thu, 15 Sep 2011 04:30:52 GMT"},
+    )
+    assert response.status_code == 304
+
+
+def test_get_item_modified_since(hathifiles_client):
+    response = hathifiles_client.get(
+        "/items/mdp.39015018415946",
+        headers={"If-Modified-Since": "Thu, 15 Sep 2011 04:30:51 GMT"},
+    )
+    assert response.status_code == 200
+
+
+def test_get_item_bad_if_modified_since(hathifiles_client):
+    response = hathifiles_client.get(
+        "/items/mdp.39015018415946", headers={"If-Modified-Since": "yesterday"}
+    )
+    assert response.status_code == 200
+
+
+def test_get_changes_pages_with_cursor(hathifiles_client):
+    params = {"since": "2024-01-01T00:00:00", "limit": 2}
+    first = hathifiles_client.get("/items/changes", params=params).json()
+    assert len(first["items"]) == 2
+    assert first["next_cursor"]
+
+    params["cursor"] = first["next_cursor"]
+    second = hathifiles_client.get("/items/changes", params=params).json()
+    keys = [
+        (item["rights_timestamp"], item["htid"])
+        for item in first["items"] + second["items"]
+    ]
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+
+
+def test_get_changes_matches_full_scan(hathifiles_client):
+    params = {"since": "2020-01-01T00:00:00", "limit": 7}
+    seen = []
+    while True:
+        page = hathifiles_client.get("/items/changes", params=params).json()
+        seen += [item["htid"] for item in page["items"]]
+        if not page["next_cursor"]:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    everything = hathifiles_client.get(
+        "/items/changes", params={"since": "2020-01-01T00:00:00", "limit": 10000}
+    ).json()
+    assert seen == [item["htid"] for item in everything["items"]]
+    assert everything["next_cursor"] is None
+    assert all(item["rights_timestamp"] >= "2020" for item in everything["items"])
+
+
+def test_get_changes_filters(hathifiles_client):
+    response = hathifiles_client.get(
+        "/items/changes",
+        params={
+            "since": "2000-01-01T00:00:00",
+            "namespace": "miun",
+            "content_provider_code": "umich",
+            "limit": 10000,
+        },
+    )
+    items = response.json()["items"]
+    assert len(items) == 50
+    assert all(item["htid"].startswith("miun.") for item in items)
+
+
+def test_get_changes_ndjson(hathifiles_client):
+    response = hathifiles_client.get(
+        "/items/changes",
+        params={"since": "2020-01-01T00:00:00", "limit": 3, "format": "ndjson"},
+    )
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.text.splitlines()
+    everything = hathifiles_client.get(
+        "/items/changes", params={"since": "2020-01-01T00:00:00", "limit": 10000}
+    ).json()
+    assert [json.loads(line)["htid"] for line in lines] == [
+        item["htid"] for item in everything["items"]
+    ]
+
+
+def test_get_changes_invalid_cursor(hathifiles_client):
+    response = hathifiles_client.get(
+        "/items/changes", params={"since": "2020-01-01T00:00:00", "cursor": "nope"}
+    )
+    assert response.status_code == 400
+
+
+def test_list_items_filters(hathifiles_client):
+    response = hathifiles_client.get(
+        "/items",
+        params={"namespace": "mdp", "access": "true", "rights_code": "pd"},
+    )
+    assert response.status_code == 200, response.text
+    items = response.json()["items"]
+    assert items
+    assert all(item["htid"].startswith("mdp.") for item in items)
+    assert all(item["rights_code"] == "pd" and item["access"] for item in items)
+    assert "facets" not in response.json()
+
+
+def test_list_items_rights_timestamp_range(hathifiles_client):
+    params = {
+        "digitization_agent_code": "google",
+        "since": "2010-01-01T00:00:00",
+        "until": "2020-01-01T00:00:00",
+        "limit": 10000,
+    }
+    items = hathifiles_client.get("/items", params=params).json()["items"]
+    assert items
+    assert all("2010" <= item["rights_timestamp"] < "2020" for item in items)
+    assert all(item["digitization_agent_code"] == "google" for item in items)
+
+
+def test_list_items_pages_with_cursor(hathifiles_client):
+    params = {"rights_code": "ic", "limit": 50}
+    seen = []
+    while True:
+        page = hathifiles_client.get("/items", params=params).json()
+        seen += [item["htid"] for item in page["items"]]
+        if not page["next_cursor"]:
+            break
+        params["cursor"] = page["next_cursor"]
+    assert len(seen) == len(set(seen)) == 385
+
+
+def test_list_items_facets(hathifiles_client):
+    response = hathifiles_client.get(
+        "/items", params={"facets": "rights_code,access", "limit": 1}
+    )
+    facets = response.json()["facets"]
+    assert facets["rights_code"][0] == {"value": "ic", "count": 385}
+    assert sum(facet["count"] for facet in facets["rights_code"]) == 500
+    assert {facet["value"] for facet in facets["access"]} == {True, False}
+
+
+def test_list_items_facets_only_on_the_first_page(hathifiles_client):
+    params = {"rights_code": "ic", "facets": "access,bib_fmt", "limit": 50}
+    first = hathifiles_client.get("/items", params=params).json()
+    assert sum(facet["count"] for facet in first["facets"]["access"]) == 385
+    params["cursor"] = first["next_cursor"]
+    second = hathifiles_client.get("/items", params=params).json()
+    assert second["items"]
+    assert "facets" not in second
+
+
+def test_list_items_facets_without_filters_are_summaries(hathifiles_client):
+    response = hathifiles_client.get("/items", params={"facets": "source"})
+    assert response.status_code == 400
+
+
+def test_list_items_facets_need_an_indexed_filter(hathifiles_client):
+    response = hathifiles_client.get(
+        "/items", params={"bib_fmt": "BK", "facets": "rights_code"}
+    )
+    assert response.status_code == 400
+    response = hathifiles_client.get(
+        "/items", params={"bib_fmt": "BK", "namespace": "mdp", "facets": "source"}
+    )
+    assert response.status_code == 200
+
+
+def test_list_items_unknown_facet(hathifiles_client):
+    response = hathifiles_client.get("/items", params={"facets": "title"})
+    assert response.status_code == 400
+
+
+def test_list_items_ndjson(hathifiles_client):
+    response = hathifiles_client.get(
+        "/items",
+        params={"namespace": "miua", "limit": 7, "format": "ndjson", "fields": "htid"},
+    )
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 50
+    assert all(list(line) == ["htid"] for line in lines)
+
+
+def test_list_items_ndjson_facets(hathifiles_client):
+    response = hathifiles_client.get(
+        "/items", params={"format": "ndjson", "facets": "rights_code"}
+    )
+    assert response.status_code == 400
+
+
+def test_get_stats(hathifiles_client):
+    response = hathifiles_client.get("/stats")
+    assert response.status_code == 200, response.text
+    stats = response.json()
+    assert stats["total"] == 500
+    assert stats["counts"]["rights_code"][0] == {"value": "ic", "count": 385}
+    assert {count["value"] for count in stats["counts"]["access"]} == {True, False}
+    assert sum(count["count"] for count in stats["counts"]["bib_fmt"]) == 500
+    days = [day["day"] for day in stats["days"]]
+    assert days == sorted(days)
+
+
+def test_get_stats_days_range(hathifiles_client):
+    stats = hathifiles_client.get(
+        "/stats", params={"since": "2010-01-01", "until": "2020-01-01"}
+    ).json()
+    assert stats["days"]
+    assert all("2010" <= day["day"] < "2020" for day in stats["days"])
+    assert stats["total"] == 500
+
+
+def test_get_record(hathifiles_client):
+    response = hathifiles_client.get("/records/50220")
+    assert response.status_code == 200
+    record = response.json()
+    assert record["bib_num"] == 50220
+    assert record["title"] == "Publication."
+    assert record["oclc"] == ["48010661"]
+    assert len(record["items"]) == 19
+    volume = record["items"][0]
+    assert volume["htid"] == "miua.0050220.0011.001"
+    assert volume["description"] == "no.11"
+    assert "title" not in volume
+    assert "bib_num" not in volume
+
+
+def test_get_record_not_found(hathifiles_client):
+    response = hathifiles_client.get("/records/999999999")
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Record not found"}
+
+
+def test_get_item_fields(hathifiles_client):
+    response = hathifiles_client.get(
+        "/items/mdp.39015018415946?fields=rights_code,access"
+    )
+    assert response.status_code == 200
+    assert list(response.json().keys()) == ["htid", "rights_code", "access"]
+    assert "ETag" in response.headers
+
+
+def test_projected_items_only_require_htid(hathifiles_client):
+    schemas = hathifiles_client.get("/openapi.json").json()["components"]["schemas"]
+    assert schemas["ProjectedItem"]["required"] == ["htid"]
+
+
+def test_get_item_unknown_field(hathifiles_client):
+    response = hathifiles_client.get("/items/mdp.39015018415946?fields=nope")
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Unknown fields: nope"}
+
+
+def test_get_items_fields(hathifiles_client):
+    response = hathifiles_client.post(
+        "/items?fields=isbn", json={"htids": ["mdp.39015018415946"]}
+    )
+    assert response.json()["items"] == [
+        {"htid": "mdp.39015018415946", "isbn": ["9788081281587", "8081281584"]}
+    ]
+
+
+def test_get_changes_ndjson_fields(hathifiles_client):
+    response = hathifiles_client.get(
+        "/items/changes",
+        params={"since": "2000-01-01", "format": "ndjson", "fields": "access"},
+    )
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 500
+    assert all(list(line.keys()) == ["htid", "access"] for line in lines)
+
+
+def test_get_bloom_filter(hathifiles_client, hathifiles_db, tmp_path, mocker):
+    mocker.patch.object(
+        main, "S", replace(main.S, hathifiles_bloom_filter_dir=str(tmp_path))
+    )
+    write_bloom_filters(hathifiles_db, version="v1", directory=str(tmp_path))
+    response = hathifiles_client.get("/htids/bloom-filter")
+    assert response.status_code == 200
+    assert response.headers["X-Bloom-Filter-Version"] == "v1"
+    assert "mdp.39015018415946" in BloomFilter.from_buffer(response.content)
+
+
+def test_get_bloom_filter_not_modified(
+    hathifiles_client, hathifiles_db, tmp_path, mocker
+):
+    mocker.patch.object(
+        main, "S", replace(main.S, hathifiles_bloom_filter_dir=str(tmp_path))
+    )
+    write_bloom_filters(hathifiles_db, version="v1", directory=str(tmp_path))
+    etag = hathifiles_client.get("/htids/bloom-filter").headers["ETag"]
+    response = hathifiles_client.get(
+        "/htids/bloom-filter", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+
+def test_get_bloom_filter_not_found(hathifiles_client, tmp_path, mocker):
+    mocker.patch.object(
+        main, "S", replace(main.S, hathifiles_bloom_filter_dir=str(tmp_path))
+    )
+    response = hathifiles_client.get("/htids/bloom-filter?namespace=mdp")
+    assert response.status_code == 404
@@ -0,0 +1,60 @@
+import gzip
+import pytest
+from datetime import datetime
+from aim.hathifiles.profiles import Profile
+from aim.hathifiles.parsing import parse_line, read_chunks, read_line_chunks
+
+UPDATE_FILE = "tests/fixtures/hathifiles/loader/hathi_upd_20241202.txt.gz"
+
+
+@pytest.fixture
+def line():
+    with gzip.open(UPDATE_FILE, "rt") as f:
+        return f.readline()
+
+
+def test_parse_line(line):
+    row = parse_line(line)
+    assert row.htid == "mdp.35112102391887"
+    assert row.access is True
+    assert row.rights_code == "pd"
+    assert row.bib_num == 110
+    assert row.rights_timestamp == datetime(2024, 12, 2, 3, 4, 5)
+    assert row.us_gov_doc_flag is False
+    assert row.rights_date_used == 1968
+    assert row.author == "Steiner, Peter Otto, 1922-"
+
+
+def test_parse_line_pads_missing_trailing_columns():
+    row = parse_line("mdp.1\tdeny\tic\t\n")
+    assert row.access is False
+    assert row.bib_num is None
+    assert row.rights_timestamp is None
+    assert row.author == ""
+
+
+def test_read_chunks():
+    chunks = list(read_chunks(UPDATE_FILE, chunk_size=4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 1]
+
+
+def test_read_chunks_uncompressed(tmp_path, line):
+    path = tmp_path / "hathi_upd_20241202.txt"
+    path.write_text(line + "\n")
+    assert [len(chunk) for chunk in read_chunks(str(path))] == [1]
+
+
+def test_read_line_chunks():
+    chunks = list(read_line_chunks(UPDATE_FILE, chunk_size=5))
+    assert [len(chunk) for chunk in chunks] == [5, 4]
+    assert all(line.endswith("\n") for chunk in chunks for line in chunk)
+
+
+def test_read_chunks_with_a_profile():
+    profile = Profile("new", namespaces=frozenset({"uc1"}))
+    assert list(read_chunks(UPDATE_FILE, profile=profile)) == []
+
+
+def test_read_line_chunks_from_a_line():
+    chunks = list(read_line_chunks(UPDATE_FILE, chunk_size=5, start_line=7))
+    assert [len(chunk) for chunk in chunks] == [2]
@@ -13,7 +13,9 @@ from aim.hathifiles.poll import (
     create_store_file,
     check_for_new_update_files,
     NewFileHandler,
+    FILE_LIST_URL,
 )
+from aim.hathifiles.state import StateStore
 
 
 @pytest.fixture
@@ -72,69 +74,139 @@ def test_get_latest_update_files_fetch_fail(file_list_data):
     assert exc_info.type is HTTPError
 
 
-def test_get_store_returns_store_when_valid_file_exists():
-    store = get_store("tests/fixtures/hathifiles/poll/hathi_file_list_store.json")
-    assert "file1" in store
-    assert "file2" in store
-    assert "not_in_store" not in "store"
-
-
 def test_get_store_errors_out_when_file_not_found():
     with pytest.raises(Exception) as exc_info:
-        get_store("this_file_does_not_exist.txt")
+        get_store("this_file_does_not_exist.txt", "this_file_does_not_exist.json")
     assert exc_info.type is FileNotFoundError
 
 
+@pytest.fixture
+def store(temp_dir):
+    store = StateStore(str(temp_dir / "hathifiles_state.db"))
+    store.record_seen(["hathi_upd_20241113.txt.gz"])
+    yield store
+    store.close()
+
+
 class FakeNewFileHandler(NewFileHandler):
     def notify_webhook(self):
         S.logger.info("Notify webhook")
 
-    def replace_store(self):
-        S.logger.info("Replace store")
+    def update_store(self):
+        S.logger.info("Update store")
 
 
-def test_check_for_new_files_when_no_new_files():
+def test_check_for_new_files_when_no_new_files(store):
     with capture_logs() as cap_logs:
         check_for_new_update_files(
-            latest_update_files=["file1"],
-            store=["other_file", "file1"],
+            latest_update_files=["hathi_upd_20241113.txt.gz"],
+            store=store,
             new_file_handler_klass=FakeNewFileHandler,
         )
         assert any(log["event"] == "No new Hathifiles update files" for log in cap_logs)
 
 
-def test_check_for_new_files_when_there_are_new_files():
+def test_check_for_new_files_when_there_are_new_files(store):
     with capture_logs() as cap_logs:
         check_for_new_update_files(
-            latest_update_files=["file1", "file2", "file3"],
-            store=["other_file", "file1"],
+            latest_update_files=[
+                "hathi_upd_20241113.txt.gz",
+                "hathi_upd_20241114.txt.gz",
+                "hathi_upd_20241115.txt.gz",
+            ],
+            store=store,
             new_file_handler_klass=FakeNewFileHandler,
         )
         assert any(log["event"] == "New Hathifiles update file(s)" for log in cap_logs)
-        assert any(log["file_names"] == "file2,file3" for log in cap_logs)
+        assert any(
+            log.get("file_names")
+            == "hathi_upd_20241114.txt.gz,hathi_upd_20241115.txt.gz"
+            for log in cap_logs
+        )
         assert any(log["event"] == "Notify webhook" for log in cap_logs)
-        assert any(log["event"] == "Replace store" for log in cap_logs)
+        assert any(log["event"] == "Update store" for log in cap_logs)
+
+
+@responses.activate
+def test_check_for_new_files_polls_conditionally(file_list_data, store):
+    responses.get(
+        FILE_LIST_URL,
+        json=file_list_data,
+        headers={"ETag": '"v1"', "Last-Modified": "Thu, 14 Nov 2024 07:44:55 GMT"},
+        status=200,
+    )
+    check_for_new_update_files(store=store, new_file_handler_klass=FakeNewFileHandler)
+    assert store.validators(FILE_LIST_URL) == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Thu, 14 Nov 2024 07:44:55 GMT",
+    }
+
+    responses.replace(
+        responses.GET,
+        FILE_LIST_URL,
+        status=304,
+        match=[matchers.header_matcher({"If-None-Match": '"v1"'})],
+    )
+    with capture_logs() as cap_logs:
+        check_for_new_update_files(
+            store=store, new_file_handler_klass=FakeNewFileHandler
+        )
+    assert [log["event"] for log in cap_logs] == ["Hathifiles file list hasn't changed"]
+
+
+@responses.activate
+def test_check_for_new_files_keeps_polling_after_a_webhook_failure(
+    file_list_data, store
+):
+    responses.get(FILE_LIST_URL, json=file_list_data, headers={"ETag": '"v1"'})
+    responses.post(S.hathifiles_webhook_url, status=500)
+    with pytest.raises(HTTPError):
+        check_for_new_update_files(store=store)
+    assert store.validators(FILE_LIST_URL) == {}
+    assert store.unseen(["hathi_upd_20241114.txt.gz"]) == ["hathi_upd_20241114.txt.gz"]
 
 
 @responses.activate
 def test_create_store_file_when_file_does_not_exist(file_list_data, temp_dir):
-    url = "https://www.hathitrust.org/files/hathifiles/hathi_file_list.json"
-    responses.get(url, json=file_list_data, status=200)
-    store_path = temp_dir / "test_store_file.json"
-    create_store_file(store_path)
-    with open(store_path, "r") as f:
-        file_contents = json.load(f)
+    responses.get(FILE_LIST_URL, json=file_list_data, status=200)
+    state_path = str(temp_dir / "hathifiles_state.db")
+    create_store_file(state_path, str(temp_dir / "missing.json"))
+    store = StateStore(state_path)
+
+    assert [row["filename"] for row in store.files()] == [
+        "hathi_upd_20241113.txt.gz",
+        "hathi_upd_20241114.txt.gz",
+    ]
+    store.close()
+
+
+def test_create_store_file_from_a_json_store_file(temp_dir, today_file_name):
+    legacy_path = temp_dir / "test_store_file.json"
+    legacy_path.write_text(json.dumps([today_file_name]))
+    state_path = str(temp_dir / "hathifiles_state.db")
+    create_store_file(state_path, str(legacy_path))
+    store = StateStore(state_path)
+
+    assert store.unseen([today_file_name]) == []
+    store.close()
 
-    assert file_contents == ["hathi_upd_20241113.txt.gz", "hathi_upd_20241114.txt.gz"]
+
+def test_get_store_carries_over_a_json_store_file(temp_dir, today_file_name):
+    legacy_path = temp_dir / "test_store_file.json"
+    legacy_path.write_text(json.dumps([today_file_name]))
+    state_path = str(temp_dir / "hathifiles_state.db")
+    store = get_store(state_path, str(legacy_path))
+
+    assert store.unseen([today_file_name]) == []
+    store.close()
 
 
 def test_create_store_file_when_file_exists(temp_dir):
-    store_path = temp_dir / "test_store_file.json"
-    with open(store_path, "w") as f:
-        f.write("This_is_a_line")
+    state_path = str(temp_dir / "hathifiles_state.db")
+    StateStore(state_path).close()
 
     with capture_logs() as cap_logs:
-        create_store_file(store_path)
+        create_store_file(state_path)
         assert any(
             log["event"] == "HathiFiles store file already exists. Leaving alone."
             for log in cap_logs
@@ -142,28 +214,28 @@ def test_create_store_file_when_file_exists(temp_dir):
 
 
 @responses.activate
-def test_new_file_handler_notify_webhook_success():
+def test_new_file_handler_notify_webhook_success(store):
     new_files = ["new_file"]
     webhook_stub = responses.post(
         S.hathifiles_webhook_url,
         match=[matchers.json_params_matcher({"file_names": new_files})],
         status=200,
     )
-    handler = NewFileHandler(new_files=new_files, store="old_file")
+    handler = NewFileHandler(new_files=new_files, store=store)
     handler.notify_webhook()
 
     assert webhook_stub.call_count == 1
 
 
 @responses.activate
-def test_new_file_handler_notify_webhook_fail():
+def test_new_file_handler_notify_webhook_fail(store):
     new_files = ["new_file"]
     webhook_stub = responses.post(
         S.hathifiles_webhook_url,
         match=[matchers.json_params_matcher({"file_names": new_files})],
         status=500,
     )
-    handler = NewFileHandler(new_files=new_files, store=["old_file"])
+    handler = NewFileHandler(new_files=new_files, store=store)
 
     with pytest.raises(Exception) as exc_info:
         handler.notify_webhook()
@@ -172,29 +244,15 @@ def test_new_file_handler_notify_webhook_fail():
     assert webhook_stub.call_count == 1
 
 
-def test_new_file_handler_replace_store(
-    temp_dir, today_file_name, yesterday_file_name, last_year_file_name
+def test_new_file_handler_update_store(
+    store, today_file_name, yesterday_file_name, last_year_file_name
 ):
-    store_path = temp_dir / "test_store_file.json"
-    with open(store_path, "w") as f:
-        f.write("This_is_a_line")
-
-    handler = NewFileHandler(
-        new_files=[today_file_name], store=[yesterday_file_name, last_year_file_name]
-    )
-
-    handler.replace_store(store_path)
+    store.record_seen([yesterday_file_name, last_year_file_name])
+    handler = NewFileHandler(new_files=[today_file_name], store=store)
 
-    with open(store_path, "r") as f:
-        file_contents = json.load(f)
-
-    assert file_contents == [yesterday_file_name, today_file_name]
-
-
-def test_new_file_handler_slim_store(yesterday_file_name, last_year_file_name):
-    handler = NewFileHandler(
-        new_files=["new_file"], store=[yesterday_file_name, last_year_file_name]
-    )
+    handler.update_store()
 
-    slimmed_store = handler.slim_store
-    assert slimmed_store == [yesterday_file_name]
+    assert [row["filename"] for row in store.files()] == [
+        yesterday_file_name,
+        today_file_name,
+    ]
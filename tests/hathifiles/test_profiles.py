@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import select, func
+from aim.hathifiles.database import models
+from aim.hathifiles.profiles import Profile, PROFILES, load_profiles, get_profile
+
+LINE = "\t".join(["uc1.b000001", "allow", "pd"] + [""] * 18 + ["umich", "", "", "", ""])
+
+
+def test_profile_matches_namespace():
+    profile = Profile("test", namespaces=frozenset({"mdp"}))
+    assert profile.matches("mdp.39015000000001\tdeny\tic\n")
+    assert not profile.matches(LINE)
+
+
+def test_profile_matches_content_provider():
+    profile = Profile("test", content_provider_codes=frozenset({"umich"}))
+    assert profile.matches(LINE)
+    assert not profile.matches("mdp.39015000000001\tdeny\tic\n")
+
+
+def test_everything_profile():
+    assert PROFILES["full"].is_everything
+    assert PROFILES["full"].matches(LINE)
+    assert PROFILES["full"].where() is None
+
+
+def test_profile_where(hathifiles_db):
+    profile = Profile("test", namespaces=frozenset({"miua", "miun"}))
+    stmnt = select(func.count()).select_from(models.Item).where(profile.where())
+    assert hathifiles_db.execute(stmnt).scalar_one() == 100
+
+
+def test_load_profiles_from_toml(tmp_path):
+    path = tmp_path / "profiles.toml"
+    path.write_text('[partners]\nnamespaces = ["mdp", "uc1"]\n')
+    profiles = load_profiles(str(path))
+    assert profiles["partners"].namespaces == frozenset({"mdp", "uc1"})
+    assert profiles["partners"].content_provider_codes == frozenset()
+    assert "umich" in profiles
+
+
+def test_get_profile_unknown_name():
+    with pytest.raises(ValueError):
+        get_profile("nope", None)
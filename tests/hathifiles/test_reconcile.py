@@ -0,0 +1,81 @@
+import pytest
+import responses
+from datetime import datetime
+from responses import matchers
+from aim.services import S
+from aim.hathifiles.parsing import HathifilesRow
+from aim.hathifiles.reconcile import DigifeedsReconciler
+from aim.hathifiles.serialization import FIELDS
+
+TIMESTAMPS_URL = f"{S.digifeeds_api_url}/items/hathifiles_timestamps"
+
+
+def row(htid, rights_timestamp=datetime(2024, 12, 2, 3, 4, 5)):
+    values = dict.fromkeys(FIELDS)
+    values.update(htid=htid, rights_timestamp=rights_timestamp)
+    return HathifilesRow(**values, row_hash=b"")
+
+
+@pytest.fixture
+def reconciler():
+    return DigifeedsReconciler({"39015000000001", "39015000000002"})
+
+
+def test_match(reconciler):
+    rows = [row("mdp.39015000000001"), row("uc1.39015000000002"), row("mdp.1")]
+    assert reconciler.match(rows) == 1
+    assert reconciler.matches == {"39015000000001": datetime(2024, 12, 2, 3, 4, 5)}
+    assert reconciler.barcodes == {"39015000000002"}
+
+
+@responses.activate
+def test_flush(reconciler):
+    update = responses.put(
+        TIMESTAMPS_URL,
+        match=[
+            matchers.json_params_matcher(
+                [
+                    {
+                        "barcode": "39015000000001",
+                        "hathifiles_timestamp": "2024-12-02T03:04:05",
+                    }
+                ]
+            )
+        ],
+        json=[],
+    )
+    reconciler.match([row("mdp.39015000000001")])
+
+    assert reconciler.flush() == 1
+    assert reconciler.flush() == 0
+    assert update.call_count == 1
+    assert reconciler.recorded == ["39015000000001"]
+    assert reconciler.matches == {}
+
+
+@responses.activate
+def test_flush_keeps_matches_when_it_fails(reconciler):
+    responses.put(TIMESTAMPS_URL, status=500)
+    reconciler.match([row("mdp.39015000000001")])
+
+    assert reconciler.flush() == 0
+    assert list(reconciler.matches) == ["39015000000001"]
+    assert reconciler.recorded == []
+
+
+@responses.activate
+def test_pending():
+    responses.get(
+        f"{S.digifeeds_api_url}/items",
+        match=[
+            matchers.query_param_matcher(
+                {
+                    "limit": 50,
+                    "offset": 0,
+                    "q": "status:pending_deletion -status:in_hathifiles",
+                }
+            )
+        ],
+        json={"items": [{"barcode": "39015000000001"}], "total": 1},
+    )
+    assert DigifeedsReconciler.pending().barcodes == {"39015000000001"}
@@ -0,0 +1,43 @@
+from sqlalchemy import select
+from aim.hathifiles.database.models import Item as ItemRow
+from aim.hathifiles.main import Item
+from aim.hathifiles.serialization import LIST_FIELDS, item_dict, dumps
+
+
+def pydantic_item(row) -> Item:
+    # The pydantic Item for an hf row, the way the API built it before rows
+    # were encoded directly
+    data = dict(row._mapping)
+    for name in LIST_FIELDS:
+        data[name] = [value for value in (data[name] or "").split(",") if value]
+    return Item.model_validate(data)
+
+
+def test_item_dict_matches_pydantic(hathifiles_db):
+    rows = hathifiles_db.execute(select(ItemRow)).all()
+    assert len(rows) == 500
+    for row in rows:
+        expected = pydantic_item(row)
+        assert item_dict(row) == expected.model_dump(exclude_defaults=True)
+        assert (
+            dumps(item_dict(row))
+            == expected.model_dump_json(exclude_defaults=True).encode()
+        )
+
+
+def test_item_dict_fields(hathifiles_db):
+    row = hathifiles_db.execute(
+        select(ItemRow).filter_by(htid="mdp.39015018415946")
+    ).first()
+    assert item_dict(row, ["htid", "isbn", "title"]) == {
+        "htid": "mdp.39015018415946",
+        "isbn": ["9788081281587", "8081281584"],
+        "title": row.title,
+    }
+
+
+def test_item_dict_leaves_out_empty_fields(hathifiles_db):
+    row = hathifiles_db.execute(
+        select(ItemRow).where(ItemRow.lccn == "").limit(1)
+    ).first()
+    assert "lccn" not in item_dict(row)
@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from sqlalchemy.exc import OperationalError
+from aim.hathifiles.profiles import Profile, PROFILES
+from aim.hathifiles.snapshot import (
+    Snapshot,
+    build_snapshot,
+    build_snapshot_from_file,
+    open_snapshot,
+    snapshot_engine,
+)
+
+UPDATE_FILE = "tests/fixtures/hathifiles/loader/hathi_upd_20241202.txt.gz"
+
+
+@pytest.fixture
+def snapshot_path(hathifiles_db, tmp_path):
+    path = str(tmp_path / "hathifiles.db")
+    build_snapshot(
+        hathifiles_db, path, profile=Profile("test", frozenset({"mdp", "miun"}))
+    )
+    return path
+
+
+def test_build_snapshot(hathifiles_db, tmp_path):
+    path = str(tmp_path / "hathifiles.db")
+    miun = Profile("miun", namespaces=frozenset({"miun"}))
+    assert build_snapshot(hathifiles_db, path, profile=miun) == 50
+    assert build_snapshot(hathifiles_db, path, profile=PROFILES["umich"]) == 500
+    assert build_snapshot(hathifiles_db, path) == 500
+
+
+def test_snapshot_get_item_matches_api(snapshot_path, hathifiles_client):
+    snapshot = Snapshot(snapshot_path)
+    expected = hathifiles_client.get("/items/mdp.39015018415946").json()
+    assert snapshot.get_item("mdp.39015018415946") == expected
+    snapshot.close()
+
+
+def test_snapshot_leaves_out_other_namespaces(snapshot_path):
+    snapshot = Snapshot(snapshot_path)
+    assert snapshot.get_item("miua.0050220.0011.001") is None
+    snapshot.close()
+
+
+def test_snapshot_get_items(snapshot_path):
+    snapshot = Snapshot(snapshot_path)
+    result = snapshot.get_items(
+        ["mdp.39015018415946", "mdp.not_a_barcode", "mdp.39015018415946"]
+    )
+    assert [item["htid"] for item in result["items"]] == ["mdp.39015018415946"]
+    assert result["missing"] == ["mdp.not_a_barcode"]
+    snapshot.close()
+
+
+def test_open_snapshot_is_shared_between_threads(snapshot_path):
+    snapshot = open_snapshot(snapshot_path)
+    assert open_snapshot(snapshot_path) is snapshot
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = list(pool.map(snapshot.get_item, ["mdp.39015018415946"] * 4))
+    assert all(item["htid"] == "mdp.39015018415946" for item in results)
+
+
+def test_snapshot_is_read_only(snapshot_path):
+    with snapshot_engine(snapshot_path).connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.exec_driver_sql("DELETE FROM hf")
+
+
+def test_snapshot_engine_needs_a_snapshot(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        snapshot_engine(str(tmp_path / "nope.db"))
+
+
+def test_build_snapshot_from_file(tmp_path):
+    path = str(tmp_path / "umich_small.db")
+    assert build_snapshot_from_file(UPDATE_FILE, path, batch_size=4) == 9
+    other = Profile("other", namespaces=frozenset({"uc1"}))
+    assert build_snapshot_from_file(UPDATE_FILE, path, profile=other) == 0
+    snapshot = Snapshot(path)
+    assert snapshot.get_item("mdp.39015000000001") is None
+    snapshot.close()
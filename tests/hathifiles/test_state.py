@@ -0,0 +1,72 @@
+import pytest
+from datetime import date
+from aim.hathifiles.state import StateStore, DOWNLOADED, LOADED, SEEN, file_date
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = StateStore(str(tmp_path / "state" / "hathifiles_state.db"))
+    yield store
+    store.close()
+
+
+def test_file_date():
+    assert file_date("hathi_upd_20241202.txt.gz") == date(2024, 12, 2)
+    for name in ["updates.txt.gz", "hathi_upd_latest.txt.gz"]:
+        with pytest.raises(ValueError):
+            file_date(name)
+
+
+def test_record_seen(store):
+    store.record_seen(["hathi_upd_20241202.txt.gz", "hathi_full_20241201.txt.gz"])
+    rows = store.files()
+    assert [row["filename"] for row in rows] == [
+        "hathi_full_20241201.txt.gz",
+        "hathi_upd_20241202.txt.gz",
+    ]
+    assert rows[0]["full"] is True
+    assert rows[0]["file_date"] == date(2024, 12, 1)
+    assert {row["status"] for row in rows} == {SEEN}
+
+
+def test_unseen_keeps_the_order(store):
+    store.record_seen(["hathi_upd_20241202.txt.gz"])
+    assert store.unseen(
+        [
+            "hathi_upd_20241203.txt.gz",
+            "hathi_upd_20241202.txt.gz",
+            "hathi_upd_20241201.txt.gz",
+        ]
+    ) == ["hathi_upd_20241203.txt.gz", "hathi_upd_20241201.txt.gz"]
+
+
+def test_mark_moves_forward_only(store):
+    store.mark("hathi_upd_20241202.txt.gz", LOADED)
+    store.mark("hathi_upd_20241202.txt.gz", DOWNLOADED)
+    store.record_seen(["hathi_upd_20241202.txt.gz"])
+    [row] = store.files()
+    assert row["status"] == LOADED
+    assert row["loaded_at"] is not None
+    assert store.files(DOWNLOADED) == []
+
+
+def test_mark_unknown_status(store):
+    with pytest.raises(ValueError):
+        store.mark("hathi_upd_20241202.txt.gz", "lost")
+
+
+def test_prune(store):
+    store.record_seen(["hathi_upd_20231202.txt.gz", "hathi_upd_20241202.txt.gz"])
+    assert store.prune(date(2024, 1, 1)) == 1
+    assert store.unseen(["hathi_upd_20231202.txt.gz"]) == ["hathi_upd_20231202.txt.gz"]
+
+
+def test_validators(store):
+    url = "https://example.org/hathi_file_list.json"
+    assert store.validators(url) == {}
+    store.save_validators(url, '"v1"', None)
+    store.save_validators(url, '"v2"', "Mon, 02 Dec 2024 07:00:00 GMT")
+    assert store.validators(url) == {
+        "If-None-Match": '"v2"',
+        "If-Modified-Since": "Mon, 02 Dec 2024 07:00:00 GMT",
+    }
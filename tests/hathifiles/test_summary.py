@@ -0,0 +1,94 @@
+from datetime import date, datetime
+from types import SimpleNamespace
+from sqlalchemy import select, func
+from aim.hathifiles.database import models
+from aim.hathifiles.loader import load_update_file, load_full_file, rollback_full_load
+from aim.hathifiles.summary import (
+    summary_deltas,
+    update_summaries,
+    rebuild_summaries,
+)
+
+UPDATE_FILE = "tests/fixtures/hathifiles/loader/hathi_upd_20241202.txt.gz"
+
+
+def summaries(db):
+    counts = {
+        (row.field, row.value): row.count
+        for row in db.execute(select(models.SummaryCount))
+    }
+    days = {row.day: row.count for row in db.execute(select(models.SummaryDay))}
+    return counts, days
+
+
+def row(htid, **values):
+    defaults = {
+        "access": True,
+        "rights_code": "pd",
+        "bib_fmt": "BK",
+        "content_provider_code": "umich",
+        "rights_timestamp": datetime(2024, 12, 2, 3, 4, 5),
+    }
+    return SimpleNamespace(htid=htid, **{**defaults, **values})
+
+
+def test_summary_deltas():
+    counts, days = summary_deltas(
+        [row("mdp.1"), row("mdp.2", access=False, bib_fmt=None)]
+    )
+    assert counts[("access", "1")] == 1
+    assert counts[("access", "0")] == 1
+    assert counts[("bib_fmt", "")] == 1
+    assert counts[("rights_code", "pd")] == 2
+    assert days == {date(2024, 12, 2): 2}
+
+
+def test_rebuild_summaries(hathifiles_db):
+    assert rebuild_summaries(hathifiles_db) == 500
+    counts, days = summaries(hathifiles_db)
+    assert counts[("rights_code", "ic")] == 385
+    assert counts[("access", "1")] + counts[("access", "0")] == 500
+    assert (
+        sum(days.values())
+        == hathifiles_db.execute(
+            select(func.count()).where(models.Item.rights_timestamp.is_not(None))
+        ).scalar_one()
+    )
+
+
+def test_update_summaries_moves_updated_rows(hathifiles_db):
+    before, _ = summaries(hathifiles_db)
+    htid = hathifiles_db.execute(
+        select(models.Item.htid).filter_by(rights_code="ic").limit(1)
+    ).scalar_one()
+    update_summaries(
+        hathifiles_db,
+        inserted=[row("mdp.new")],
+        updated=[row(htid, content_provider_code="umich")],
+    )
+    after, _ = summaries(hathifiles_db)
+    assert after[("rights_code", "ic")] == before[("rights_code", "ic")] - 1
+    assert after[("rights_code", "pd")] == before[("rights_code", "pd")] + 2
+    assert (
+        sum(count for (field, _), count in after.items() if field == "rights_code")
+        == 501
+    )
+
+
+def test_load_update_file_keeps_summaries_current(hathifiles_db, tmp_path):
+    load_update_file(
+        hathifiles_db, UPDATE_FILE, batch_size=4, manifest_dir=str(tmp_path)
+    )
+    incremental = summaries(hathifiles_db)
+    rebuild_summaries(hathifiles_db)
+    assert incremental == summaries(hathifiles_db)
+
+
+def test_full_load_and_rollback_rebuild_summaries(hathifiles_db):
+    load_full_file(hathifiles_db, UPDATE_FILE)
+    counts, _ = summaries(hathifiles_db)
+    assert sum(count for (field, _), count in counts.items() if field == "access") == 9
+
+    rollback_full_load(hathifiles_db)
+    counts, _ = summaries(hathifiles_db)
+    assert counts[("rights_code", "ic")] == 385
@@ -0,0 +1,139 @@
+import json
+import pytest
+import requests
+import responses
+from datetime import datetime, timedelta
+from responses import matchers
+from aim.services import S
+from aim.hathifiles.poll import FILE_LIST_URL
+from aim.hathifiles.state import StateStore
+from aim.hathifiles.watcher import (
+    Watcher,
+    WatchMetrics,
+    backoff_delay,
+    deliver_notifications,
+    jittered,
+    serve_status,
+)
+
+
+@pytest.fixture
+def file_list_data():
+    with open("tests/fixtures/hathifiles/poll/hathi_file_list.json") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = StateStore(str(tmp_path / "hathifiles_state.db"))
+    store.record_seen(["hathi_upd_20241113.txt.gz"])
+    yield store
+    store.close()
+
+
+def test_backoff_delay():
+    assert [backoff_delay(n, 30, 100) for n in range(1, 5)] == [30, 60, 100, 100]
+
+
+def test_jittered():
+    assert all(90 <= jittered(100, 0.1) <= 110 for _ in range(100))
+
+
+@responses.activate
+def test_run_once_queues_and_delivers_new_files(file_list_data, store):
+    # Files over a year old are pruned from the store as soon as they're seen
+    today_file_name = f"hathi_upd_{datetime.today():%Y%m%d}.txt.gz"
+    file_list_data[-1]["filename"] = today_file_name
+    responses.get(FILE_LIST_URL, json=file_list_data, headers={"ETag": '"v1"'})
+    webhook = responses.post(
+        S.hathifiles_webhook_url,
+        match=[matchers.json_params_matcher({"file_names": [today_file_name]})],
+    )
+    watcher = Watcher(store, interval=300, jitter=0)
+
+    assert watcher.run_once() == 300
+    assert webhook.call_count == 1
+    assert store.unseen([today_file_name]) == []
+    assert store.pending_notifications() == 0
+    assert (watcher.metrics.new_files, watcher.metrics.deliveries) == (1, 1)
+
+
+@responses.activate
+def test_run_once_backs_off_after_poll_errors(store):
+    responses.get(FILE_LIST_URL, status=503)
+    watcher = Watcher(store, interval=300, max_backoff=1000, jitter=0)
+
+    delays = [watcher.run_once() for _ in range(6)]
+
+    assert delays == [60, 120, 240, 480, 960, 1000]
+    assert watcher.metrics.poll_errors == 6
+    assert watcher.metrics.polls == 0
+
+
+@responses.activate
+def test_run_once_counts_unchanged_polls(store):
+    responses.get(FILE_LIST_URL, status=304)
+    watcher = Watcher(store, jitter=0)
+    watcher.run_once()
+    assert (watcher.metrics.polls, watcher.metrics.not_modified) == (1, 1)
+    assert watcher.metrics.last_success > 0
+
+
+@responses.activate
+def test_deliver_notifications_retries_later(store):
+    store.enqueue_notification(["hathi_upd_20241114.txt.gz"])
+    responses.post(S.hathifiles_webhook_url, status=500)
+    metrics = WatchMetrics()
+
+    assert deliver_notifications(store, metrics, base_delay=60) == 0
+
+    assert metrics.delivery_failures == 1
+    assert store.due_notifications() == []
+    [notification] = store.due_notifications(datetime.now() + timedelta(minutes=2))
+    assert notification["attempts"] == 1
+    assert "500" in notification["last_error"]
+
+    responses.replace(responses.POST, S.hathifiles_webhook_url, status=200)
+    store.notification_failed(notification["id"], "", datetime.now())
+    assert deliver_notifications(store, metrics) == 1
+    assert store.pending_notifications() == 0
+
+
+def test_deliver_notifications_survives_connection_errors(store, mocker):
+    store.enqueue_notification(["hathi_upd_20241114.txt.gz"])
+    mocker.patch(
+        "aim.hathifiles.watcher.requests.post",
+        side_effect=requests.ConnectionError("refused"),
+    )
+    assert deliver_notifications(store) == 0
+    assert store.pending_notifications() == 1
+
+
+def test_healthy(store):
+    watcher = Watcher(store, interval=300, jitter=0)
+    now = watcher.metrics.last_round
+    assert watcher.healthy(now + 600)
+    assert not watcher.healthy(now + 1000)
+
+
+def test_metrics_render():
+    text = WatchMetrics(polls=3, queue_depth=2).render()
+    assert "# TYPE hathifiles_watch_polls_total counter\n" in text
+    assert "hathifiles_watch_polls_total 3\n" in text
+    assert "hathifiles_watch_webhook_queue_depth 2\n" in text
+
+
+@pytest.mark.enable_socket
+@pytest.mark.allow_hosts(["127.0.0.1"])
+def test_serve_status(store):
+    watcher = Watcher(store)
+    server = serve_status(watcher, port=0, host="127.0.0.1")
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        assert requests.get(f"{url}/healthz").status_code == 200
+        metrics = requests.get(f"{url}/metrics")
+        assert "hathifiles_watch_polls_total 0" in metrics.text
+        assert requests.get(f"{url}/other").status_code == 404
+    finally:
+        server.shutdown()
+        server.server_close()